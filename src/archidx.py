@@ -0,0 +1,288 @@
+# archidx.py - 归档分段索引（定长记录，mmap二分查找）
+
+import gzip
+import lzma
+import mmap
+import struct
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Iterable
+
+from src.tcpcmn import utc2gps, verify_frames, FRAME_HEADER_LEN
+
+# 索引文件头: 6字节魔数 + U8 版本号 + U8 标志
+INDEX_MAGIC = b'RTMIDX\x02\x00'
+INDEX_FLAGS_POS = 7
+# 标志位: 记录的GPS时间不是单调不减（写入了更早的产品或多地图文件切回），查询时线性扫描
+FLAG_UNSORTED = 0x01
+# 索引记录: U64 偏移 + U32 帧长 + U16 GPS周 + U32 SOW×1000 + U8 IOD + U8 消息ID
+#           + U64 播发时刻（写入时的GPS毫秒，0表示未知）
+INDEX_RECORD = struct.Struct('>QIHIBBQ')
+_RECORD_TIME = struct.Struct('>HI')  # 记录中的GPS周和SOW×1000（偏移12）
+INDEX_SUFFIX = '.idx'
+
+WEEK_MS = 604800 * 1000
+
+# 压缩后的分段扩展名 → 打开函数（索引偏移对应解压后的数据）
+OPENERS = {'': open, '.gz': gzip.open, '.xz': lzma.open}
+
+log = logging.getLogger('ArchiveIndex')
+
+
+class IndexEntry(NamedTuple):
+    """一帧的索引记录"""
+    offset: int
+    length: int
+    week: int
+    sow_ms: int
+    iod: int
+    msg_id: int
+    sent_ms: int  # 播发时刻（GPS毫秒），由已有.bin补建的索引为0
+
+    @property
+    def gps_ms(self) -> int:
+        """GPS时间（自GPS起点的毫秒数，排序键）"""
+        return self.week * WEEK_MS + self.sow_ms
+
+
+def index_path(segment: Path) -> Path:
+    """分段文件对应的索引文件路径（压缩后的分段仍使用原.bin名称的索引）"""
+    segment = Path(segment)
+    if segment.suffix in ('.gz', '.xz'):
+        segment = segment.with_suffix('')
+    return segment.with_name(segment.name + INDEX_SUFFIX)
+
+
+def pack_entry(frame, offset: int, sent_ms: int = 0) -> Optional[bytes]:
+    """由帧Header和播发时刻（GPS毫秒，未知时为0）生成索引记录（帧过短时返回None）"""
+    if len(frame) < FRAME_HEADER_LEN:
+        return None
+    msg_id = frame[2]
+    week = (frame[5] << 8) | frame[6]
+    sow_ms = int.from_bytes(frame[7:11], 'big')
+    return INDEX_RECORD.pack(offset, len(frame), week, sow_ms, frame[12], msg_id, sent_ms)
+
+
+def record_gps_ms(record, pos: int = 0) -> int:
+    """索引记录（pos处）的GPS毫秒"""
+    week, sow_ms = _RECORD_TIME.unpack_from(record, pos + 12)
+    return week * WEEK_MS + sow_ms
+
+
+def gps_ms(dt: datetime) -> int:
+    """UTC时间 → GPS毫秒（与索引排序键一致）"""
+    week, sow = utc2gps(dt)
+    return week * WEEK_MS + sow * 1000 + dt.microsecond // 1000
+
+
+def build_index(segment: Path) -> Path:
+    """为没有索引的已有.bin分段扫描生成索引（只收录CRC校验通过的帧）
+
+    Args:
+        segment: 未压缩的.bin分段
+
+    Returns:
+        索引文件路径
+    """
+    segment = Path(segment)
+    target = index_path(segment)
+    with open(segment, 'rb') as f:
+        buf = f.read()
+    flags = 0
+    last = None
+    with open(target, 'wb') as out:
+        out.write(INDEX_MAGIC)
+        for offset, length, ok in verify_frames(buf):
+            if ok:
+                entry = pack_entry(buf[offset:offset + length], offset)
+                key = record_gps_ms(entry)
+                if last is not None and key < last:
+                    flags |= FLAG_UNSORTED
+                last = key
+                out.write(entry)
+        if flags:
+            out.seek(INDEX_FLAGS_POS)
+            out.write(bytes([flags]))
+    return target
+
+
+class ArchiveIndex:
+    """单个分段的索引（mmap只读，按GPS时间二分查找）
+
+    索引按写入顺序排列，键为帧Header中的模型历元。写入较早的产品、重新处理的产品或
+    多地图文件切回时历元会变小，写入端此时在文件头设置FLAG_UNSORTED，查询改为线性扫描；
+    未设置标志的分段二分查找。
+    正在写入的分段也可打开，只读取打开时已完整写入的记录。
+    """
+
+    def __init__(self, path: Path):
+        """打开索引文件
+
+        Args:
+            path: 索引文件路径（*.bin.idx）
+        """
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        size = self._file.seek(0, 2)
+        if size < len(INDEX_MAGIC):
+            self._file.close()
+            raise ValueError(f'索引文件过短: {self.path}')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:INDEX_FLAGS_POS] != INDEX_MAGIC[:INDEX_FLAGS_POS]:
+            self.close()
+            raise ValueError(f'索引文件格式错误或版本不支持: {self.path}')
+        self.count = (size - len(INDEX_MAGIC)) // INDEX_RECORD.size
+        self.sorted = not self._mm[INDEX_FLAGS_POS] & FLAG_UNSORTED
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> IndexEntry:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return IndexEntry._make(INDEX_RECORD.unpack_from(self._mm, len(INDEX_MAGIC) + i * INDEX_RECORD.size))
+
+    def _key(self, i: int) -> int:
+        """第i条记录的GPS毫秒（只解码周和SOW）"""
+        return record_gps_ms(self._mm, len(INDEX_MAGIC) + i * INDEX_RECORD.size)
+
+    def _lower_bound(self, key: int) -> int:
+        """第一条GPS时间 >= key的记录下标（仅用于有序分段）"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def time_span(self) -> Optional[Tuple[int, int]]:
+        """分段覆盖的GPS毫秒范围（有序分段取首末记录，否则扫描全部记录），空索引返回None"""
+        if not self.count:
+            return None
+        if self.sorted:
+            return self._key(0), self._key(self.count - 1)
+        keys = [self._key(i) for i in range(self.count)]
+        return min(keys), max(keys)
+
+    def find(self, start_ms: int, end_ms: int, iod: Optional[int] = None) -> Iterator[IndexEntry]:
+        """查找GPS时间在[start_ms, end_ms]内的记录（按写入顺序返回）
+
+        Args:
+            start_ms: 起始GPS毫秒（含）
+            end_ms: 结束GPS毫秒（含）
+            iod: 只返回该IOD的帧（None为不过滤）
+        """
+        if not self.sorted:
+            for i in range(self.count):
+                if start_ms <= self._key(i) <= end_ms:
+                    entry = self[i]
+                    if iod is None or entry.iod == iod:
+                        yield entry
+            return
+        for i in range(self._lower_bound(start_ms), self.count):
+            entry = self[i]
+            if entry.gps_ms > end_ms:
+                break
+            if iod is None or entry.iod == iod:
+                yield entry
+
+    def close(self):
+        """释放mmap和文件"""
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Segment:
+    """一个归档分段（索引 + 数据），未压缩的数据文件mmap后按偏移切片"""
+
+    def __init__(self, index: Path):
+        self.index = ArchiveIndex(index)
+        base = Path(index).with_suffix('')  # 去掉.idx
+        self.data_path: Optional[Path] = None
+        for ext in OPENERS:
+            candidate = base.with_name(base.name + ext)
+            if candidate.exists():
+                self.data_path = candidate
+                break
+        self._file = None
+        self._mm = None
+
+    def frames(self, entries: Iterable[IndexEntry]) -> Iterator[Tuple[IndexEntry, memoryview]]:
+        """按索引记录读取帧
+
+        未压缩分段返回mmap上的memoryview切片（不拷贝，分段关闭前有效）；
+        压缩分段按偏移顺序解压读取。
+        """
+        if self.data_path is None:
+            raise FileNotFoundError(f'找不到索引对应的数据文件: {self.index.path}')
+        ext = self.data_path.suffix if self.data_path.suffix in ('.gz', '.xz') else ''
+        if not ext:
+            if self._mm is None:
+                self._file = open(self.data_path, 'rb')
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(self._mm)
+            for entry in entries:
+                if entry.offset + entry.length <= len(view):
+                    yield entry, view[entry.offset:entry.offset + entry.length]
+            return
+        with OPENERS[ext](self.data_path, 'rb') as f:
+            for entry in entries:
+                f.seek(entry.offset)
+                yield entry, memoryview(f.read(entry.length))
+
+    def close(self):
+        """释放mmap和文件"""
+        self.index.close()
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # 仍有调用方持有帧切片，随对象回收释放
+            self._file.close()
+            self._mm = None
+
+
+def find_segments(directory: Path, pattern: str = '*.bin') -> List[Path]:
+    """列出目录下的索引文件（按文件名排序，即按时间排序）"""
+    return sorted(Path(directory).glob(pattern + INDEX_SUFFIX))
+
+
+def query(indexes: Iterable[Path], start: datetime, end: datetime,
+          iod: Optional[int] = None) -> Iterator[Tuple[IndexEntry, memoryview]]:
+    """在多个分段中查询UTC时间范围内的帧
+
+    先用每个索引的时间范围跳过不相交的分段，再在相交分段内二分查找（无序分段线性扫描索引），
+    不扫描数据文件、不做CRC校验。
+
+    Args:
+        indexes: 索引文件路径（见find_segments）
+        start: 起始UTC时间（含）
+        end: 结束UTC时间（含）
+        iod: 只返回该IOD的帧（None为不过滤）
+
+    Yields:
+        (索引记录, 帧数据)；未压缩分段的帧为mmap切片，迭代到下一个分段前有效
+    """
+    start_ms, end_ms = gps_ms(start), gps_ms(end)
+    for path in indexes:
+        try:
+            segment = Segment(path)
+        except (OSError, ValueError) as e:
+            log.warning(f'跳过索引: {path}: {e}')
+            continue
+        try:
+            span = segment.index.time_span()
+            if span is None or span[1] < start_ms or span[0] > end_ms:
+                continue
+            yield from segment.frames(segment.index.find(start_ms, end_ms, iod))
+        finally:
+            segment.close()
@@ -0,0 +1,336 @@
+# archive.py - 播发数据归档（后台写入线程，不阻塞播发）
+
+import os
+import re
+import gzip
+import lzma
+import time
+import queue
+import shutil
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+from threading import Thread
+from typing import Dict, Any, Optional
+
+from src.archidx import (INDEX_MAGIC, INDEX_FLAGS_POS, FLAG_UNSORTED, index_path, pack_entry,
+                         record_gps_ms, gps_ms)
+
+# 压缩格式 → (扩展名, 打开函数)
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+
+_STOP = object()
+
+
+class ArchiveWriter:
+    """归档写入器（类似rtkrcv的文件输出）
+
+    - 支持时间格式路径: %Y年 %m月 %d日 %h时 %M分 %S秒
+    - 支持定时切换: ::S=24 表示24小时换文件
+    - 示例: output/vtec_%Y%m%d_%h%M.bin::S=1 (每小时换文件)
+
+    线程模型:
+    - 播发线程只调用write()把帧放入有界队列，立即返回；队列满时丢弃并计数
+    - 写入线程负责打开/切换文件、写入、按策略flush/fsync
+    - 切换后关闭的分段交给压缩线程（可选gzip/lzma），压缩完成后删除原文件
+
+    每个分段同时写一个索引文件（<分段>.idx，见archidx），每帧一条定长记录
+    (偏移, 帧长, GPS周/SOW, IOD, 消息ID)，与数据文件一起flush；压缩后索引保持不变。
+    帧的历元早于上一条记录时在索引文件头设置FLAG_UNSORTED（该分段查询改为线性扫描）。
+    """
+
+    def __init__(self, save_path: str, queue_size: int = 256, flush_every: int = 1,
+                 flush_seconds: float = 1.0, fsync: bool = False,
+                 compress: Optional[str] = None):
+        """初始化归档写入器
+
+        Args:
+            save_path: 保存路径（支持时间格式和::S=N切换），例如:
+                      "output/vtec_%Y%m%d_%h%M.bin::S=1"  # 每小时换文件
+                      "output/data_%Y%m%d.bin::S=24"      # 每天换文件
+            queue_size: 写入队列长度（帧数）
+            flush_every: 每写入N帧flush一次（0表示不按帧数flush）
+            flush_seconds: 距上次flush超过T秒时flush（0表示不按时间flush）
+            fsync: flush时是否同时fsync到磁盘
+            compress: 关闭的分段压缩格式（None / 'gzip' / 'lzma'）
+        """
+        if compress is not None and compress not in COMPRESSORS:
+            raise ValueError(f'不支持的压缩格式: {compress}')
+
+        self.save_path_template = save_path
+        self.swap_interval_hours = None  # 文件切换间隔（小时）
+        self.flush_every = max(0, flush_every)
+        self.flush_seconds = max(0.0, flush_seconds)
+        self.fsync = fsync
+        self.compress = compress
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.compress_queue: queue.Queue = queue.Queue()
+        self.thread: Optional[Thread] = None
+        self.compress_thread: Optional[Thread] = None
+
+        self.save_file = None
+        self.index_file = None
+        self.segment_offset = 0  # 当前分段已写入的字节数
+        self.last_key: Optional[int] = None  # 当前分段上一条索引记录的GPS毫秒
+        self.unsorted = False  # 当前分段的索引已标记为无序
+        self.current_save_path: Optional[Path] = None
+        self.last_swap_time: Optional[datetime] = None
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+        self.written_frames = 0
+        self.written_bytes = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.segments = 0
+        self.compressed = 0
+        self.errors = 0
+        self.log = logging.getLogger('ArchiveWriter')
+
+        self._parse_save_path(save_path)
+
+    def _parse_save_path(self, path_str: str):
+        """解析保存路径配置
+
+        支持格式: path::S=N
+        其中N为小时数，例如::S=24表示24小时换一次文件
+        """
+        parts = path_str.split('::')
+        self.save_path_template = parts[0]
+
+        if len(parts) > 1:
+            # 解析切换参数 S=N
+            match = re.search(r'S=(\d+)', parts[1])
+            if match:
+                self.swap_interval_hours = int(match.group(1))
+                self.log.info(f"文件切换间隔: {self.swap_interval_hours} 小时")
+
+    def _format_save_path(self, dt: Optional[datetime] = None) -> Path:
+        """根据时间格式化保存路径
+
+        Args:
+            dt: 时间（默认当前时间）
+
+        Returns:
+            格式化后的路径
+        """
+        if dt is None:
+            dt = datetime.now()
+
+        # 替换时间占位符
+        path_str = self.save_path_template
+        path_str = path_str.replace('%Y', dt.strftime('%Y'))
+        path_str = path_str.replace('%m', dt.strftime('%m'))
+        path_str = path_str.replace('%d', dt.strftime('%d'))
+        path_str = path_str.replace('%h', dt.strftime('%H'))
+        path_str = path_str.replace('%M', dt.strftime('%M'))
+        path_str = path_str.replace('%S', dt.strftime('%S'))
+
+        return Path(path_str)
+
+    def _should_swap_file(self) -> bool:
+        """判断是否需要打开或切换文件"""
+        if not self.save_file:
+            return True
+
+        if not self.swap_interval_hours:
+            return False
+
+        now = datetime.now()
+        elapsed_hours = (now - self.last_swap_time).total_seconds() / 3600
+
+        return elapsed_hours >= self.swap_interval_hours
+
+    def start(self):
+        """启动写入线程和压缩线程"""
+        self.thread = Thread(target=self._run, name='ArchiveWriter', daemon=True)
+        self.thread.start()
+        if self.compress:
+            self.compress_thread = Thread(target=self._compress_loop, name='ArchiveCompress',
+                                          daemon=True)
+            self.compress_thread.start()
+        self.log.info(f'归档写入启动: {self.save_path_template}, 队列 {self.queue.maxsize} 帧, '
+                      f'flush每 {self.flush_every} 帧/{self.flush_seconds} 秒, fsync={self.fsync}, '
+                      f'压缩={self.compress or "无"}')
+
+    def write(self, frame) -> bool:
+        """提交一帧（播发线程调用，不阻塞）
+
+        Args:
+            frame: 二进制帧（bytes或只读memoryview，入队后不得再修改）
+
+        Returns:
+            是否成功入队（队列满时丢弃并返回False）
+        """
+        try:
+            # 播发时刻在入队时取得，写入线程积压不影响索引中记录的时刻
+            self.queue.put_nowait((frame, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self.log.warning(f'归档队列已满，丢弃帧（累计 {self.dropped}）')
+            return False
+
+    def _run(self):
+        """写入线程：取帧、切换文件、写入、按策略flush"""
+        while True:
+            timeout = None
+            if self.unflushed and self.flush_seconds:
+                timeout = max(0.0, self.last_flush + self.flush_seconds - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush()
+                continue
+            if item is _STOP:
+                break
+            frame, sent = item
+
+            try:
+                if self._should_swap_file():
+                    self._open_save_file()
+                self.save_file.write(frame)
+                sent_utc = datetime.fromtimestamp(sent, timezone.utc).replace(tzinfo=None)
+                entry = pack_entry(frame, self.segment_offset, gps_ms(sent_utc))
+                if entry:
+                    self._index(entry)
+                self.segment_offset += len(frame)
+                self.written_frames += 1
+                self.written_bytes += len(frame)
+                self.unflushed += 1
+                if self.flush_every and self.unflushed >= self.flush_every:
+                    self._flush()
+                elif self.flush_seconds and time.monotonic() - self.last_flush >= self.flush_seconds:
+                    self._flush()
+            except Exception as e:
+                self.errors += 1
+                self.log.error(f'归档写入失败: {e}')
+
+        self._close_save_file()
+
+    def _index(self, entry: bytes):
+        """写入一条索引记录；历元倒退时先在文件头设置无序标志"""
+        key = record_gps_ms(entry)
+        if not self.unsorted and self.last_key is not None and key < self.last_key:
+            # seek会先写出缓冲区，标志在这条记录之前落盘
+            self.index_file.seek(INDEX_FLAGS_POS)
+            self.index_file.write(bytes([FLAG_UNSORTED]))
+            self.index_file.seek(0, 2)
+            self.unsorted = True
+            self.log.info(f'帧历元早于上一帧，索引标记为无序: {self.current_save_path}')
+        self.last_key = key
+        self.index_file.write(entry)
+
+    def _flush(self):
+        """flush（可选fsync）当前文件和索引（先数据后索引）"""
+        if self.save_file and self.unflushed:
+            try:
+                for f in (self.save_file, self.index_file):
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+            except OSError as e:
+                self.errors += 1
+                self.log.error(f'归档flush失败: {e}')
+            self.flushes += 1
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def _open_save_file(self):
+        """打开或切换保存文件（写入线程）"""
+        # 关闭旧文件
+        self._close_save_file()
+
+        # 生成新文件路径
+        new_path = self._format_save_path()
+
+        # 创建目录
+        new_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 打开新文件
+        self.save_file = open(new_path, 'wb')
+        self.index_file = open(index_path(new_path), 'wb')
+        self.index_file.write(INDEX_MAGIC)
+        self.segment_offset = 0
+        self.last_key = None
+        self.unsorted = False
+        self.current_save_path = new_path
+        self.last_swap_time = datetime.now()
+        self.segments += 1
+
+        self.log.info(f"打开新文件: {new_path}")
+
+    def _close_save_file(self):
+        """关闭当前文件，需要压缩时交给压缩线程"""
+        if not self.save_file:
+            return
+        self._flush()
+        for f in (self.save_file, self.index_file):
+            try:
+                if self.fsync:
+                    os.fsync(f.fileno())
+                f.close()
+            except OSError as e:
+                self.errors += 1
+                self.log.error(f'关闭文件失败: {e}')
+        self.save_file = None
+        self.index_file = None
+        self.log.info(f"关闭文件: {self.current_save_path}")
+        if self.compress:
+            self.compress_queue.put(self.current_save_path)
+
+    def _compress_loop(self):
+        """压缩线程：压缩已关闭的分段"""
+        while True:
+            path = self.compress_queue.get()
+            if path is _STOP:
+                return
+            try:
+                self._compress_file(path)
+            except Exception as e:
+                self.errors += 1
+                self.log.error(f'压缩失败: {path}: {e}')
+
+    def _compress_file(self, path: Path):
+        """压缩单个分段（先写临时文件再改名，成功后删除原文件）"""
+        ext, opener = COMPRESSORS[self.compress]
+        target = path.with_name(path.name + ext)
+        tmp = path.with_name(path.name + ext + '.tmp')
+        t0 = time.perf_counter()
+        with open(path, 'rb') as src, opener(tmp, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp, target)
+        src_size = path.stat().st_size
+        path.unlink()
+        self.compressed += 1
+        self.log.info(f'压缩完成: {target.name}, {src_size} → {target.stat().st_size} 字节, '
+                      f'{(time.perf_counter() - t0) * 1000:.1f}ms')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """写入统计"""
+        return {
+            'written_frames': self.written_frames,
+            'written_bytes': self.written_bytes,
+            'dropped': self.dropped,
+            'queued': self.queue.qsize(),
+            'flushes': self.flushes,
+            'segments': self.segments,
+            'compressed': self.compressed,
+            'errors': self.errors,
+        }
+
+    def stop(self):
+        """写完队列中剩余的帧，关闭文件并等待压缩完成"""
+        if self.thread:
+            self.queue.put(_STOP)
+            self.thread.join(timeout=10.0)
+            self.thread = None
+        if self.compress_thread:
+            self.compress_queue.put(_STOP)
+            self.compress_thread.join(timeout=60.0)
+            self.compress_thread = None
+        self.log.info(f'归档写入已停止: {self.get_stats()}')
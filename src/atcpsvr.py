@@ -0,0 +1,342 @@
+# atcpsvr.py - asyncio TCP服务器（每客户端独立写协程）
+
+import asyncio
+import logging
+import time
+from collections import deque
+from threading import Thread, Event
+from typing import Deque, Dict, List, Optional, Tuple, Any, FrozenSet
+
+from src.tcpcmn import MSG_VTEC_DELTA
+from src.tcpsvr import (Admission, Subscriptions, Region, accept_queue, feed_requests, frame_msg_id, overflow_victim,
+                        select_frame, supersedes, tune_socket)
+
+
+class _Client:
+    """单个客户端连接状态（对应rtkrcv的tcp_t）"""
+
+    def __init__(self, writer: asyncio.StreamWriter, queue_size: int):
+        self.writer = writer
+        self.addr: Tuple = writer.get_extra_info('peername')
+        self.max_frames = max(1, queue_size)
+        self.pending: Deque[list] = deque()  # [消息ID, 帧, 入队时间]，写协程取出后即开始发送
+        self.ready = asyncio.Event()          # 有待发帧时置位
+        self.task: Optional[asyncio.Task] = None         # 写协程
+        self.reader_task: Optional[asyncio.Task] = None  # 读协程（连接处理）
+        self.tact = time.monotonic()  # 最近一次成功发送时间
+        self.dropped = 0
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.last_latency = 0.0   # 最近一帧入队到drain()完成的耗时（秒）
+        self.max_latency = 0.0
+        self.region: Optional[Region] = None  # 订阅区域（None为完整网格）
+        self.mount: Optional[str] = None      # 挂载点（None为端口上的默认流）
+        self.synced = False  # 当前参考关键帧是否已发送或已入队（可以接收差分帧）
+        self.rxbuf = b''
+
+    def enqueue(self, data: bytes, keyframe: Optional[bytes], now: float) -> int:
+        """帧入队（队列策略同tcpsvr.ClientConn，事件循环中调用）
+
+        Args:
+            data: 二进制帧数据
+            keyframe: 差分帧的参考关键帧（客户端尚未收到时先入队；None时丢弃该差分帧）
+            now: 入队时刻（单调时钟）
+
+        Returns:
+            因替换、溢出或缺少参考关键帧被丢弃的帧数
+        """
+        frames = [data]
+        if frame_msg_id(data) == MSG_VTEC_DELTA and not self.synced:
+            if keyframe is None:
+                return 1
+            frames = [keyframe, data]
+
+        dropped = 0
+        for frame in frames:
+            msg_id = frame_msg_id(frame)
+            kept = deque(e for e in self.pending if not supersedes(msg_id, e[0]))
+            dropped += len(self.pending) - len(kept)
+            kept.append([msg_id, frame, now])
+            self.pending = kept
+            if msg_id != MSG_VTEC_DELTA:
+                self.synced = True
+
+        while len(self.pending) > self.max_frames:
+            idx = overflow_victim([e[0] for e in self.pending], 0)
+            entry = self.pending[idx]
+            del self.pending[idx]
+            dropped += 1
+            if entry[0] != MSG_VTEC_DELTA:
+                self.synced = False
+        self.ready.set()
+        return dropped
+
+
+class AsyncTcpServer:
+    """asyncio TCP服务器（多客户端广播模式）
+
+    与TcpServer接口一致（start/accept_clients/broadcast/get_client_count/stop），
+    Broadcaster可直接替换使用。事件循环运行在独立线程中:
+    - 持续accept，新连接到达即接入，不依赖播发周期
+    - 每个客户端一个写协程，通过drain()实现背压，慢客户端不阻塞其他客户端
+    - 每客户端有界队列，队列满时丢弃最旧的待发帧（过期模型无意义）
+    - 客户端可发送 "REGION lat1 lat2 lon1 lon2" 订阅区域子网格
+    - 同一端口上有多个播发流时，客户端发送 "MOUNT 名称"（或 "GET /名称"）选择播发流
+
+    保留rtkrcv tcpsvr_t语义:
+    - 客户端数达到上限（或单IP连接数超限）时拒绝新连接并记录原因
+    - 发送失败或对端关闭（recv返回0）时断开该客户端，不影响其他客户端
+    - 新连接设置TCP_NODELAY（可配置），可选调整SO_SNDBUF
+    """
+
+    def __init__(self, host: str, port: int, max_clients: int = 10, queue_size: int = 4,
+                 backlog: int = 128, max_per_ip: int = 0,
+                 nodelay: bool = True, sndbuf: int = 0):
+        """初始化TCP服务器
+
+        Args:
+            host: 绑定地址（"0.0.0.0"监听所有接口）
+            port: 端口号
+            max_clients: 最大客户端数
+            queue_size: 每客户端待发帧队列长度
+            backlog: 监听队列长度
+            max_per_ip: 单IP最大连接数（0表示不限制）
+            nodelay: 客户端socket是否设置TCP_NODELAY
+            sndbuf: 客户端socket发送缓冲区字节数（0表示系统默认）
+        """
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.clients: Dict[int, _Client] = {}
+        self.admission = Admission(max_clients, max_per_ip)
+        self.subs = Subscriptions()
+        self.keyframes: Dict[Optional[str], bytes] = {}  # 各挂载点最近播发的关键帧（仅事件循环访问）
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.thread: Optional[Thread] = None
+        self._started = Event()
+        self._start_error: Optional[BaseException] = None
+        self.log = logging.getLogger('AsyncTcpServer')
+
+    def start(self):
+        """启动事件循环线程并开始监听"""
+        self._started.clear()
+        self._start_error = None
+        self.thread = Thread(target=self._run_loop, name='AsyncTcpServer', daemon=True)
+        self.thread.start()
+        self._started.wait()
+
+        if self._start_error:
+            self.log.error(f'启动失败: {self._start_error}')
+            raise self._start_error
+        self.log.info(f'TCP服务器启动(asyncio): {self.host}:{self.port}')
+
+    def _run_loop(self):
+        """事件循环线程入口"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port,
+                                     backlog=self.backlog, reuse_address=True))
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            self.loop.close()
+            return
+
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """新连接处理: 接入、启动写协程，并读取直到对端关闭"""
+        addr = writer.get_extra_info('peername')
+        # asyncio内部逐个accept，不记录取空耗时；只采样accept队列长度
+        for listener in (self.server.sockets if self.server else ()):
+            self.admission.record_queue(accept_queue(listener))
+        reason = self.admission.check(addr[0])
+        if reason:
+            self.log.warning(f'拒绝连接（{reason}）: {addr}')
+            writer.close()
+            return
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            tune_socket(sock, self.nodelay, self.sndbuf)
+
+        client = _Client(writer, self.queue_size)
+        client.reader_task = asyncio.current_task()
+        self.clients[id(client)] = client
+        client.task = asyncio.ensure_future(self._write_loop(client))
+        self.log.info(f'新客户端连接: {addr}, 总计 {len(self.clients)} 个')
+
+        # 读取客户端请求（区域订阅），recv返回0表示对端关闭（同readtcpsvr）
+        try:
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    break
+                client.rxbuf, regions, mounts = feed_requests(client.rxbuf, chunk)
+                if mounts or regions:
+                    client.synced = False  # 已收到的关键帧不是新订阅的参考帧
+                for mount in mounts:
+                    self.subs.change((client.mount, client.region), (mount, client.region))
+                    client.mount = mount
+                    self.log.info(f'客户端选择挂载点: {addr} → {mount or "默认"}')
+                for region in regions:
+                    self.subs.change((client.mount, client.region), (client.mount, region))
+                    client.region = region
+                    self.log.info(f'客户端订阅区域: {addr} → {region or "完整网格"}')
+            reason = '对端关闭'
+        except (ConnectionResetError, BrokenPipeError):
+            reason = '连接重置'
+        except asyncio.CancelledError:
+            reason = '服务器关闭'
+        except Exception as e:
+            self._disconnect(client, '读取异常', e)
+            return
+
+        self._disconnect(client, reason)
+
+    async def _write_loop(self, client: _Client):
+        """客户端写协程: 逐帧写出并等待drain()（背压）"""
+        try:
+            while True:
+                while not client.pending:
+                    client.ready.clear()
+                    await client.ready.wait()
+                _, frame, queued = client.pending.popleft()
+                client.writer.write(frame)
+                await client.writer.drain()
+                client.tact = time.monotonic()
+                client.sent_frames += 1
+                client.sent_bytes += len(frame)
+                client.last_latency = client.tact - queued
+                client.max_latency = max(client.max_latency, client.last_latency)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._disconnect(client, '发送失败', e)
+
+    def _disconnect(self, client: _Client, reason: str, detail: Optional[Exception] = None):
+        """断开并移除客户端（可重复调用）
+
+        Args:
+            client: 客户端
+            reason: 断开原因分类（计入accept统计）
+            detail: 引起断开的异常（只记入日志）
+        """
+        if self.clients.pop(id(client), None) is None:
+            return
+        self.admission.release(client.addr[0], reason)
+        self.subs.change((client.mount, client.region), None)
+        current = asyncio.current_task()
+        for task in (client.task, client.reader_task):
+            if task and task is not current:
+                task.cancel()
+        try:
+            client.writer.close()
+        except Exception:
+            pass
+        reason = f'{reason}: {detail}' if detail else reason
+        self.log.warning(f'客户端断开（{reason}）: {client.addr}, 剩余 {len(self.clients)} 个')
+
+    def _publish(self, data: bytes, regional: Optional[Dict[Region, bytes]] = None,
+                 mount: Optional[str] = None):
+        """在事件循环中将帧放入每个客户端的队列（附入队时刻，用于发送延迟统计）"""
+        if frame_msg_id(data) != MSG_VTEC_DELTA:
+            self.keyframes[mount] = data
+        keyframe = self.keyframes.get(mount)
+        now = time.monotonic()
+        for client in list(self.clients.values()):
+            if client.mount != mount:
+                continue
+            dropped = client.enqueue(select_frame(data, regional, client.region), keyframe, now)
+            if dropped:
+                client.dropped += dropped
+                self.log.debug(f'客户端积压，丢弃旧帧: {client.addr}, 累计 {client.dropped}')
+
+    def accept_clients(self):
+        """兼容TcpServer接口（asyncio模式下持续accept，无需轮询）"""
+        pass
+
+    def get_regions(self, mount: Optional[str] = None) -> FrozenSet[Region]:
+        """挂载点上的所有订阅区域（事件循环维护的快照）"""
+        return self.subs.get(mount)
+
+    def broadcast(self, data: bytes, regional: Optional[Dict[Region, bytes]] = None,
+                  mount: Optional[str] = None) -> int:
+        """发布一帧到挂载点上的所有客户端（线程安全，不阻塞调用方）
+
+        Args:
+            data: 二进制帧数据（完整网格）
+            regional: 区域订阅帧 {区域: 帧}，订阅了区域的客户端发送对应帧
+            mount: 挂载点（None为默认流）
+
+        Returns:
+            发布时挂载点上在线的客户端数量
+        """
+        if not data or not self.loop or not self.loop.is_running():
+            return 0
+
+        self.loop.call_soon_threadsafe(self._publish, data, regional, mount)
+        return sum(1 for c in list(self.clients.values()) if c.mount == mount)
+
+    def get_client_count(self) -> int:
+        """获取当前客户端数量"""
+        return len(self.clients)
+
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """获取每个客户端的队列与发送统计"""
+        return [{
+            'addr': c.addr,
+            'mount': c.mount,
+            'region': c.region,
+            'queued_frames': len(c.pending),
+            'sent_frames': c.sent_frames,
+            'sent_bytes': c.sent_bytes,
+            'dropped_frames': c.dropped,
+            'last_latency': c.last_latency,
+            'max_latency': c.max_latency,
+        } for c in list(self.clients.values())]
+
+    def get_accept_stats(self) -> Dict[str, Any]:
+        """获取accept统计（接入数、按原因拒绝/断开数）"""
+        return self.admission.get_stats()
+
+    def stop(self):
+        """停止TCP服务器"""
+        self.log.info('正在关闭TCP服务器...')
+
+        if self.loop and self.loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            try:
+                future.result(timeout=5.0)
+            except Exception as e:
+                self.log.error(f'关闭异常: {e}')
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+        if self.thread:
+            self.thread.join(timeout=5.0)
+
+        self.log.info('TCP服务器已关闭')
+
+    async def _shutdown(self):
+        """关闭监听socket和所有客户端"""
+        if self.server:
+            self.server.close()
+        tasks = []
+        for client in list(self.clients.values()):
+            tasks += [t for t in (client.task, client.reader_task) if t]
+            self._disconnect(client, '服务器关闭')
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
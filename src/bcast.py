@@ -2,15 +2,33 @@
 
 import logging
 import hashlib
-import re
+import time
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Optional
-from threading import Thread, Event
+from datetime import datetime, timezone
+from typing import Dict, Optional, Iterable, Any, NamedTuple
+from threading import Thread, Event, Lock
 
-from src.parser import parse_inx
-from src.encoder import encode_frame
+from src.parser import InxMaps
+from src.encoder import encode_frame, encode_delta, region_window, subset_region, FrameCache
 from src.tcpsvr import TcpServer
+from src.tcpcmn import MSG_VTEC
+from src.udpsvr import UdpSink
+from src.sched import GpsScheduler
+from src.archive import ArchiveWriter
+from src.metrics import Histogram
+
+
+class Snapshot(NamedTuple):
+    """播发快照（构建完成后不再修改，通过一次引用替换整体发布）"""
+    data: Dict[str, Any]      # 当前地图的解析结果
+    iod: int                  # 与data绑定的IOD
+    frame: memoryview         # 预编码的完整帧
+    file: Path                # 源文件
+    content_hash: str         # 文件内容SHA256
+    file_sig: tuple           # 源文件(大小, mtime_ns, inode)
+    maps: InxMaps             # 地图索引（多地图文件切换历元用）
+    map_index: int            # 当前地图下标
+    timings: Dict[str, float] # 各阶段耗时（毫秒）
 
 
 class Broadcaster:
@@ -21,15 +39,45 @@ class Broadcaster:
     - 同一文件重复播发时，IOD保持不变
     - 只有数据内容真正变化时，IOD才递增
     - 使用文件哈希作为内容标识
+    - 多地图文件按UTC时间切换历元，切换到新地图视为内容变化（IOD递增）
     
-    文件保存功能（类似rtkrcv）:
+    文件保存功能（类似rtkrcv，见ArchiveWriter）:
     - 支持时间格式路径: %Y年 %m月 %d日 %h时 %M分 %S秒
     - 支持定时切换: ::S=24 表示24小时换文件
     - 示例: output/vtec_%Y%m%d_%h%M.bin::S=1 (每小时换文件)
+    - 播发线程只把帧放入写入队列，写入/flush/切换/压缩都在后台线程
+    
+    差分帧（可选）:
+    - 每keyframe_every个播发周期发送一次完整帧（关键帧，消息ID 0x02）
+    - 其余周期发送相对最近关键帧的差分帧（消息ID 0x03），只含变化的系数和RMS
+    - 保存文件始终写完整帧
+    
+    区域订阅:
+    - 客户端订阅的区域按网格窗口裁剪RMS，每个(内容, 地图, IOD, 窗口)只编码一次
+    - 相同窗口的订阅者共享同一缓存帧；区域帧不做差分
+    
+    线程模型:
+    - 入库（set_file，监控工作线程）和历元切换（历元线程）在入库锁内构建完整的Snapshot，
+      构建成功后以一次引用赋值发布；解析失败时不发布，IOD不变
+    - 播发线程每个周期只读取一次self.snapshot，不加锁，不会看到半更新状态
+    
+    播发时刻:
+    - 由GpsScheduler驱动，节拍对齐GPS时间的interval整数倍，按单调时钟绝对截止时间等待
+    - 错过的节拍最多补发max_catchup个，其余跳过；迟到时间p50/p99见get_stats()
+    - start(driven=True)时不启动自己的播发/历元线程，由StreamHub按各流的截止时间
+      在共用线程中调用tick()/step_epoch()（多产品播发）
+    
+    运行指标（见metrics.collect_broadcaster）:
+    - 入库/编码耗时直方图只在持有入库锁时记录，播发耗时直方图和帧/字节计数只由播发线程记录，
+      每个直方图单线程写入，不加锁
     """
     
     def __init__(self, tcpsvr: TcpServer, interval: float = 10.0, 
-                 save_path: Optional[str] = None):
+                 save_path: Optional[str] = None, delta_frames: bool = False,
+                 keyframe_every: int = 6, udp_sink: Optional[UdpSink] = None,
+                 max_catchup: int = 0, archive: Optional[ArchiveWriter] = None,
+                 msg_id: int = MSG_VTEC, name: str = '', mount: Optional[str] = None,
+                 frame_cache: Optional[FrameCache] = None):
         """初始化播发管理器
         
         Args:
@@ -38,209 +86,386 @@ class Broadcaster:
             save_path: 保存路径（支持时间格式和::S=N切换），例如:
                       "output/vtec_%Y%m%d_%h%M.bin::S=1"  # 每小时换文件
                       "output/data_%Y%m%d.bin::S=24"      # 每天换文件
+            delta_frames: 是否在关键帧之间播发差分帧
+            keyframe_every: 关键帧周期（播发次数）
+            udp_sink: 可选的UDP组播发送端（与TCP同时发布）
+            max_catchup: 错过节拍时最多补发的次数（0表示跳过所有错过的节拍）
+            archive: 归档写入器（指定时忽略save_path；仅指定save_path时按默认策略创建）
+            msg_id: 完整帧的消息ID（多产品播发时区分各产品）
+            name: 播发流名称（日志和指标标签）
+            mount: 挂载点（同一端口上有多个播发流时区分，None为默认流）
+            frame_cache: 已编码帧缓存（多个播发流可共用，默认独立创建）
         """
         self.tcpsvr = tcpsvr
+        self.udp_sink = udp_sink
         self.interval = interval
-        self.save_path_template = save_path
-        self.swap_interval_hours = None  # 文件切换间隔（小时）
+        self.msg_id = msg_id
+        self.name = name
+        self.mount = mount
+        if archive is None and save_path:
+            archive = ArchiveWriter(save_path)
+        self.archive = archive
+        
+        self.snapshot: Optional[Snapshot] = None  # 当前播发快照（只整体替换）
+        self._ingest_lock = Lock()                # 串行化快照构建（播发线程不使用）
+        self.ingest_skipped = 0
+        self._region_cache = (None, {})           # (快照, {网格窗口: 区域帧})，仅播发线程访问
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
+        
+        self.delta_frames = delta_frames
+        self.keyframe_every = max(1, keyframe_every)
+        self.keyframe: Optional[memoryview] = None  # 最近播发的关键帧
+        self.keyframe_age = 0                       # 距上次关键帧的播发次数
+        self._delta = (None, None, None)            # (关键帧, 完整帧, 差分帧)
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
         
-        self.save_file = None
-        self.current_save_path: Optional[Path] = None
-        self.last_swap_time: Optional[datetime] = None
+        # 运行指标（单写线程，抓取时只读）
+        self.ingest_hist = {stage: Histogram() for stage in ('read', 'hash', 'parse')}
+        self.encode_hist = {'full': Histogram(), 'region': Histogram()}
+        self.broadcast_hist = Histogram()
+        self.frames_published = 0
+        self.frame_reuses = 0      # 直接复用上一周期已编码帧的播发周期数
+        self._last_frame = None    # 上一周期播发的快照帧（仅播发线程访问）
+        self.bytes_published = 0
+        self.bytes_delivered = 0
+        self.iod_changes = 0
         
-        self.current_file: Optional[Path] = None
-        self.current_data: Optional[Dict] = None
-        self.current_iod: int = 0
-        self.content_hash: Optional[str] = None
+        self.scheduler = GpsScheduler(interval, max_catchup)
         
         self.thread: Optional[Thread] = None
+        self.epoch_thread: Optional[Thread] = None
         self.stop_event = Event()
-        self.log = logging.getLogger('Broadcaster')
-        
-        # 解析保存路径和切换参数（必须在self.log初始化之后）
-        if save_path:
-            self._parse_save_path(save_path)
+        self.log = logging.getLogger(f'Broadcaster.{name}' if name else 'Broadcaster')
     
-    def _parse_save_path(self, path_str: str):
-        """解析保存路径配置
+    def set_file(self, filepath: Path):
+        """设置待播发文件（检查内容是否变化），构建并发布新快照
+        
+        入库流程（文件只读取一次）:
+        1. stat快速路径：(大小, mtime_ns, inode)与当前快照一致时直接跳过
+        2. 一次read()读入内存，哈希与解析使用同一缓冲区
+        3. 预编码当前帧；各阶段耗时记入日志和快照
         
-        支持格式: path::S=N
-        其中N为小时数，例如::S=24表示24小时换一次文件
+        Args:
+            filepath: INX文件路径
         """
-        parts = path_str.split('::')
-        self.save_path_template = parts[0]
+        with self._ingest_lock:
+            snap = self._ingest(filepath)
+            if snap is None:
+                return
+            self.snapshot = snap  # 单次引用替换
+            t = snap.timings
+            for stage, hist in self.ingest_hist.items():
+                hist.observe(t[stage] / 1000)
         
-        if len(parts) > 1:
-            # 解析切换参数 S=N
-            match = re.search(r'S=(\d+)', parts[1])
-            if match:
-                self.swap_interval_hours = int(match.group(1))
-                self.log.info(f"文件切换间隔: {self.swap_interval_hours} 小时")
+
+        self.log.info(f'加载文件: {filepath.name}, 地图 {snap.map_index + 1}/{len(snap.maps)}, IOD={snap.iod}')
+        self.log.info(f'入库耗时: stat {t["stat"]:.2f}ms, 读取 {t["read"]:.2f}ms '
+                      f'({snap.file_sig[0]} 字节), 哈希 {t["hash"]:.2f}ms, 解析 {t["parse"]:.2f}ms, '
+                      f'编码 {t["encode"]:.2f}ms, 合计 {t["total"]:.2f}ms')
     
-    def _format_save_path(self, dt: Optional[datetime] = None) -> Path:
-        """根据时间格式化保存路径
+    def _ingest(self, filepath: Path) -> Optional[Snapshot]:
+        """读取、哈希、解析、编码，构建新快照（调用方持有入库锁）
         
-        Args:
-            dt: 时间（默认当前时间）
-            
         Returns:
-            格式化后的路径
+            新快照；文件未变化或失败时返回None（当前快照保持不变）
         """
-        if not self.save_path_template:
+        base = self.snapshot
+        t0 = time.perf_counter()
+        try:
+            st = filepath.stat()
+        except OSError as e:
+            self.log.error(f'读取文件状态失败: {e}')
+            return None
+        sig = (st.st_size, st.st_mtime_ns, st.st_ino)
+        if base is not None and sig == base.file_sig:
+            self.ingest_skipped += 1
+            self.log.debug(f'文件未变化（stat一致），跳过: {filepath.name}')
             return None
         
-        if dt is None:
-            dt = datetime.now()
+        # 读取一次
+        t1 = time.perf_counter()
+        try:
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+        except OSError as e:
+            self.log.error(f'读取文件失败: {e}')
+            return None
         
-        # 替换时间占位符
-        path_str = self.save_path_template
-        path_str = path_str.replace('%Y', dt.strftime('%Y'))
-        path_str = path_str.replace('%m', dt.strftime('%m'))
-        path_str = path_str.replace('%d', dt.strftime('%d'))
-        path_str = path_str.replace('%h', dt.strftime('%H'))
-        path_str = path_str.replace('%M', dt.strftime('%M'))
-        path_str = path_str.replace('%S', dt.strftime('%S'))
+        # 计算内容哈希（IOD绑定）
+        t2 = time.perf_counter()
+        new_hash = hashlib.sha256(raw).hexdigest()
         
-        return Path(path_str)
-    
-    def _should_swap_file(self) -> bool:
-        """判断是否需要切换文件"""
-        if not self.swap_interval_hours:
-            return False
+        # 建立地图索引，仅解码当前时刻对应的地图（与哈希共用同一缓冲区）
+        t3 = time.perf_counter()
+        try:
+            maps = InxMaps(str(filepath), data=raw)
+            k = maps.select(self._utcnow())
+            data = maps.load(k)
+        except Exception as e:
+            self.log.error(f'解析文件失败: {e}')
+            return None
         
-        if not self.last_swap_time:
-            return True
+        iod = base.iod if base is not None else 0
+        if base is None or new_hash != base.content_hash:
+            iod = (iod + 1) % 256
+            self.log.info(f'检测到新内容，IOD更新为 {iod}')
+        elif k != base.map_index:
+            # 同一文件但历元已切换，地图内容变化
+            iod = (iod + 1) % 256
+        else:
+            self.log.debug(f'内容未变化，IOD保持 {iod}')
         
-        now = datetime.now()
-        elapsed_hours = (now - self.last_swap_time).total_seconds() / 3600
+        # 在非播发线程上预先编码
+        t4 = time.perf_counter()
+        try:
+            frame = self._encode(new_hash, k, data, iod)
+        except Exception as e:
+            self.log.error(f'编码失败: {e}')
+            return None
+        t5 = time.perf_counter()
+        if base is None or iod != base.iod:
+            self.iod_changes += 1
         
-        return elapsed_hours >= self.swap_interval_hours
+        timings = {
+            'stat': (t1 - t0) * 1000, 'read': (t2 - t1) * 1000, 'hash': (t3 - t2) * 1000,
+            'parse': (t4 - t3) * 1000, 'encode': (t5 - t4) * 1000, 'total': (t5 - t0) * 1000,
+        }
+        return Snapshot(data, iod, frame, filepath, new_hash, sig, maps, k, timings)
+    
+    @staticmethod
+    def _utcnow() -> datetime:
+        """当前UTC时间（naive，与INX历元一致）"""
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    
+    def _epoch_loop(self):
+        """历元线程：多地图文件随时间推移切换地图（不在播发线程上解码/编码）"""
+        while not self.stop_event.wait(min(self.interval, 1.0)):
+            self.step_epoch()
+    
+    def step_epoch(self):
+        """检查并切换多地图文件的当前历元（历元线程或StreamHub调用）"""
+        try:
+            with self._ingest_lock:
+                self._step_epoch()
+        except Exception as e:
+            self.log.error(f'历元切换异常: {e}')
     
-    def _open_save_file(self):
-        """打开或切换保存文件"""
-        if not self.save_path_template:
+    def _step_epoch(self):
+        """多地图文件：切换到当前时刻对应历元的地图并发布新快照（调用方持有入库锁）"""
+        base = self.snapshot
+        if base is None or len(base.maps) <= 1:
             return
         
-        # 关闭旧文件
-        if self.save_file:
-            self.save_file.close()
-            self.log.info(f"关闭文件: {self.current_save_path}")
+        k = base.maps.select(self._utcnow())
+        if k == base.map_index:
+            return
         
-        # 生成新文件路径
-        new_path = self._format_save_path()
+        t0 = time.perf_counter()
+        try:
+            data = base.maps.load(k)
+            t1 = time.perf_counter()
+            iod = (base.iod + 1) % 256
+            frame = self._encode(base.content_hash, k, data, iod)
+        except Exception as e:
+            self.log.error(f'加载地图 {k + 1} 失败: {e}')
+            return
+        t2 = time.perf_counter()
         
-        # 创建目录
-        new_path.parent.mkdir(parents=True, exist_ok=True)
+        timings = {'parse': (t1 - t0) * 1000, 'encode': (t2 - t1) * 1000, 'total': (t2 - t0) * 1000}
+        self.snapshot = base._replace(data=data, iod=iod, frame=frame, map_index=k, timings=timings)
+        self.iod_changes += 1
+        self.ingest_hist['parse'].observe(t1 - t0)
+        self.log.info(f'切换到地图 {k + 1}/{len(base.maps)} ({data["time"]}), IOD更新为 {iod}')
+    
+    def _encode(self, content_hash: str, map_index: int, data: Dict[str, Any], iod: int) -> memoryview:
+        """获取已编码帧（按内容、地图、IOD和消息ID缓存，仅在变化时重新编码）"""
+        key = (content_hash, map_index, iod, self.msg_id)
         
-        # 打开新文件
-        self.save_file = open(new_path, 'wb')
-        self.current_save_path = new_path
-        self.last_swap_time = datetime.now()
+        def encode() -> memoryview:
+            t0 = time.perf_counter()
+            frame = encode_frame(data, iod, self.msg_id)
+            self.encode_hist['full'].observe(time.perf_counter() - t0)
+            self.log.info(f'编码新帧: {len(frame)} 字节, IOD={iod}')
+            return frame
         
-        self.log.info(f"打开新文件: {new_path}")
+        return self.frame_cache.get(key, encode)
     
-    def set_file(self, filepath: Path):
-        """设置待播发文件（检查内容是否变化）
+    @property
+    def current_data(self) -> Optional[Dict[str, Any]]:
+        """当前播发的模型数据（只读视图，来自当前快照）"""
+        snap = self.snapshot
+        return snap.data if snap else None
+    
+    @property
+    def current_iod(self) -> int:
+        """当前IOD（来自当前快照）"""
+        snap = self.snapshot
+        return snap.iod if snap else 0
+    
+    @property
+    def current_file(self) -> Optional[Path]:
+        """当前源文件（来自当前快照）"""
+        snap = self.snapshot
+        return snap.file if snap else None
+    
+    def _regional_frames(self, snap: Snapshot, regions: Iterable) -> Optional[Dict]:
+        """为每个订阅区域获取裁剪后的已编码帧（按快照和网格窗口缓存，仅播发线程调用）
         
         Args:
-            filepath: INX文件路径
+            snap: 本周期播发的快照
+            regions: 客户端订阅的区域集合
+        
+        Returns:
+            {区域: 帧}；覆盖完整网格或与网格无交集的区域不列出（发送完整帧）
         """
-        # 计算文件哈希（内容标识）
-        new_hash = self._compute_hash(filepath)
-        
-        if new_hash != self.content_hash:
-            # 内容变化，更新IOD
-            self.current_iod = (self.current_iod + 1) % 256
-            self.content_hash = new_hash
-            self.log.info(f'检测到新内容，IOD更新为 {self.current_iod}')
-        else:
-            self.log.debug(f'内容未变化，IOD保持 {self.current_iod}')
+        if not regions:
+            return None
         
-        # 解析文件
-        try:
-            self.current_data = parse_inx(str(filepath))
-            self.current_file = filepath
-            self.log.info(f'加载文件: {filepath.name}, IOD={self.current_iod}')
-        except Exception as e:
-            self.log.error(f'解析文件失败: {e}')
+        if self._region_cache[0] is not snap:
+            self._region_cache = (snap, {})
+        cache = self._region_cache[1]
+        
+        data, iod = snap.data, snap.iod
+        full = (0, len(data['rms']) - 1, 0, len(data['rms'][0]) - 1) if data['rms'] else None
+        frames = {}
+        for region in regions:
+            window = region_window(data, region)
+            if window is None or window == full:
+                continue
+            frame = cache.get(window)
+            if frame is None:
+                t0 = time.perf_counter()
+                frame = encode_frame(subset_region(data, window), iod, self.msg_id)
+                self.encode_hist['region'].observe(time.perf_counter() - t0)
+                cache[window] = frame
+                self.log.info(f'编码区域帧: 窗口{window}, {len(frame)} 字节, IOD={iod}')
+            frames[region] = frame
+        return frames
     
-    def _compute_hash(self, filepath: Path) -> str:
-        """计算文件内容哈希（用于IOD绑定）
+    def _outgoing_frame(self, frame: memoryview) -> memoryview:
+        """选择本周期播发的帧：到期或无法差分时发关键帧，否则发差分帧"""
+        if not self.delta_frames:
+            return frame
         
-        Args:
-            filepath: 文件路径
+        if self.keyframe is not None and self.keyframe_age < self.keyframe_every:
+            ref, full, delta = self._delta
+            if ref is not self.keyframe or full is not frame:
+                delta = encode_delta(self.keyframe, frame)
+                self._delta = (self.keyframe, frame, delta)
+                if delta is not None:
+                    self.log.debug(f'编码差分帧: {len(delta)}/{len(frame)} 字节, 参考IOD={self.keyframe[12]}')
+            if delta is not None:
+                self.keyframe_age += 1
+                self.deltas_sent += 1
+                return delta
         
-        Returns:
-            SHA256哈希值
+        self.keyframe = frame
+        self.keyframe_age = 1
+        self.keyframes_sent += 1
+        return frame
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """播发统计（每周期复用已编码帧次数 / 帧缓存命中与编码次数 / 关键帧与差分帧播发次数 / 节拍迟到）
+        
+        frame_hits为直接复用上一周期已编码帧的播发周期数（文件或IOD不变时每周期+1）；
+        cache_hits / frame_encodes为入库和历元切换时帧缓存的命中与编码次数（多流共用缓存时为合计）。
         """
-        try:
-            with open(filepath, 'rb') as f:
-                return hashlib.sha256(f.read()).hexdigest()
-        except Exception as e:
-            self.log.error(f'计算哈希失败: {e}')
-            return ''
+        cache = self.frame_cache.get_stats()
+        return {
+            'frame_hits': self.frame_reuses,
+            'frame_encodes': cache['encodes'],
+            'cache_hits': cache['hits'],
+            'keyframes': self.keyframes_sent,
+            'deltas': self.deltas_sent,
+            'iod': self.current_iod,
+            **self.scheduler.get_stats(),
+            'archive_dropped': self.archive.dropped if self.archive else 0,
+        }
     
-    def start(self):
-        """启动定时播发线程"""
+    def start(self, driven: bool = False):
+        """启动定时播发线程
+        
+        Args:
+            driven: 为True时只启动归档写入，不创建播发/历元线程（由StreamHub调用tick()/step_epoch()）
+        """
         if self.thread and self.thread.is_alive():
             self.log.warning('播发线程已在运行')
             return
         
         self.stop_event.clear()
+        if self.archive:
+            self.archive.start()
+        if driven:
+            return
         self.thread = Thread(target=self._broadcast_loop, daemon=True)
         self.thread.start()
-        self.log.info(f'播发线程启动，间隔 {self.interval} 秒')
+        self.epoch_thread = Thread(target=self._epoch_loop, name='EpochStep', daemon=True)
+        self.epoch_thread.start()
+        self.log.info(f'播发线程启动，间隔 {self.interval} 秒（对齐GPS时间，最多补发 '
+                      f'{self.scheduler.max_catchup} 个节拍）')
     
     def _broadcast_loop(self):
-        """播发循环（每隔interval秒发送一次）"""
-        # 首次打开文件
-        if self.save_path_template and not self.save_file:
-            self._open_save_file()
-        
-        while not self.stop_event.is_set():
-            try:
-                # 检查是否需要切换文件
-                if self._should_swap_file():
-                    self._open_save_file()
+        """播发循环（在GPS时间对齐的节拍上发送）"""
+        while True:
+            # 等待下一个节拍
+            tick = self.scheduler.wait(self.stop_event)
+            if tick is None:
+                break
+            self.tick()
+    
+    def tick(self):
+        """执行一个播发周期（播发线程或StreamHub在节拍时刻调用）"""
+        t0 = time.perf_counter()
+        try:
+            # 接受新客户端
+            self.tcpsvr.accept_clients()
+            
+            # 播发数据（只读取一次快照引用，本周期内data/IOD/帧保持一致）
+            snap = self.snapshot
+            if snap is not None:
+                frame = snap.frame
+                if frame is self._last_frame:
+                    self.frame_reuses += 1
+                self._last_frame = frame
                 
-                # 接受新客户端
-                self.tcpsvr.accept_clients()
+                # 保存到文件（入队即返回）
+                if self.archive:
+                    self.archive.write(frame)
                 
-                # 播发数据
-                if self.current_data:
-                    frame = encode_frame(self.current_data, self.current_iod)
-                    
-                    # 保存到文件
-                    if self.save_file:
-                        self.save_file.write(frame)
-                        self.save_file.flush()
-                    
-                    sent = self.tcpsvr.broadcast(frame)
-                    
-                    if sent > 0:
-                        self.log.info(f'播发成功: {len(frame)} 字节 → {sent} 客户端, IOD={self.current_iod}')
-                    else:
-                        self.log.debug(f'无客户端连接，跳过播发')
-                else:
-                    self.log.debug('无数据，跳过播发')
+                out = self._outgoing_frame(frame)
+                regional = self._regional_frames(snap, self.tcpsvr.get_regions(self.mount))
+                sent = self.tcpsvr.broadcast(out, regional, self.mount)
+                if self.udp_sink:
+                    self.udp_sink.broadcast(out)
+                self.frames_published += 1
+                self.bytes_published += len(out)
+                self.bytes_delivered += sent * len(out)
+                self.broadcast_hist.observe(time.perf_counter() - t0)
                 
-            except Exception as e:
-                self.log.error(f'播发异常: {e}')
+                if sent > 0:
+                    self.log.info(f'播发成功: {len(out)} 字节 → {sent} 客户端, IOD={snap.iod}')
+                    if self.log.isEnabledFor(logging.DEBUG):
+                        self.log.debug(f'帧缓存: {self.get_stats()}')
+                else:
+                    self.log.debug(f'无客户端连接，跳过播发')
+            else:
+                self.log.debug('无数据，跳过播发')
             
-            # 等待下一个周期
-            self.stop_event.wait(self.interval)
+        except Exception as e:
+            self.log.error(f'播发异常: {e}')
     
     def stop(self):
         """停止播发线程"""
         self.log.info('正在停止播发线程...')
         self.stop_event.set()
         
-        if self.thread:
-            self.thread.join(timeout=5.0)
+        for thread in (self.thread, self.epoch_thread):
+            if thread:
+                thread.join(timeout=5.0)
         
-        # 关闭保存文件
-        if self.save_file:
-            self.save_file.close()
-            self.log.info(f'已关闭保存文件: {self.current_save_path}')
+        # 写完剩余帧并关闭保存文件
+        if self.archive:
+            self.archive.stop()
         
         self.log.info('播发线程已停止')
@@ -0,0 +1,231 @@
+# decoder.py - 帧解码器（流式增量解析 + 归档批量解析）
+
+import mmap
+import struct
+from binascii import crc_hqx
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from src.tcpcmn import FRAME_MAGIC, FRAME_TAIL, FRAME_MIN_LEN, buffer_find
+
+_MAGIC_BYTES = struct.pack('>H', FRAME_MAGIC)
+_HEADER = struct.Struct('>HBHHIBB')
+
+# 帧长字段为U16
+MAX_FRAME_LEN = 0xFFFF
+
+# next_frame() 返回状态
+NEED_MORE = 0  # 数据不足（偏移处为候选帧起点或可能的半个魔数）
+FRAME = 1      # 偏移处为一个校验通过的帧
+BAD = 2        # 偏移处的候选帧长度/CRC/尾部错误，需从下一字节重新同步
+
+
+def next_frame(view: memoryview, find, pos: int, end: int,
+               max_len: int = MAX_FRAME_LEN) -> Tuple[int, int, int]:
+    """从pos起查找下一帧
+
+    Args:
+        view: 数据的memoryview
+        find: 底层对象的find方法（bytes/bytearray/mmap均支持find(sub, start, end)）
+        pos: 起始偏移
+        end: 有效数据结束偏移
+        max_len: 允许的最大帧长（超过视为损坏）
+
+    Returns:
+        (状态, 偏移, 帧长)；NEED_MORE时偏移为需要保留的数据起点
+    """
+    at = find(_MAGIC_BYTES, pos, end)
+    if at < 0:
+        # 末尾字节可能是下一个魔数的前半部分
+        keep = end - 1 if end > pos and view[end - 1] == _MAGIC_BYTES[0] else end
+        return NEED_MORE, keep, 0
+    if at + 5 > end:
+        return NEED_MORE, at, 0
+
+    length = (view[at + 3] << 8) | view[at + 4]
+    if length < FRAME_MIN_LEN or length > max_len:
+        return BAD, at, length
+    stop = at + length
+    if stop > end:
+        return NEED_MORE, at, length
+
+    crc_recv = (view[stop - 4] << 8) | view[stop - 3]
+    tail = (view[stop - 2] << 8) | view[stop - 1]
+    if tail != FRAME_TAIL or crc_hqx(view[at + 2:stop - 4], 0) != crc_recv:
+        return BAD, at, length
+    return FRAME, at, length
+
+
+def parse_header(frame) -> Dict[str, Any]:
+    """解析帧Header
+
+    Returns:
+        {'msg_id', 'length', 'week', 'sow', 'interval', 'iod'}，sow单位为秒
+    """
+    _, msg_id, length, week, sow_ms, interval, iod = _HEADER.unpack_from(frame)
+    return {
+        'msg_id': msg_id,
+        'length': length,
+        'week': week,
+        'sow': sow_ms / 1000.0,
+        'interval': interval,
+        'iod': iod,
+    }
+
+
+class FrameDecoder:
+    """帧解码器
+
+    流式（feed）:
+    - 接收任意切分的字节块，搜索魔数0x01AA，按长度字段等待完整帧后校验CRC和尾部标记
+    - 校验失败时从候选帧的下一字节重新搜索魔数，丢弃的字节计入skipped_bytes
+    - 内部缓冲区用读偏移推进，只在已消费部分超过一半时整体前移，
+      总拷贝量与输入长度成线性关系
+    - 缓冲区为空时直接在调用方传入的bytes上解析，完整帧以切片返回（不拷贝）
+
+    批量（iter_buffer / iter_archive）:
+    - 在bytes/mmap上一次扫描，产生指向原缓冲区的memoryview切片（不拷贝）
+    """
+
+    def __init__(self, max_len: int = MAX_FRAME_LEN):
+        """初始化解码器
+
+        Args:
+            max_len: 允许的最大帧长（字节），超过视为损坏并重新同步
+        """
+        self.max_len = max(FRAME_MIN_LEN, min(max_len, MAX_FRAME_LEN))
+        self._buf = bytearray()
+        self._pos = 0  # 缓冲区中已消费的字节数
+        self.frames = 0
+        self.frame_bytes = 0
+        self.bad_frames = 0     # 长度/CRC/尾部校验失败的候选帧
+        self.skipped_bytes = 0  # 重新同步时丢弃的字节
+        self.input_bytes = 0
+
+    def _scan(self, view: memoryview, find, pos: int, end: int, out: List, copy: bool) -> int:
+        """解析view[pos:end]中的完整帧追加到out，返回未消费数据的起点"""
+        while True:
+            status, at, length = next_frame(view, find, pos, end, self.max_len)
+            self.skipped_bytes += at - pos
+            if status == FRAME:
+                frame = view[at:at + length]
+                out.append(memoryview(bytes(frame)) if copy else frame)
+                self.frames += 1
+                self.frame_bytes += length
+                pos = at + length
+            elif status == BAD:
+                self.bad_frames += 1
+                pos = at + 1
+            else:
+                return at
+
+    def feed(self, chunk) -> List[memoryview]:
+        """输入一段字节流
+
+        Args:
+            chunk: 接收到的数据（任意长度，可在帧中间切分）
+
+        Returns:
+            本次解析出的完整帧（只读memoryview）。直接在chunk上解析出的帧引用chunk本身，
+            chunk为bytearray等可变对象时会复制
+        """
+        n = len(chunk)
+        if not n:
+            return []
+        self.input_bytes += n
+        frames: List[memoryview] = []
+
+        if self._pos == len(self._buf) and isinstance(chunk, bytes):
+            # 快速路径：无残留数据，直接在不可变的chunk上解析
+            self._buf.clear()
+            self._pos = 0
+            with memoryview(chunk) as view:
+                rest = self._scan(view, chunk.find, 0, n, frames, copy=False)
+                if rest < n:
+                    self._buf += view[rest:]
+            return frames
+
+        # 丢弃已消费部分（超过一半时才前移，摊还线性）
+        if self._pos and self._pos * 2 >= len(self._buf):
+            del self._buf[:self._pos]
+            self._pos = 0
+        self._buf += chunk
+
+        buf = self._buf
+        with memoryview(buf) as view:
+            self._pos = self._scan(view, buf.find, self._pos, len(buf), frames, copy=True)
+        if self._pos == len(buf):
+            buf.clear()
+            self._pos = 0
+        return frames
+
+    @property
+    def buffered(self) -> int:
+        """缓冲区中等待后续数据的字节数"""
+        return len(self._buf) - self._pos
+
+    def reset(self):
+        """清空缓冲区（例如重新连接后）"""
+        self._buf.clear()
+        self._pos = 0
+
+    def iter_buffer(self, buffer) -> Iterator[memoryview]:
+        """批量解析完整缓冲区（例如mmap的.bin归档），产生原缓冲区上的memoryview切片
+
+        末尾不完整的帧计入skipped_bytes。不使用也不影响流式缓冲区。
+
+        Args:
+            buffer: bytes / bytearray / mmap，或覆盖其整体的memoryview
+                （memoryview切片搜索魔数时会拷贝一份，见tcpcmn.buffer_find）
+        """
+        find = buffer_find(buffer)
+        view = memoryview(buffer)
+        end = len(view)
+        self.input_bytes += end
+        pos = 0
+        while True:
+            status, at, length = next_frame(view, find, pos, end, self.max_len)
+            self.skipped_bytes += at - pos
+            if status == FRAME:
+                self.frames += 1
+                self.frame_bytes += length
+                pos = at + length
+                yield view[at:pos]
+            elif status == BAD:
+                self.bad_frames += 1
+                pos = at + 1
+            else:
+                self.skipped_bytes += end - at
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        """解码统计"""
+        return {
+            'frames': self.frames,
+            'frame_bytes': self.frame_bytes,
+            'bad_frames': self.bad_frames,
+            'skipped_bytes': self.skipped_bytes,
+            'input_bytes': self.input_bytes,
+            'buffered': self.buffered,
+        }
+
+
+def iter_archive(path: Path, decoder: Optional[FrameDecoder] = None) -> Iterator[memoryview]:
+    """mmap一个.bin归档并逐帧产生memoryview（不拷贝，迭代结束前有效）
+
+    Args:
+        path: 归档文件路径
+        decoder: 用于累计统计的解码器（默认新建）
+    """
+    decoder = decoder or FrameDecoder()
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield from decoder.iter_buffer(mm)
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            pass  # 调用方仍持有帧切片，随对象回收释放
@@ -1,33 +1,112 @@
 # encoder.py - 二进制协议编码器
 
+import math
 import struct
-from typing import List, Dict, Any
-from src.tcpcmn import crc16, utc2gps, rms2idx
+from collections import OrderedDict
+from itertools import chain
+from threading import Lock
+from typing import List, Dict, Any, Callable, Hashable, Optional
+from src.tcpcmn import (crc16, utc2gps, rms2idx, RMS_BOUNDS,
+                        FRAME_MAGIC, FRAME_TAIL, FRAME_HEADER_LEN, FRAME_TAIL_LEN,
+                        MSG_VTEC, MSG_VTEC_DELTA)
 
+# 可选依赖：NumPy向量化编码（未安装时使用纯Python实现，输出逐字节一致）
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def encode_frame(data: Dict[str, Any], iod: int) -> bytes:
+USE_NUMPY = np is not None
+
+# RMS分档上界（searchsorted用）
+_RMS_UPPER = np.asarray(RMS_BOUNDS[1:], dtype=np.float64) if np is not None else None
+
+_I32_MIN = -2**31
+_I32_MAX = 2**31 - 1
+
+
+class FrameCache:
+    """已编码帧缓存（编码一次，多次播发）
+
+    帧内容只由数据内容、IOD和消息ID决定，键一般为(内容哈希, 地图序号, IOD, 消息ID)；
+    多个播发流可共用同一缓存（相同文件、IOD和消息ID只编码一次）；
+    缓存的帧为不可变bytes或只读memoryview，可直接被每个播发周期复用。
+    """
+
+    def __init__(self, max_entries: int = 8):
+        """初始化帧缓存
+
+        Args:
+            max_entries: 最多保留的帧数（LRU淘汰）
+        """
+        self.max_entries = max_entries
+        self.frames: "OrderedDict[Hashable, memoryview]" = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.encodes = 0
+
+    def get(self, key: Hashable, encode: Callable[[], bytes]) -> memoryview:
+        """获取缓存帧，未命中时调用encode()编码并缓存
+
+        Args:
+            key: 缓存键
+            encode: 编码函数（无参，返回bytes或memoryview）
+
+        Returns:
+            不可变帧数据
+        """
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                self.hits += 1
+                return frame
+
+        frame = encode()
+        if not isinstance(frame, bytes):
+            frame = memoryview(frame).toreadonly()
+
+        with self.lock:
+            self.encodes += 1
+            self.frames[key] = frame
+            self.frames.move_to_end(key)
+            while len(self.frames) > self.max_entries:
+                self.frames.popitem(last=False)
+        return frame
+
+    def get_stats(self) -> Dict[str, int]:
+        """缓存统计: 命中次数 / 编码次数 / 当前条目数"""
+        with self.lock:
+            return {'hits': self.hits, 'encodes': self.encodes, 'entries': len(self.frames)}
+
+
+def encode_frame(data: Dict[str, Any], iod: int, msg_id: int = MSG_VTEC) -> memoryview:
     """将模型数据编码为二进制帧
     
+    帧一次性写入预分配缓冲区（struct.pack_into按固定偏移写入），
+    CRC直接在同一缓冲区上计算，无中间拼接。
+    
     Args:
         data: parse_inx()返回的字典
         iod: IOD计数器（绑定数据内容，非发送次数）
+        msg_id: 消息ID（多产品播发时区分各产品，默认0x02）
     
     Returns:
-        完整二进制帧（Header + Body + Tail）
+        完整二进制帧（Header + Body + Tail）的只读memoryview
     """
-    # 1. 编码Body部分（用于计算长度）
-    body = _encode_body(data)
+    # 1. 计算Body长度（用于帧长度和缓冲区分配）
+    body_len = _body_size(data)
     
     # 2. 编码Header（严格按照设计文档13字节）
-    msg_id = 0x02
-    length = 13 + len(body) + 4  # Header(13B) + Body + Tail(4B)
+    length = FRAME_HEADER_LEN + body_len + FRAME_TAIL_LEN  # Header(13B) + Body + Tail(4B)
     week, sow = utc2gps(data['time'])
     sow = int(sow * 1000)  # 单位0.001秒，需乘1000
     interval = data.get('interval', 900) // 60  # 从data读取（秒）转换为分钟
     
-    header = struct.pack(
-        '>HBHHIBB',
-        0x01AA,       # 魔数 2字节
+    buf = bytearray(length)
+    struct.pack_into(
+        '>HBHHIBB', buf, 0,
+        FRAME_MAGIC,  # 魔数 2字节
         msg_id,       # 消息ID 1字节
         length,       # 帧长度 2字节
         week,         # GPS周 2字节
@@ -36,18 +115,175 @@ def encode_frame(data: Dict[str, Any], iod: int) -> bytes:
         iod           # IOD 1字节
     )
     
-    # 3. 计算CRC（从消息ID到Body结束）
-    crc_data = header[2:] + body  # 跳过魔数
-    checksum = crc16(crc_data)
+    # 3. 编码Body
+    _encode_body_into(buf, FRAME_HEADER_LEN, data)
+    
+    # 4. 计算CRC（从消息ID到Body结束，跳过魔数）并编码Tail
+    view = memoryview(buf)
+    checksum = crc16(view[2:length - FRAME_TAIL_LEN])
+    struct.pack_into('>HH', buf, length - FRAME_TAIL_LEN, checksum, FRAME_TAIL)
+    
+    return view.toreadonly()
+
+
+# Body定长部分: U16x2 + U8x2 + (I16x4 + U8x2) + U16
+BODY_FIXED_LEN = 4 + 2 + 10 + 2
+
+def _grid_span(start: float, step: float, n: int, lo: float, hi: float):
+    """区间[lo, hi]覆盖的网格节点序号范围（向外取整到节点），无交集返回None"""
+    if n <= 0:
+        return None
+    if step == 0:
+        return (0, n - 1) if lo <= start <= hi else None
+    a, b = (lo - start) / step, (hi - start) / step
+    first = max(0, math.floor(min(a, b) + 1e-6))
+    last = min(n - 1, math.ceil(max(a, b) - 1e-6))
+    return (first, last) if first <= last else None
+
+
+def region_window(data: Dict[str, Any], region) -> Optional[tuple]:
+    """区域 → RMS网格窗口（行列序号）
+    
+    Args:
+        data: parse_inx()返回的字典
+        region: (lat_min, lat_max, lon_min, lon_max)，单位度
+    
+    Returns:
+        (行起, 行止, 列起, 列止)（含两端）；与网格无交集返回None
+    """
+    rms = data['rms']
+    if not rms or not rms[0]:
+        return None
+    lat1, _, dlat = data['lat']
+    lon1, _, dlon = data['lon']
+    rows = _grid_span(lat1, dlat, len(rms), region[0], region[1])
+    cols = _grid_span(lon1, dlon, len(rms[0]), region[2], region[3])
+    if rows is None or cols is None:
+        return None
+    return rows + cols
+
+
+def subset_region(data: Dict[str, Any], window: tuple) -> Dict[str, Any]:
+    """裁剪网格到窗口（系数为全局模型，保持不变）
+    
+    Args:
+        data: parse_inx()返回的字典
+        window: region_window()返回的(行起, 行止, 列起, 列止)
+    
+    Returns:
+        网格定义和RMS矩阵裁剪后的新字典（浅拷贝）
+    """
+    i0, i1, j0, j1 = window
+    lat1, _, dlat = data['lat']
+    lon1, _, dlon = data['lon']
+    sub = dict(data)
+    sub['lat'] = (lat1 + i0 * dlat, lat1 + i1 * dlat, dlat)
+    sub['lon'] = (lon1 + j0 * dlon, lon1 + j1 * dlon, dlon)
+    sub['rms'] = [row[j0:j1 + 1] for row in data['rms'][i0:i1 + 1]]
+    return sub
+
+
+# 差分帧Body定长部分: U8参考IOD + U16参考帧CRC + U16重建帧CRC + U16x2变化计数
+DELTA_FIXED_LEN = 1 + 2 + 2 + 2 + 2
+
+
+def encode_delta(ref: bytes, frame: bytes) -> Optional[memoryview]:
+    """编码差分帧（消息ID 0x03）：只携带相对参考关键帧变化的系数和RMS字节
+    
+    差分帧Header与完整帧相同（GPS时间、建模间隔、IOD均为新帧的值），Body结构:
+    - U8  参考IOD（接收端已持有的关键帧）
+    - U16 参考关键帧CRC（确认参考帧一致，防止IOD回绕误用）
+    - U16 重建后完整帧的CRC（接收端逐字节校验）
+    - U16 变化系数个数C，随后C组 (U16 系数序号, I32 系数值)
+    - U16 变化RMS字节数R，随后R组 (U16 RMS字节序号, U8 两个网格点的索引)
+    
+    接收端重建: 复制参考关键帧 → 替换Header中GPS时间/建模间隔/IOD →
+    按序号覆盖系数和RMS字节 → 重算CRC，应与差分帧携带的CRC一致。
+    
+    Args:
+        ref: 参考关键帧（encode_frame输出）
+        frame: 新的完整帧（encode_frame输出）
+    
+    Returns:
+        差分帧只读memoryview；帧长或网格/阶数等结构不一致、
+        或差分帧不比完整帧小时返回None（应发送完整帧）
+    """
+    ref, frame = memoryview(ref), memoryview(frame)
+    length = len(frame)
+    if len(ref) != length or length < FRAME_HEADER_LEN + BODY_FIXED_LEN + FRAME_TAIL_LEN:
+        return None
+    
+    # 结构字段（半径/参考高/代号/阶数、网格定义）必须一致
+    body = FRAME_HEADER_LEN
+    coef_start = body + 6
+    if ref[body:coef_start] != frame[body:coef_start]:
+        return None
+    order = frame[body + 5]
+    coef_cnt = ((order >> 4) + 1) * ((order & 0x0F) + 1)
+    grid_start = coef_start + 4 * coef_cnt
+    rms_start = grid_start + 12
+    rms_end = length - FRAME_TAIL_LEN
+    if rms_start > rms_end or ref[grid_start:rms_start] != frame[grid_start:rms_start]:
+        return None
     
-    # 4. 编码Tail
-    tail = struct.pack('>HH', checksum, 0x00FF)
+    # 变化的系数（按4字节比较，原样搬运大端I32）
+    coefs = [i for i in range(coef_cnt)
+             if ref[coef_start + 4 * i:coef_start + 4 * i + 4] != frame[coef_start + 4 * i:coef_start + 4 * i + 4]]
+    # 变化的RMS字节（每字节两个网格点）
+    old, new = bytes(ref[rms_start:rms_end]), bytes(frame[rms_start:rms_end])
+    cells = [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
     
-    return header + body + tail
+    delta_len = (FRAME_HEADER_LEN + DELTA_FIXED_LEN + 6 * len(coefs) + 3 * len(cells)
+                 + FRAME_TAIL_LEN)
+    if delta_len >= length:
+        return None
+    
+    buf = bytearray(delta_len)
+    buf[:FRAME_HEADER_LEN] = frame[:FRAME_HEADER_LEN]
+    struct.pack_into('>BH', buf, 2, MSG_VTEC_DELTA, delta_len)
+    
+    ref_crc = struct.unpack_from('>H', ref, length - FRAME_TAIL_LEN)[0]
+    new_crc = struct.unpack_from('>H', frame, length - FRAME_TAIL_LEN)[0]
+    offset = FRAME_HEADER_LEN
+    struct.pack_into('>BHHH', buf, offset, ref[12], ref_crc, new_crc, len(coefs))
+    offset += 7
+    for i in coefs:
+        struct.pack_into('>H', buf, offset, i)
+        pos = coef_start + 4 * i
+        buf[offset + 2:offset + 6] = frame[pos:pos + 4]
+        offset += 6
+    struct.pack_into('>H', buf, offset, len(cells))
+    offset += 2
+    for i in cells:
+        struct.pack_into('>HB', buf, offset, i, new[i])
+        offset += 3
+    
+    view = memoryview(buf)
+    checksum = crc16(view[2:offset])
+    struct.pack_into('>HH', buf, offset, checksum, FRAME_TAIL)
+    
+    return view.toreadonly()
+
+
+def _rms_points(rms: List[List[int]]) -> int:
+    """RMS矩阵中的数值个数（压缩后每两个点占一字节）"""
+    return sum(len(row) for row in rms)
+
+
+def _body_size(data: Dict[str, Any]) -> int:
+    """Body总长度: 定长部分 + 4×系数个数 + ⌈RMS点数/2⌉"""
+    return BODY_FIXED_LEN + 4 * data['coef_cnt'] + (_rms_points(data['rms']) + 1) // 2
 
 
 def _encode_body(data: Dict[str, Any]) -> bytes:
-    """编码Body部分(严格按照设计文档)
+    """编码Body部分（独立缓冲区，见_encode_body_into）"""
+    body = bytearray(_body_size(data))
+    _encode_body_into(body, 0, data)
+    return bytes(body)
+
+
+def _encode_body_into(buf: bytearray, offset: int, data: Dict[str, Any]) -> int:
+    """编码Body部分(严格按照设计文档)，写入buf[offset:]
     
     Body结构:
     - U16 地球半径(km)6371
@@ -63,36 +299,26 @@ def _encode_body(data: Dict[str, Any]) -> bytes:
     - U8  经度间隔(0.1度)
     - U16 网格总数
     - U8[] RMS压缩数据
-    """
-    body = bytearray()
     
+    Returns:
+        Body结束偏移
+    """
     # 1. 模型参考高和地球半径(U16,单位km) - 按照帧体顺序！
     base_radius = int(data['base_r'] + 0.5)
     ref_height = int(data['hgt'] + 0.5)
-    body.extend(struct.pack('>HH', ref_height, base_radius))
     
     # 2. 模型代号(U8,固定0)
-    body.extend(struct.pack('>B', 0))
-    
     # 3. 阶数(U8,高4位=N,低4位=M)
     # 直接使用parser.py解析的order字段
     N, M = data['order']
     order_byte = (N << 4) | M
-    body.extend(struct.pack('>B', order_byte))
-    
-    coef_cnt = data['coef_cnt']
+    struct.pack_into('>HHBB', buf, offset, ref_height, base_radius, 0, order_byte)
+    offset += 6
     
     # 4. 系数列表(I32,单位0.001 TECU)
-    coefs_int = []
-    for c in data['coefs']:
-        val = c * 1000
-        if val >= 0:
-            val = int(val + 1e-9)
-        else:
-            val = int(val - 1e-9)
-        coefs_int.append(val)
-    
-    body.extend(struct.pack(f'>{coef_cnt}i', *coefs_int))
+    coef_cnt = data['coef_cnt']
+    _encode_coefs_into(buf, offset, data['coefs'], coef_cnt)
+    offset += 4 * coef_cnt
     
     # 5. 网格定义(I16x4 + U8x2,单位0.1度)
     lat1, lat2, dlat = data['lat']
@@ -106,10 +332,6 @@ def _encode_body(data: Dict[str, Any]) -> bytes:
     dlat_d1 = int(abs(dlat) * 10 + 0.5)
     dlon_d1 = int(abs(dlon) * 10 + 0.5)
     
-    body.extend(struct.pack('>hhhhBB', 
-                           lon1_d1, lat1_d1, lon2_d1, lat2_d1,
-                           dlat_d1, dlon_d1))
-    
     # 6. 网格总数(U16)
     rms_matrix = data['rms']
     if len(rms_matrix) > 0 and len(rms_matrix[0]) > 0:
@@ -119,28 +341,93 @@ def _encode_body(data: Dict[str, Any]) -> bytes:
     else:
         total_points = 0
     
-    body.extend(struct.pack('>H', total_points))
+    struct.pack_into('>hhhhBBH', buf, offset,
+                     lon1_d1, lat1_d1, lon2_d1, lat2_d1,
+                     dlat_d1, dlon_d1, total_points)
+    offset += 12
     
     # 7. RMS压缩数据
-    rms_compressed = _compress_rms(rms_matrix)
-    body.extend(rms_compressed)
+    return _compress_rms_into(buf, offset, rms_matrix)
+
+
+def _encode_coefs_into(buf: bytearray, offset: int, coefs: List[float], coef_cnt: int):
+    """系数列表 → I32大端（单位0.001 TECU，带epsilon截断），写入buf[offset:]"""
+    if USE_NUMPY and len(coefs) == coef_cnt:
+        vals = _encode_coefs_np(coefs)
+        if vals is not None:
+            np.frombuffer(buf, dtype='>i4', count=coef_cnt, offset=offset)[:] = vals
+            return
+    struct.pack_into(f'>{coef_cnt}i', buf, offset, *_encode_coefs_py(coefs))
+
+
+def _encode_coefs_py(coefs: List[float]) -> List[int]:
+    """系数转换（纯Python实现）"""
+    coefs_int = []
+    for c in coefs:
+        val = c * 1000
+        if val >= 0:
+            val = int(val + 1e-9)
+        else:
+            val = int(val - 1e-9)
+        coefs_int.append(val)
     
-    return bytes(body)
+    return coefs_int
+
+
+def _encode_coefs_np(coefs: List[float]):
+    """系数转换（NumPy实现，舍入规则与纯Python一致）
+    
+    Returns:
+        I32数组；含非有限值或超出I32范围时返回None，由纯Python路径报错
+    """
+    val = np.asarray(coefs, dtype=np.float64) * 1000
+    val = np.trunc(np.where(val >= 0, val + 1e-9, val - 1e-9))
+    if not np.isfinite(val).all() or (val.size and (val.min() < _I32_MIN or val.max() > _I32_MAX)):
+        return None
+    return val.astype('>i4')
 
 
 def _compress_rms(rms: List[List[int]]) -> bytes:
-    """压缩RMS矩阵为字节流
+    """压缩RMS矩阵为字节流（独立缓冲区，见_compress_rms_into）"""
+    buf = bytearray((_rms_points(rms) + 1) // 2)
+    _compress_rms_into(buf, 0, rms)
+    return bytes(buf)
+
+
+def _compress_rms_into(buf: bytearray, offset: int, rms: List[List[int]]) -> int:
+    """压缩RMS矩阵，写入buf[offset:]
     
     扫描顺序: 纬度优先（55→25降序），经度递增（95→135）
     编码方式: 高4位=点N，低4位=点N+1
     
     Args:
+        buf: 目标缓冲区
+        offset: 写入偏移
         rms: RMS矩阵（单位0.1 TECU整数）
     
     Returns:
-        压缩后的字节流
+        写入结束偏移
     """
-    compressed = bytearray()
+    if USE_NUMPY:
+        return _compress_rms_np(buf, offset, rms)
+    return _compress_rms_py(buf, offset, rms)
+
+
+def _compress_rms_np(buf: bytearray, offset: int, rms: List[List[int]]) -> int:
+    """RMS压缩（NumPy实现）: searchsorted分档 + 数组移位打包半字节"""
+    vals = np.fromiter(chain.from_iterable(rms), dtype=np.float64)
+    # rms2idx: 第一个满足 rms < bounds[i+1] 的i，即上界中 <= rms 的个数
+    indices = np.searchsorted(_RMS_UPPER, vals / 10.0, side='right').astype(np.uint8)
+    if indices.size % 2:
+        indices = np.append(indices, np.uint8(0))
+    nbytes = indices.size // 2
+    out = np.frombuffer(buf, dtype=np.uint8, count=nbytes, offset=offset)
+    np.bitwise_or(indices[0::2] << 4, indices[1::2], out=out)
+    return offset + nbytes
+
+
+def _compress_rms_py(buf: bytearray, offset: int, rms: List[List[int]]) -> int:
+    """RMS压缩（纯Python实现）"""
     indices = []
     
     # 纬度降序扫描
@@ -155,7 +442,7 @@ def _compress_rms(rms: List[List[int]]) -> bytes:
     for i in range(0, len(indices), 2):
         high = indices[i]
         low = indices[i + 1] if i + 1 < len(indices) else 0
-        byte = (high << 4) | low
-        compressed.append(byte)
+        buf[offset] = (high << 4) | low
+        offset += 1
     
-    return bytes(compressed)
+    return offset
@@ -4,14 +4,159 @@ import sys
 import signal
 import logging
 from pathlib import Path
+from typing import Dict, Any, Optional
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.tcpcmn import load_cfg, init_log
 from src.tcpsvr import TcpServer
+from src.atcpsvr import AsyncTcpServer
+from src.stcpsvr import SelectorTcpServer
+from src.udpsvr import UdpSink
 from src.bcast import Broadcaster
+from src.archive import ArchiveWriter
 from src.watcher import FileWatcher
+from src.streams import StreamHub, stream_configs
+from src.metrics import (MetricsRegistry, MetricsServer, collect_broadcaster,
+                         collect_server, collect_watcher)
+
+
+def create_server(tcp_cfg: Dict[str, Any], port: int):
+    """按tcp_server配置创建TCP服务器
+    
+    Args:
+        tcp_cfg: tcp_server配置
+        port: 监听端口（多产品播发时各流可使用不同端口）
+    
+    Returns:
+        TcpServer / SelectorTcpServer / AsyncTcpServer（由mode决定）
+    """
+    mode = tcp_cfg.get('mode', 'thread')
+    if mode == 'selectors':
+        return SelectorTcpServer(
+            host=tcp_cfg['host'],
+            port=port,
+            max_clients=tcp_cfg.get('max_clients', 10),
+            queue_size=tcp_cfg.get('send_queue_frames', 4),
+            backlog=tcp_cfg.get('listen_backlog', 128),
+            max_per_ip=tcp_cfg.get('max_clients_per_ip', 0),
+            nodelay=tcp_cfg.get('tcp_nodelay', True),
+            sndbuf=tcp_cfg.get('sndbuf_bytes', 0)
+        )
+    if mode == 'asyncio':
+        return AsyncTcpServer(
+            host=tcp_cfg['host'],
+            port=port,
+            max_clients=tcp_cfg.get('max_clients', 10),
+            queue_size=tcp_cfg.get('send_queue_frames', 4),
+            backlog=tcp_cfg.get('listen_backlog', 128),
+            max_per_ip=tcp_cfg.get('max_clients_per_ip', 0),
+            nodelay=tcp_cfg.get('tcp_nodelay', True),
+            sndbuf=tcp_cfg.get('sndbuf_bytes', 0)
+        )
+    return TcpServer(
+        host=tcp_cfg['host'],
+        port=port,
+        max_clients=tcp_cfg.get('max_clients', 10),
+        queue_size=tcp_cfg.get('send_queue_frames', 4),
+        send_timeout=tcp_cfg.get('send_timeout_seconds', 1.0),
+        backlog=tcp_cfg.get('listen_backlog', 128),
+        max_per_ip=tcp_cfg.get('max_clients_per_ip', 0),
+        accept_thread=tcp_cfg.get('accept_thread', True),
+        nodelay=tcp_cfg.get('tcp_nodelay', True),
+        sndbuf=tcp_cfg.get('sndbuf_bytes', 0)
+    )
+
+
+def create_archive(save_path: str, archive_cfg: Dict[str, Any]) -> ArchiveWriter:
+    """按broadcast.archive配置创建归档写入器"""
+    return ArchiveWriter(
+        save_path,
+        queue_size=archive_cfg.get('queue_size', 256),
+        flush_every=archive_cfg.get('flush_every', 1),
+        flush_seconds=archive_cfg.get('flush_seconds', 1.0),
+        fsync=archive_cfg.get('fsync', False),
+        compress=archive_cfg.get('compress', None)
+    )
+
+
+def start_metrics(cfg: Dict[str, Any], log, broadcasters, servers, watchers) -> Optional[MetricsServer]:
+    """按metrics配置启动指标服务（未启用或启动失败时返回None）"""
+    metrics_cfg = cfg.get('metrics', {})
+    if not metrics_cfg.get('enabled', False):
+        return None
+    registry = MetricsRegistry()
+    registry.add(collect_broadcaster, *broadcasters)
+    registry.add(collect_server, *servers)
+    registry.add(collect_watcher, *watchers)
+    metrics = MetricsServer(registry, metrics_cfg.get('host', '127.0.0.1'),
+                            metrics_cfg.get('port', 9108))
+    try:
+        metrics.start()
+    except Exception as e:
+        log.error(f'指标服务启动失败: {e}')
+        return None
+    return metrics
+
+
+def wait_forever():
+    """主线程等待信号"""
+    try:
+        while True:
+            signal.pause()  # 等待信号
+    except AttributeError:
+        # Windows不支持signal.pause()，使用Thread.join()
+        import threading
+        event = threading.Event()
+        event.wait()
+
+
+def run_streams(cfg: Dict[str, Any], log):
+    """多产品播发：按streams列表启动所有播发流"""
+    try:
+        streams = stream_configs(cfg)
+    except ValueError as e:
+        log.error(f'播发流配置错误: {e}')
+        sys.exit(1)
+    
+    if cfg.get('udp_multicast', {}).get('enabled', False):
+        log.warning('多产品播发不支持UDP组播，已忽略udp_multicast配置')
+    
+    tcp_cfg = cfg['tcp_server']
+    if tcp_cfg.get('mode', 'thread') == 'thread':
+        # 所有流共用一个节拍线程，thread模式的broadcast()会在慢客户端上等待send_timeout
+        log.warning('多产品播发不支持thread模式（慢客户端会阻塞所有流的节拍），已改用selectors模式')
+        tcp_cfg = dict(tcp_cfg, mode='selectors')
+    archive_cfg = cfg['broadcast'].get('archive', {})
+    hub = StreamHub(
+        streams,
+        make_server=lambda port: create_server(tcp_cfg, port),
+        make_archive=lambda path: create_archive(path, archive_cfg),
+        ingest_workers=cfg['file_watcher'].get('ingest_workers', 2)
+    )
+    try:
+        hub.start()
+    except Exception as e:
+        log.error(f'多产品播发启动失败: {e}')
+        hub.stop()
+        sys.exit(1)
+    
+    metrics = start_metrics(cfg, log, hub.broadcasters, hub.servers.values(), hub.watchers)
+    
+    def signal_handler(sig, frame):
+        log.info('收到退出信号，正在关闭...')
+        if metrics:
+            metrics.stop()
+        hub.stop()
+        log.info('系统已停止')
+        sys.exit(0)
+    
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    
+    log.info('系统运行中，按Ctrl+C退出')
+    wait_forever()
 
 
 def main():
@@ -41,13 +186,15 @@ def main():
     log.info('RTVM广播系统启动')
     log.info('=' * 60)
     
-    # 4. 创建TCP服务器
+    # 多产品播发：配置了streams时由StreamHub管理所有流
+    if cfg.get('streams'):
+        run_streams(cfg, log)
+        return
+    
+    # 4. 创建TCP服务器（thread: 轮询模式；asyncio: 每客户端独立写协程；
+    #    selectors: epoll就绪驱动，面向数千客户端）
     tcp_cfg = cfg['tcp_server']
-    tcpsvr = TcpServer(
-        host=tcp_cfg['host'],
-        port=tcp_cfg['port'],
-        max_clients=tcp_cfg.get('max_clients', 10)
-    )
+    tcpsvr = create_server(tcp_cfg, tcp_cfg['port'])
     
     try:
         tcpsvr.start()
@@ -55,18 +202,44 @@ def main():
         log.error(f'TCP服务器启动失败: {e}')
         sys.exit(1)
     
+    # UDP组播（可选，与TCP同时发布）
+    udp_cfg = cfg.get('udp_multicast', {})
+    udp_sink = None
+    if udp_cfg.get('enabled', False):
+        udp_sink = UdpSink(
+            group=udp_cfg['group'],
+            port=udp_cfg['port'],
+            ttl=udp_cfg.get('ttl', 1),
+            mtu=udp_cfg.get('mtu', 1400),
+            interface=udp_cfg.get('interface', '0.0.0.0'),
+            loopback=udp_cfg.get('loopback', True)
+        )
+        try:
+            udp_sink.start()
+        except Exception as e:
+            log.error(f'UDP组播启动失败: {e}')
+            tcpsvr.stop()
+            sys.exit(1)
+    
     # 5. 创建播发管理器
     bcast_cfg = cfg['broadcast']
     
     # 设置保存路径（支持时间格式和定时切换）
     save_path = bcast_cfg.get('save_path', None)
+    archive = None
     if save_path:
         log.info(f'播发数据保存路径: {save_path}')
+        archive = create_archive(save_path, bcast_cfg.get('archive', {}))
     
     broadcaster = Broadcaster(
         tcpsvr=tcpsvr,
         interval=bcast_cfg['interval_seconds'],
-        save_path=save_path
+        save_path=save_path,
+        delta_frames=bcast_cfg.get('delta_frames', False),
+        keyframe_every=bcast_cfg.get('keyframe_every', 6),
+        udp_sink=udp_sink,
+        max_catchup=bcast_cfg.get('max_catchup_ticks', 0),
+        archive=archive
     )
     
     # 6. 创建文件监控器
@@ -74,7 +247,8 @@ def main():
     watcher = FileWatcher(
         watch_dir=watch_cfg['watch_dir'],
         callback=broadcaster.set_file,
-        pattern=watch_cfg['file_pattern']
+        pattern=watch_cfg['file_pattern'],
+        quiet_period=watch_cfg.get('quiet_period_seconds', 1.0)
     )
     
     try:
@@ -98,12 +272,19 @@ def main():
     # 8. 启动播发线程
     broadcaster.start()
     
-    # 8. 注册信号处理（优雅退出）
+    # 指标服务（可选，Prometheus文本格式，抓取时读取各组件计数）
+    metrics = start_metrics(cfg, log, [broadcaster], [tcpsvr], [watcher])
+    
+    # 9. 注册信号处理（优雅退出）
     def signal_handler(sig, frame):
         log.info('收到退出信号，正在关闭...')
+        if metrics:
+            metrics.stop()
         broadcaster.stop()
         watcher.stop()
         tcpsvr.stop()
+        if udp_sink:
+            udp_sink.stop()
         log.info('系统已停止')
         sys.exit(0)
     
@@ -112,15 +293,7 @@ def main():
     
     # 10. 主循环（保持运行）
     log.info('系统运行中，按Ctrl+C退出')
-    
-    try:
-        while True:
-            signal.pause()  # 等待信号
-    except AttributeError:
-        # Windows不支持signal.pause()，使用Thread.join()
-        import threading
-        event = threading.Event()
-        event.wait()
+    wait_forever()
 
 
 if __name__ == '__main__':
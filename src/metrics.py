@@ -0,0 +1,287 @@
+# metrics.py - 运行指标（Prometheus文本格式，标准库HTTP服务）
+
+import logging
+from bisect import bisect_left
+from threading import Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 耗时直方图默认桶上界（秒）：覆盖0.1ms的CRC/编码到秒级的大网格解析和慢客户端扇出
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """累积直方图（单写线程，无锁）
+
+    每个实例只由一个线程调用observe()（例如播发线程、持有入库锁的入库线程），
+    抓取线程只读取计数；读取时以各桶之和作为总数，保证+Inf桶与_count一致。
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """初始化直方图
+
+        Args:
+            buckets: 递增的桶上界（秒），+Inf桶自动追加
+        """
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """记录一个观测值（le为闭区间上界）"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """返回(各桶累积计数, 观测值之和, 观测次数)"""
+        cumulative = []
+        total = 0
+        for n in list(self.counts):
+            total += n
+            cumulative.append(total)
+        return cumulative, self.sum, total
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(labels: Optional[Dict[str, Any]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """Prometheus文本格式输出缓冲（一次抓取）"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        """输出指标族的HELP/TYPE行"""
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None):
+        """输出一个样本"""
+        self.lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+    def metric(self, name: str, kind: str, help_text: str, rows: Iterable[Tuple[Dict[str, Any], float]]):
+        """输出计数器/仪表族
+
+        Args:
+            name: 指标名
+            kind: 'counter' 或 'gauge'
+            help_text: 说明
+            rows: [(标签, 数值)]
+        """
+        self.family(name, kind, help_text)
+        for labels, value in rows:
+            self.sample(name, value, labels)
+
+    def histogram(self, name: str, help_text: str, series: Iterable[Tuple[Dict[str, Any], Histogram]]):
+        """输出直方图族
+
+        Args:
+            name: 指标名（不含_bucket/_sum/_count后缀）
+            help_text: 说明
+            series: [(标签, 直方图)]
+        """
+        self.family(name, 'histogram', help_text)
+        for labels, hist in series:
+            cumulative, total_sum, count = hist.snapshot()
+            for bound, n in zip(hist.bounds + (float('inf'),), cumulative):
+                self.sample(f'{name}_bucket', n, dict(labels, le=_number(float(bound))))
+            self.sample(f'{name}_sum', total_sum, labels)
+            self.sample(f'{name}_count', count, labels)
+
+    def render(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+def _with(labels: Dict[str, Any], **extra) -> Dict[str, Any]:
+    return dict(labels, **extra)
+
+
+def collect_broadcaster(out: Exposition, *broadcasters):
+    """播发管理器指标（入库/编码/播发耗时直方图，帧、字节、IOD变化计数）
+
+    多个播发流时按Broadcaster.name加stream标签。
+    """
+    bs = [({'stream': b.name} if b.name else {}, b) for b in broadcasters]
+    out.histogram('rtm_ingest_duration_seconds', '文件入库各阶段耗时',
+                  [(_with(lb, stage=stage), h) for lb, b in bs for stage, h in b.ingest_hist.items()])
+    out.histogram('rtm_encode_duration_seconds', '帧编码耗时（full: 快照帧，region: 区域帧）',
+                  [(_with(lb, kind=kind), h) for lb, b in bs for kind, h in b.encode_hist.items()])
+    out.histogram('rtm_broadcast_duration_seconds', '每个节拍的播发耗时（accept + 区域帧 + 发送）',
+                  [(lb, b.broadcast_hist) for lb, b in bs])
+    out.metric('rtm_frames_total', 'counter', '已发布的帧数（full: 完整帧，delta: 差分帧）',
+               [row for lb, b in bs for row in ((_with(lb, kind='full'), b.frames_published - b.deltas_sent),
+                                               (_with(lb, kind='delta'), b.deltas_sent))])
+    out.metric('rtm_published_bytes_total', 'counter', '已发布的字节数（每帧计一次）',
+               [(lb, b.bytes_published) for lb, b in bs])
+    out.metric('rtm_delivered_bytes_total', 'counter', '发往客户端的字节数（帧长 × 客户端数）',
+               [(lb, b.bytes_delivered) for lb, b in bs])
+    out.metric('rtm_iod_changes_total', 'counter', 'IOD变化次数（新内容或切换地图）',
+               [(lb, b.iod_changes) for lb, b in bs])
+    out.metric('rtm_ingest_skipped_total', 'counter', 'stat未变化而跳过的入库次数',
+               [(lb, b.ingest_skipped) for lb, b in bs])
+    out.metric('rtm_ticks_total', 'counter', '播发节拍',
+               [(_with(lb, result=k), getattr(b.scheduler, k)) for lb, b in bs
+                for k in ('fired', 'skipped', 'caught_up')])
+    out.metric('rtm_iod', 'gauge', '当前IOD', [(lb, b.current_iod) for lb, b in bs])
+    out.metric('rtm_frame_reuses_total', 'counter', '直接复用上一周期已编码帧的播发周期数',
+               [(lb, b.frame_reuses) for lb, b in bs])
+    archived = [(lb, b.archive.dropped) for lb, b in bs if b.archive]
+    if archived:
+        out.metric('rtm_archive_dropped_total', 'counter', '写入队列满而丢弃的归档帧数', archived)
+
+    # 多个播发流可共用同一帧缓存，按缓存对象去重
+    caches = {id(b.frame_cache): b.frame_cache for _, b in bs}
+    rows = []
+    for i, cache in enumerate(caches.values()):
+        lb = {'cache': str(i)} if len(caches) > 1 else {}
+        stats = cache.get_stats()
+        rows += [(_with(lb, result='hit'), stats['hits']), (_with(lb, result='encode'), stats['encodes'])]
+    out.metric('rtm_frame_cache_total', 'counter', '帧缓存查询结果', rows)
+
+
+def collect_server(out: Exposition, *servers):
+    """TCP服务器指标（接入/拒绝/断开计数，accept队列与取空耗时，在线客户端数，每客户端发送字节与延迟）
+
+    多个服务器时加port标签；选择了挂载点的客户端加mount标签。
+    """
+    ss = [({'port': svr.port} if len(servers) > 1 else {}, svr) for svr in servers]
+    accept = [(lb, svr.get_accept_stats()) for lb, svr in ss]
+    out.metric('rtm_accepts_total', 'counter', '接入的连接数', [(lb, a['accepted']) for lb, a in accept])
+    out.metric('rtm_rejects_total', 'counter', '按原因统计的拒绝连接数',
+               [(_with(lb, reason=r), n) for lb, a in accept for r, n in a['rejected'].items()])
+    out.metric('rtm_disconnects_total', 'counter', '按原因统计的客户端断开数',
+               [(_with(lb, reason=r), n) for lb, a in accept for r, n in a['disconnects'].items()])
+    out.metric('rtm_clients', 'gauge', '在线客户端数', [(lb, svr.get_client_count()) for lb, svr in ss])
+    for name, key, help_text in (
+            ('rtm_accept_queue', 'accept_queue', '监听socket最近一次可读时等待accept的连接数（Linux）'),
+            ('rtm_accept_queue_max', 'accept_queue_max', '等待accept的最大连接数（Linux）'),
+            ('rtm_accept_queue_limit', 'accept_queue_limit', 'accept队列上限（backlog，Linux）'),
+            ('rtm_accept_drain_seconds', 'accept_drain_seconds', '最近一轮取空accept队列的耗时'),
+            ('rtm_accept_drain_max_seconds', 'accept_drain_max_seconds', '取空accept队列的最大耗时'),
+            ('rtm_accept_burst_max', 'accept_burst_max', '单轮接入的最多连接数')):
+        out.metric(name, 'gauge', help_text, [(lb, a[key]) for lb, a in accept])
+
+    clients = []
+    for lb, svr in ss:
+        for c in svr.get_client_stats():
+            labels = _with(lb, client=f'{c["addr"][0]}:{c["addr"][1]}')
+            if c.get('mount'):
+                labels['mount'] = c['mount']
+            clients.append((labels, c))
+    for name, key, help_text in (
+            ('rtm_client_sent_bytes', 'sent_bytes', '客户端已发送字节数'),
+            ('rtm_client_dropped_frames', 'dropped_frames', '客户端积压丢弃的帧数'),
+            ('rtm_client_send_latency_seconds', 'last_latency', '客户端最近一帧入队到发完的耗时'),
+            ('rtm_client_send_latency_max_seconds', 'max_latency', '客户端入队到发完的最大耗时')):
+        out.metric(name, 'gauge', help_text, [(labels, c[key]) for labels, c in clients])
+
+
+def collect_watcher(out: Exposition, *watchers):
+    """文件监控指标（事件、入库、被取代、失败计数），多个监控器时加dir标签"""
+    ws = [({'dir': str(w.watch_dir)} if len(watchers) > 1 else {}, w.get_stats()) for w in watchers]
+    for name, key, kind, help_text in (
+            ('rtm_watch_events_total', 'events', 'counter', '收到的文件事件数'),
+            ('rtm_watch_ingests_total', 'ingests', 'counter', '入库次数'),
+            ('rtm_watch_superseded_total', 'superseded', 'counter', '被更新文件取代而未入库的路径数'),
+            ('rtm_watch_errors_total', 'errors', 'counter', '入库回调失败次数'),
+            ('rtm_watch_pending', 'pending', 'gauge', '等待静默期结束的路径数')):
+        out.metric(name, kind, help_text, [(lb, s[key]) for lb, s in ws])
+
+
+class MetricsRegistry:
+    """指标登记表（抓取时调用各采集函数，被采集组件无需感知）"""
+
+    def __init__(self):
+        self.collectors: List[Tuple[Callable, tuple]] = []
+        self.log = logging.getLogger('Metrics')
+
+    def add(self, collector: Callable, *args):
+        """登记采集函数 collector(out, *args)"""
+        self.collectors.append((collector, args))
+
+    def render(self) -> str:
+        """采集全部指标，返回Prometheus文本"""
+        out = Exposition()
+        for collector, args in self.collectors:
+            try:
+                collector(out, *args)
+            except Exception as e:
+                self.log.error(f'指标采集失败: {collector.__name__}: {e}')
+        return out.render()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """GET /metrics 返回指标文本"""
+
+    registry: MetricsRegistry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.getLogger('Metrics').debug(fmt % args)
+
+
+class MetricsServer:
+    """指标HTTP服务（ThreadingHTTPServer，独立线程，默认只监听本机）"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9108):
+        """初始化指标服务
+
+        Args:
+            registry: 指标登记表
+            host: 绑定地址
+            port: 端口号（0表示由系统分配，启动后写回self.port）
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[Thread] = None
+        self.log = logging.getLogger('Metrics')
+
+    def start(self):
+        """启动HTTP服务线程"""
+        handler = type('MetricsHandler', (_Handler,), {'registry': self.registry})
+        self.httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = Thread(target=self.httpd.serve_forever, name='Metrics', daemon=True)
+        self.thread.start()
+        self.log.info(f'指标服务启动: http://{self.host}:{self.port}/metrics')
+
+    def stop(self):
+        """停止HTTP服务"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        if self.thread:
+            self.thread.join(timeout=2.0)
@@ -1,16 +1,275 @@
 # parser.py - INX文件解析器
 
+import io
 import re
+from bisect import bisect_right
 from datetime import datetime
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Iterable, Iterator, Callable, Optional, BinaryIO
+
+# IONEX记录标签位于第61-80列
+LABEL_COL = 60
+LABEL_END = 80
+
+# 数值开头的"标签"说明该行是无标签的数据行（例如每行16个RMS值占满80列）
+_NUMERIC_LEAD = frozenset('-+.0123456789')
+
+_ORDER_RE = re.compile(r'Order:\s*(\d+)\s*x\s*(\d+).*Total coefficients:\s*(\d+)')
+
+
+def _new_result() -> Dict[str, Any]:
+    """创建带默认值的解析结果"""
+    return {
+        'time': None,
+        'order': (0, 0),
+        'coef_cnt': 0,
+        'coefs': [],
+        'base_r': 6371.0,
+        'hgt': 450.0,
+        'lat': (55.0, 25.0, -1.0),
+        'lon': (95.0, 135.0, 1.0),
+        'rms': [],
+        'interval': 900,  # 默认15分钟（单位：秒）
+        'nmaps': 1        # # OF MAPS IN FILE
+    }
+
+
+def _split_record(raw: str) -> Tuple[str, str]:
+    """切分一行为(标签, 数据区)，无标签数据行的标签为''"""
+    line = raw.rstrip('\r\n')
+    label = line[LABEL_COL:LABEL_END].strip()
+    if not label or label[0] in _NUMERIC_LEAD:
+        return '', line
+    return label, line[:LABEL_COL]
+
+
+def iter_records(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """IONEX记录切分器（单遍、惰性）
+
+    Args:
+        lines: 文本行迭代器（文件对象、列表等）
+
+    Yields:
+        (label, data) - label为第61-80列标签，无标签数据行的label为''，
+        data为标签之前的数据区（无标签行为整行）
+    """
+    for raw in lines:
+        yield _split_record(raw)
+
+
+def iter_records_at(f: BinaryIO) -> Iterator[Tuple[int, str, str]]:
+    """带字节偏移的IONEX记录切分器（二进制文件，从当前位置开始）
+
+    Yields:
+        (offset, label, data) - offset为该行起始字节偏移
+    """
+    offset = f.tell()
+    for raw in f:
+        label, data = _split_record(raw.decode('latin-1'))
+        yield offset, label, data
+        offset += len(raw)
+
+
+def _parse_floats(text: str) -> List[float]:
+    """提取一行中的所有浮点数（跳过非数字token）"""
+    numbers = []
+    for token in text.split():
+        try:
+            numbers.append(float(token))
+        except ValueError:
+            pass
+    return numbers
+
+
+def _parse_epoch(text: str) -> datetime:
+    """解析 'YYYY MM DD hh mm ss' 形式的历元"""
+    year, month, day, hour, minute, second = map(int, text.split()[:6])
+    return datetime(year, month, day, hour, minute, second)
+
+
+# ---- Header记录处理（按标签分派）----
+
+def _hdr_base_radius(result: Dict[str, Any], data: str):
+    result['base_r'] = float(data.split()[0])
+
+
+def _hdr_hgt(result: Dict[str, Any], data: str):
+    result['hgt'] = float(data.split()[0])
+
+
+def _hdr_lat(result: Dict[str, Any], data: str):
+    parts = data.split()
+    result['lat'] = (float(parts[0]), float(parts[1]), float(parts[2]))
+
+
+def _hdr_lon(result: Dict[str, Any], data: str):
+    parts = data.split()
+    result['lon'] = (float(parts[0]), float(parts[1]), float(parts[2]))
+
+
+def _hdr_interval(result: Dict[str, Any], data: str):
+    parts = data.split()
+    if parts and parts[0].isdigit():
+        result['interval'] = int(parts[0])  # 单位：秒
+
+
+def _hdr_nmaps(result: Dict[str, Any], data: str):
+    parts = data.split()
+    if parts and parts[0].isdigit():
+        result['nmaps'] = int(parts[0])
+
+
+HEADER_HANDLERS: Dict[str, Callable[[Dict[str, Any], str], None]] = {
+    'BASE RADIUS': _hdr_base_radius,
+    'HGT1 / HGT2 / DHGT': _hdr_hgt,
+    'LAT1 / LAT2 / DLAT': _hdr_lat,
+    'LON1 / LON2 / DLON': _hdr_lon,
+    'INTERVAL': _hdr_interval,
+    '# OF MAPS IN FILE': _hdr_nmaps,
+}
+
+
+# ---- 数据块读取（从同一记录流中继续消费）----
+
+def _parse_order(result: Dict[str, Any], data: str):
+    """解析MODEL ORDER记录，例如: "Order: 2 x 2, Total coefficients: 9" """
+    match = _ORDER_RE.search(data)
+    if match:
+        result['order'] = (int(match.group(1)), int(match.group(2)))
+        result['coef_cnt'] = int(match.group(3))
+
+
+def _parse_map_epoch(data: str) -> Optional[datetime]:
+    """解析MAP COEFFICIENTS记录中的历元: MAP 1 COEF 2025 11 18 16 0 0"""
+    parts = data.split()
+    if len(parts) >= 9:
+        return _parse_epoch(' '.join(parts[3:9]))
+    return None
+
+
+def _read_coefs(records: Iterator[Tuple[str, str]]) -> Tuple[List[float], str]:
+    """读取一个MAP的系数数据行，直到下一个MAP或COEFFICIENTS END
+
+    Returns:
+        (系数列表, 终止记录的标签)
+    """
+    coefs = []
+    for label, data in records:
+        if label in ('MAP COEFFICIENTS', 'COEFFICIENTS END'):
+            return coefs, label
+        # 系数数据行（跳过注释行）
+        if data.strip() and not data.lstrip().startswith('*'):
+            coefs.extend(_parse_floats(data))
+    return coefs, ''
+
+
+def _read_coef_block(records: Iterator[Tuple[str, str]], result: Dict[str, Any]):
+    """读取COEFFICIENTS START ... COEFFICIENTS END块（仅第一个MAP）"""
+    label = ''
+    for label, data in records:
+        if label == 'COEFFICIENTS END':
+            return
+        if label == 'MODEL ORDER' or 'Order:' in data:
+            _parse_order(result, data)
+        elif label == 'MAP COEFFICIENTS':
+            result['time'] = _parse_map_epoch(data) or result['time']
+            result['coefs'], label = _read_coefs(records)
+            break
+    # 后续MAP不属于当前结果，仍需消费到块结束
+    if label != 'COEFFICIENTS END':
+        _skip_block(records, 'COEFFICIENTS END')
+
+
+def _read_rms_map(records: Iterator[Tuple[str, str]]) -> List[List[int]]:
+    """读取START OF RMS MAP ... END OF RMS MAP块
+
+    Returns:
+        RMS矩阵（单位0.1TECU），每个LAT/LON记录对应一行
+    """
+    rms_data = []
+    row = None
+    for label, data in records:
+        if label == 'END OF RMS MAP':
+            break
+        if label == 'LAT/LON1/LON2/DLON/H':
+            if row:
+                rms_data.append(row)
+            row = []
+        elif not label and row is not None:
+            try:
+                # RMS值直接读取（文件中已是0.1 TECU单位的整数）
+                row.extend([int(x) for x in data.split()])
+            except ValueError:
+                # 跳过无法解析的行
+                pass
+    if row:
+        rms_data.append(row)
+    return rms_data
+
+
+def _skip_block(records: Iterator[Tuple[str, str]], end_label: str):
+    """跳过不需要的数据块（例如TEC MAP）"""
+    for label, _ in records:
+        if label == end_label:
+            break
+
+
+def parse_inx_lines(lines: Iterable[str]) -> Dict[str, Any]:
+    """单遍解析INX文本行（输出与parse_inx一致）
+
+    Args:
+        lines: 文本行迭代器
+
+    Returns:
+        见parse_inx
+    """
+    result = _new_result()
+    records = iter_records(lines)
+    in_header = True
+
+    for label, data in records:
+        if in_header:
+            if label == 'END OF HEADER':
+                in_header = False
+                continue
+            handler = HEADER_HANDLERS.get(label)
+            if handler:
+                handler(result, data)
+                continue
+
+        if label == 'COEFFICIENTS START':
+            _read_coef_block(records, result)
+        elif label == 'START OF TEC MAP':
+            _skip_block(records, 'END OF TEC MAP')
+        elif label == 'START OF RMS MAP':
+            result['rms'] = _read_rms_map(records)
+            break
+
+    return result
+
+
+def _decode_text(data: bytes) -> str:
+    """INX字节内容解码为文本（utf-8，失败时回退latin-1）"""
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def parse_inx_bytes(data: bytes) -> Dict[str, Any]:
+    """从内存中的文件内容解析INX（输出同parse_inx）
+
+    Args:
+        data: INX文件的完整字节内容
+    """
+    return parse_inx_lines(io.StringIO(_decode_text(data), newline=None))
 
 
 def parse_inx(path: str) -> Dict[str, Any]:
     """解析INX文件，提取模型参数和RMS数据
-    
+
     Args:
         path: INX文件路径
-    
+
     Returns:
         {
             'time': datetime,           # EPOCH OF CURRENT MAP
@@ -24,145 +283,148 @@ def parse_inx(path: str) -> Dict[str, Any]:
             'rms': [[int]],             # RMS矩阵（单位0.1TECU）
         }
     """
-    result = {
-        'time': None,
-        'order': (0, 0),
-        'coef_cnt': 0,
-        'coefs': [],
-        'base_r': 6371.0,
-        'hgt': 450.0,
-        'lat': (55.0, 25.0, -1.0),
-        'lon': (95.0, 135.0, 1.0),
-        'rms': [],
-        'interval': 900  # 默认15分钟（单位：秒）
-    }
-    
+    # 只读一次文件，编码回退在内存中完成
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except UnicodeDecodeError:
-        # 尝试latin-1编码
-        with open(path, 'r', encoding='latin-1') as f:
-            lines = f.readlines()
+        with open(path, 'rb') as f:
+            data = f.read()
     except FileNotFoundError:
         raise FileNotFoundError(f'INX文件不存在: {path}')
-    
-    i = 0
-    in_header = False
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # 检测Header区域
-        if 'IONEX VERSION' in line or 'END OF HEADER' not in ''.join(lines[:i+1]):
-            in_header = True
-        elif 'END OF HEADER' in line:
-            in_header = False
-        
-        # 解析BASE RADIUS (仅在Header中)
-        if in_header and 'BASE RADIUS' in line:
-            result['base_r'] = float(line.split()[0])
-        
-        # 解析HGT1 (仅在Header中)
-        elif in_header and 'HGT1' in line:
-            parts = line.split()
-            result['hgt'] = float(parts[0])
-        
-        # 解析LAT范围 (仅在Header中)
-        elif in_header and 'LAT1' in line and 'LAT2' in line:
-            parts = line.split()
-            result['lat'] = (float(parts[0]), float(parts[1]), float(parts[2]))
-        
-        # 解析LON范围 (仅在Header中)
-        elif in_header and 'LON1' in line and 'LON2' in line:
-            parts = line.split()
-            result['lon'] = (float(parts[0]), float(parts[1]), float(parts[2]))
-        
-        # 解析INTERVAL (仅在Header中)
-        elif in_header and 'INTERVAL' in line:
-            parts = line.split()
-            if parts and parts[0].isdigit():
-                result['interval'] = int(parts[0])  # 单位：秒
-        
-        # 解析COEFFICIENTS块
-        elif 'COEFFICIENTS START' in line:
-            i += 1
-            # 读取Order和Total coefficients
-            while i < len(lines):
-                line = lines[i].strip()
-                if 'Order:' in line and 'Total coefficients:' in line:
-                    # 例如: "Order: 2 x 2, Total coefficients: 9"
-                    match = re.search(r'Order:\s*(\d+)\s*x\s*(\d+).*Total coefficients:\s*(\d+)', line)
-                    if match:
-                        result['order'] = (int(match.group(1)), int(match.group(2)))
-                        result['coef_cnt'] = int(match.group(3))
-                    i += 1
-                elif 'MAP' in line and 'COEF' in line:
-                    # 读取时间: MAP 1 COEF 2025 11 18 16 0 0
-                    parts = line.split()
-                    if len(parts) >= 9:
-                        year, month, day, hour, minute, second = map(int, parts[3:9])
-                        result['time'] = datetime(year, month, day, hour, minute, second)
-                    i += 1
-                    # 读取系数
-                    coef_lines = []
-                    while i < len(lines) and 'COEFFICIENTS END' not in lines[i]:
-                        coef_line = lines[i].strip()
-                        # 跳过注释行和包含非数字内容的行
-                        if coef_line and not coef_line.startswith('*'):
-                            # 只提取数字部分（排除"COEFFICIENT DATA"等文本）
-                            # 提取所有浮点数
-                            numbers = []
-                            for token in coef_line.split():
-                                try:
-                                    numbers.append(float(token))
-                                except ValueError:
-                                    # 跳过非数字token（如"COEFFICIENT"）
-                                    pass
-                            if numbers:
-                                coef_lines.extend(numbers)
-                        i += 1
-                    # 系数已经是float列表
-                    result['coefs'] = coef_lines
-                    break
-                else:
-                    i += 1
-        
-        # 解析RMS MAP块
-        elif 'START OF RMS MAP' in line:
-            i += 1
-            rms_data = []
-            while i < len(lines) and 'END OF RMS MAP' not in lines[i]:
-                line = lines[i].strip()
-                # 跳过EPOCH行
-                if 'EPOCH OF CURRENT MAP' in line:
-                    i += 1
+    return parse_inx_bytes(data)
+
+
+class InxMaps:
+    """多地图INX文件的惰性访问
+
+    首次构造时单遍扫描文件，仅记录Header参数以及每个地图的
+    MAP n COEF / START OF RMS MAP n 记录的字节偏移；
+    load()按需seek并只解码被请求的那个地图，避免一次性加载全部地图。
+
+    传入data时索引和解码都在该内存缓冲区上进行，不再读取文件
+    （Broadcaster用同一份读取结果计算哈希和解析）。
+    """
+
+    def __init__(self, path: str, data: Optional[bytes] = None):
+        """建立地图索引
+
+        Args:
+            path: INX文件路径
+            data: 可选的文件完整内容（已读入内存时传入，避免重复读取）
+        """
+        self.path = path
+        self.data = data
+        self.header: Dict[str, Any] = _new_result()
+        self.entries: List[Dict[str, Any]] = []  # 按地图编号排序
+        self._build_index()
+        self.epochs = [e['time'] for e in self.entries]
+        # 二分查找只用有历元的地图（缺少EPOCH OF CURRENT MAP记录的地图不参与按时间选择）
+        self._timed = [k for k, t in enumerate(self.epochs) if t is not None]
+        self._timed_epochs = [self.epochs[k] for k in self._timed]
+
+    def _build_index(self):
+        """单遍扫描，记录每个地图的系数块和RMS块偏移"""
+        maps: Dict[int, Dict[str, Any]] = {}
+        in_header = True
+        in_coef = False
+
+        def entry(num: int) -> Dict[str, Any]:
+            return maps.setdefault(num, {'num': num, 'time': None,
+                                         'coef_offset': None, 'rms_offset': None})
+
+        with self._open() as f:
+            records = iter_records_at(f)
+            for offset, label, data in records:
+                if in_coef:
+                    if label == 'COEFFICIENTS END':
+                        in_coef = False
+                    elif label == 'MODEL ORDER' or 'Order:' in data:
+                        _parse_order(self.header, data)
+                    elif label == 'MAP COEFFICIENTS':
+                        parts = data.split()
+                        e = entry(int(parts[1]) if len(parts) > 1 and parts[1].isdigit()
+                                  else len(maps) + 1)
+                        e['coef_offset'] = offset
+                        e['time'] = _parse_map_epoch(data)
                     continue
-                # 检测纬度行（包含LAT/LON标记）
-                if 'LAT/LON' in line:
-                    i += 1
-                    # 读取该纬度的所有RMS数值（可能跨多行，直到下一个LAT/LON行）
-                    rms_values = []
-                    while i < len(lines) and 'END OF RMS MAP' not in lines[i]:
-                        rms_line = lines[i].strip()
-                        # 遇到下一个纬度行则停止
-                        if 'LAT/LON' in rms_line:
+
+                if in_header:
+                    if label == 'END OF HEADER':
+                        in_header = False
+                        continue
+                    handler = HEADER_HANDLERS.get(label)
+                    if handler:
+                        handler(self.header, data)
+                        continue
+
+                if label == 'COEFFICIENTS START':
+                    in_coef = True
+                elif label == 'START OF TEC MAP':
+                    _skip_block((r[1:] for r in records), 'END OF TEC MAP')
+                elif label == 'START OF RMS MAP':
+                    parts = data.split()
+                    e = entry(int(parts[0]) if parts and parts[0].isdigit() else len(maps) + 1)
+                    e['rms_offset'] = offset
+                    for _, label, data in records:
+                        if label == 'EPOCH OF CURRENT MAP' and e['time'] is None:
+                            e['time'] = _parse_epoch(data)
+                        elif label == 'END OF RMS MAP':
                             break
-                        # 读取RMS数值行
-                        if rms_line and not rms_line.startswith('*') and 'EPOCH' not in rms_line:
-                            try:
-                                # RMS值直接读取（文件中已是0.1 TECU单位的整数）
-                                rms_values.extend([int(x) for x in rms_line.split()])
-                            except ValueError:
-                                # 跳过无法解析的行
-                                pass
-                        i += 1
-                    if rms_values:
-                        rms_data.append(rms_values)
-                else:
-                    i += 1
-            result['rms'] = rms_data
-            break
-        
-        i += 1
-    
-    return result
+
+        self.entries = [maps[k] for k in sorted(maps)]
+        self.header['nmaps'] = len(self.entries)
+
+    def _open(self) -> BinaryIO:
+        """打开内容（内存缓冲区或文件）"""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        try:
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            raise FileNotFoundError(f'INX文件不存在: {self.path}')
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按地图顺序逐个惰性解码"""
+        for k in range(len(self.entries)):
+            yield self.load(k)
+
+    def select(self, now: datetime) -> int:
+        """选择当前时刻应播发的地图（历元不晚于now的最新地图）
+
+        Args:
+            now: UTC时间
+
+        Returns:
+            地图下标（早于第一个有历元的地图、或所有地图都没有历元时返回0）
+        """
+        i = bisect_right(self._timed_epochs, now) - 1
+        return self._timed[i] if i >= 0 else 0
+
+    def load(self, k: int) -> Dict[str, Any]:
+        """解码第k个地图（输出与parse_inx一致）
+
+        Args:
+            k: 地图下标（0起始）
+
+        Returns:
+            见parse_inx
+        """
+        e = self.entries[k]
+        result = dict(self.header)
+        result['time'] = e['time']
+        result['map_index'] = k
+
+        with self._open() as f:
+            if e['coef_offset'] is not None:
+                f.seek(e['coef_offset'])
+                records = (r[1:] for r in iter_records_at(f))
+                next(records)  # MAP COEFFICIENTS记录本身
+                result['coefs'], _ = _read_coefs(records)
+            if e['rms_offset'] is not None:
+                f.seek(e['rms_offset'])
+                records = (r[1:] for r in iter_records_at(f))
+                next(records)  # START OF RMS MAP记录本身
+                result['rms'] = _read_rms_map(records)
+
+        return result
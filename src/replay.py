@@ -0,0 +1,348 @@
+# replay.py - 归档回放入口（将保存的.bin帧重新经TcpServer播发）
+
+import sys
+import mmap
+import time
+import signal
+import logging
+import argparse
+from pathlib import Path
+from threading import Event
+from collections import deque
+from typing import Deque, Dict, Any, Iterator, List, Optional, Tuple
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tcpcmn import load_cfg, init_log
+from src.tcpsvr import TcpServer
+from src.sched import percentile
+from src.archidx import ArchiveIndex, index_path, OPENERS
+from src.decoder import FrameDecoder
+
+
+class ArchiveSource:
+    """归档帧来源（多个分段按顺序读取）
+
+    - 未压缩的.bin分段mmap后按偏移切片，帧为memoryview（不拷贝）
+    - 压缩分段（.gz/.xz）整体解压到内存
+    - 有索引（.idx）时直接使用索引中的偏移，否则用FrameDecoder扫描，只回放校验通过的帧
+    - 每帧附带索引中记录的播发时刻（GPS毫秒），没有索引或未记录时为None
+    """
+
+    def __init__(self, paths: List[Path]):
+        """初始化帧来源
+
+        Args:
+            paths: 归档分段文件列表（按回放顺序）
+        """
+        self.paths = paths
+        self.log = logging.getLogger('ArchiveSource')
+
+    def _open(self, path: Path):
+        """打开分段，返回可切片的缓冲区"""
+        ext = path.suffix if path.suffix in ('.gz', '.xz') else ''
+        if ext:
+            with OPENERS[ext](path, 'rb') as f:
+                return f.read()
+        with open(path, 'rb') as f:
+            if f.seek(0, 2) == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _indexed(self, path: Path, buf) -> Optional[List[Tuple[int, int, int]]]:
+        """从索引读取分段内各帧的(偏移, 帧长, 播发时刻)，没有索引时返回None"""
+        idx = index_path(path)
+        if not idx.exists():
+            return None
+        with ArchiveIndex(idx) as index:
+            return [(e.offset, e.length, e.sent_ms) for e in (index[i] for i in range(len(index)))
+                    if e.offset + e.length <= len(buf)]
+
+    def frames(self) -> Iterator[Tuple[memoryview, Optional[int]]]:
+        """按顺序产生所有分段的(帧, 播发时刻GPS毫秒或None)"""
+        for path in self.paths:
+            try:
+                buf = self._open(path)
+                spans = self._indexed(path, buf)
+            except (OSError, ValueError) as e:
+                self.log.error(f'读取归档失败: {path}: {e}')
+                continue
+            if spans is not None:
+                self.log.info(f'回放分段: {path.name}, {len(spans)} 帧（索引）')
+                view = memoryview(buf)
+                for offset, length, sent_ms in spans:
+                    yield view[offset:offset + length], sent_ms or None
+                continue
+
+            self.log.info(f'回放分段: {path.name}（扫描）')
+            decoder = FrameDecoder()
+            for frame in decoder.iter_buffer(buf):
+                yield frame, None
+            if decoder.bad_frames or decoder.skipped_bytes:
+                self.log.warning(f'{path.name}: {decoder.bad_frames} 个候选帧校验失败，'
+                                 f'跳过 {decoder.skipped_bytes} 字节')
+
+
+class ReplayPacer:
+    """回放节拍：按归档记录的播发时刻重现原始时序
+
+    - 帧带有播发时刻时，以最近一次对齐的帧为基准，截止时间 = 基准单调时钟 + 时刻差 / speed，
+      原始的间隔变化、跳拍和停播间隙都按比例保留，且不随处理耗时累积漂移
+    - 帧没有播发时刻（无索引的分段或由已有.bin补建的索引）时，在上一帧之后等待interval / speed
+    - 时刻倒退（循环回到开头、分段顺序与时间不一致）时按interval / speed 等待后重新对齐
+    - 截止时间已过的帧立即发送（不跳帧），记录迟到时间
+    """
+
+    def __init__(self, interval: float, speed: float, samples: int = 1000):
+        """初始化节拍
+
+        Args:
+            interval: 没有播发时刻时的帧间隔（秒，原播发间隔）
+            speed: 回放倍速（>0）
+            samples: 保留的迟到时间样本数
+        """
+        self.speed = speed
+        self.step = interval / speed
+        self.anchor: Optional[Tuple[float, int]] = None  # (单调时钟截止时间, 播发时刻GPS毫秒)
+        self.last_ms: Optional[int] = None
+        self.due: Optional[float] = None
+        self.lateness: Deque[float] = deque(maxlen=samples)
+        self.fired = 0
+        self.recorded = 0   # 按记录的播发时刻定时的帧数
+        self.max_lateness = 0.0
+
+    def deadline(self, sent_ms: Optional[int]) -> float:
+        """下一帧的单调时钟截止时间
+
+        Args:
+            sent_ms: 该帧记录的播发时刻（GPS毫秒），未记录时为None
+        """
+        if self.due is None:
+            due = time.monotonic()
+        elif sent_ms is not None and self.anchor is not None and sent_ms >= self.last_ms:
+            due = self.anchor[0] + (sent_ms - self.anchor[1]) / 1000.0 / self.speed
+            self.recorded += 1
+        else:
+            due = self.due + self.step
+        if sent_ms is None:
+            self.anchor = None
+        elif self.anchor is None or sent_ms < self.last_ms:
+            self.anchor = (due, sent_ms)
+        self.due = due
+        self.last_ms = sent_ms
+        return due
+
+    def wait(self, sent_ms: Optional[int], stop_event: Event) -> bool:
+        """等待到该帧的截止时间
+
+        Args:
+            sent_ms: 该帧记录的播发时刻（GPS毫秒），未记录时为None
+            stop_event: 停止事件
+
+        Returns:
+            是否应发送该帧（已停止返回False）
+        """
+        due = self.deadline(sent_ms)
+        remaining = due - time.monotonic()
+        if remaining > 0 and stop_event.wait(remaining):
+            return False
+        if stop_event.is_set():
+            return False
+        late = max(0.0, time.monotonic() - due)
+        self.fired += 1
+        self.lateness.append(late)
+        self.max_lateness = max(self.max_lateness, late)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """节拍统计（迟到时间单位毫秒）"""
+        values = sorted(self.lateness)
+        return {
+            'fired': self.fired,
+            'recorded': self.recorded,
+            'lateness_p50_ms': percentile(values, 0.50) * 1000,
+            'lateness_p99_ms': percentile(values, 0.99) * 1000,
+            'lateness_max_ms': self.max_lateness * 1000,
+        }
+
+
+class Replayer:
+    """回放器
+
+    播发速率:
+    - speed=1: 实时，按索引记录的播发时刻重现原始帧间隔（含间隔变化和停播间隙），
+      没有记录的分段按interval逐帧发送
+    - speed>1: 加速，所有间隔缩短为1/speed
+    - speed=0: 尽可能快，逐帧连续调用broadcast()
+
+    帧内容原样发送（IOD、GPS时间、CRC均保持归档中的值）。
+    """
+
+    def __init__(self, tcpsvr: TcpServer, source: ArchiveSource, interval: float = 10.0,
+                 speed: float = 1.0, loop: bool = False):
+        """初始化回放器
+
+        Args:
+            tcpsvr: TCP服务器实例
+            source: 归档帧来源
+            interval: 原播发间隔（秒，仅用于没有记录播发时刻的帧）
+            speed: 回放倍速（0为尽可能快）
+            loop: 播完后是否从头循环
+        """
+        self.tcpsvr = tcpsvr
+        self.source = source
+        self.interval = interval
+        self.speed = max(0.0, speed)
+        self.loop = loop
+        self.pacer = ReplayPacer(interval, self.speed) if self.speed else None
+        self.frames = 0          # 已发布帧数
+        self.bytes = 0           # 已发布字节数（每帧计一次）
+        self.deliveries = 0      # 发完的客户端帧数
+        self.delivered_bytes = 0
+        self.started = 0.0
+        self.log = logging.getLogger('Replayer')
+
+    def run(self, stop_event: Event) -> Dict[str, Any]:
+        """回放直到归档结束（loop时直到停止）
+
+        Returns:
+            吞吐统计
+        """
+        self.started = time.perf_counter()
+        last_report = self.started
+        while not stop_event.is_set():
+            count = 0
+            for frame, sent_ms in self.source.frames():
+                if self.pacer and not self.pacer.wait(sent_ms, stop_event):
+                    break
+                if stop_event.is_set():
+                    break
+                self.tcpsvr.accept_clients()
+                sent = self.tcpsvr.broadcast(frame)
+                count += 1
+                self.frames += 1
+                self.bytes += len(frame)
+                self.deliveries += sent
+                self.delivered_bytes += sent * len(frame)
+
+                now = time.perf_counter()
+                if now - last_report >= 5.0:
+                    last_report = now
+                    s = self.get_stats()
+                    self.log.info(f"已回放 {s['frames']} 帧, {s['frames_per_sec']:.1f} 帧/秒, "
+                                  f"{s['mb_per_sec']:.2f} MB/s, 扇出 {s['delivered_mb_per_sec']:.2f} MB/s, "
+                                  f"{self.tcpsvr.get_client_count()} 客户端")
+            if not self.loop or count == 0:
+                break
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """吞吐统计"""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        stats = {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'deliveries': self.deliveries,
+            'delivered_bytes': self.delivered_bytes,
+            'elapsed_sec': elapsed,
+            'frames_per_sec': self.frames / elapsed,
+            'mb_per_sec': self.bytes / elapsed / 1e6,
+            'delivered_mb_per_sec': self.delivered_bytes / elapsed / 1e6,
+        }
+        if self.pacer:
+            stats.update(self.pacer.get_stats())
+        return stats
+
+
+def collect_archives(items: List[str]) -> List[Path]:
+    """展开命令行参数中的文件和目录（目录取其中的.bin/.bin.gz/.bin.xz，按文件名排序）"""
+    paths = []
+    for item in items:
+        p = Path(item)
+        if p.is_dir():
+            found = [f for f in p.iterdir() if f.name.endswith(('.bin', '.bin.gz', '.bin.xz'))]
+            paths.extend(sorted(found))
+        else:
+            paths.append(p)
+    return paths
+
+
+def main():
+    """回放入口"""
+    base_dir = Path(__file__).parent.parent
+    cfg_path = base_dir / 'config' / 'bcast.json'
+    try:
+        cfg = load_cfg(str(cfg_path))
+    except Exception as e:
+        print(f'配置文件加载失败: {e}')
+        sys.exit(1)
+    tcp_cfg = cfg['tcp_server']
+
+    parser = argparse.ArgumentParser(description='归档回放（经TcpServer重新播发保存的帧）')
+    parser.add_argument('archives', nargs='+', help='归档文件或目录（.bin/.bin.gz/.bin.xz）')
+    parser.add_argument('-H', '--host', default=tcp_cfg['host'], help='监听地址')
+    parser.add_argument('-p', '--port', type=int, default=tcp_cfg['port'], help='监听端口')
+    parser.add_argument('-s', '--speed', type=float, default=1.0, help='回放倍速（1为实时，0为尽可能快）')
+    parser.add_argument('--max', action='store_true', help='尽可能快回放（同 --speed 0）')
+    parser.add_argument('-i', '--interval', type=float, default=cfg['broadcast']['interval_seconds'],
+                        help='原播发间隔（秒，用于没有索引记录播发时刻的分段）')
+    parser.add_argument('--loop', action='store_true', help='循环回放')
+    parser.add_argument('-w', '--wait-clients', type=int, default=0, help='等待N个客户端连接后开始')
+    parser.add_argument('-m', '--max-clients', type=int, default=tcp_cfg.get('max_clients', 10),
+                        help='最大客户端数')
+    args = parser.parse_args()
+
+    log_cfg = dict(cfg.get('logging', {}), file='logs/replay.log')
+    Path(log_cfg['file']).parent.mkdir(parents=True, exist_ok=True)
+    log = init_log({'logging': log_cfg})
+
+    paths = collect_archives(args.archives)
+    if not paths:
+        log.error('未找到归档文件')
+        sys.exit(1)
+
+    tcpsvr = TcpServer(
+        host=args.host,
+        port=args.port,
+        max_clients=args.max_clients,
+        queue_size=tcp_cfg.get('send_queue_frames', 4),
+        send_timeout=tcp_cfg.get('send_timeout_seconds', 1.0),
+        backlog=tcp_cfg.get('listen_backlog', 128),
+        max_per_ip=tcp_cfg.get('max_clients_per_ip', 0),
+        nodelay=tcp_cfg.get('tcp_nodelay', True),
+        sndbuf=tcp_cfg.get('sndbuf_bytes', 0)
+    )
+    try:
+        tcpsvr.start()
+    except Exception as e:
+        log.error(f'TCP服务器启动失败: {e}')
+        sys.exit(1)
+
+    stop_event = Event()
+    signal.signal(signal.SIGINT, lambda sig, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda sig, frame: stop_event.set())
+
+    speed = 0.0 if args.max else args.speed
+    rate = '尽可能快' if speed == 0 else f'{speed}倍速（按记录的播发时刻，无记录时间隔 {args.interval / speed:.3f} 秒）'
+    log.info(f'回放 {len(paths)} 个归档分段, {rate}')
+
+    if args.wait_clients:
+        log.info(f'等待 {args.wait_clients} 个客户端连接...')
+        while tcpsvr.get_client_count() < args.wait_clients and not stop_event.wait(0.1):
+            tcpsvr.accept_clients()
+
+    replayer = Replayer(tcpsvr, ArchiveSource(paths), args.interval, speed, args.loop)
+    stats = replayer.run(stop_event)
+    tcpsvr.stop()
+
+    log.info(f"回放结束: {stats['frames']} 帧 / {stats['bytes']} 字节, 耗时 {stats['elapsed_sec']:.2f} 秒, "
+             f"{stats['frames_per_sec']:.1f} 帧/秒, {stats['mb_per_sec']:.2f} MB/s, "
+             f"扇出 {stats['deliveries']} 次 / {stats['delivered_mb_per_sec']:.2f} MB/s")
+    if 'lateness_p99_ms' in stats:
+        log.info(f"按播发时刻定时 {stats['recorded']} / {stats['fired']} 帧, "
+                 f"节拍迟到: p50 {stats['lateness_p50_ms']:.2f}ms, p99 {stats['lateness_p99_ms']:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
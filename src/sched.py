@@ -0,0 +1,143 @@
+# sched.py - GPS整秒对齐的播发调度器
+
+import math
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from threading import Event
+from typing import Dict, Any, Optional, Tuple, Deque
+
+from src.tcpcmn import utc2gps
+
+GPS_WEEK_SECONDS = 604800
+
+
+def gps_now() -> Tuple[float, float]:
+    """当前GPS时间（秒，自GPS起点连续计数）及对应的单调时钟读数"""
+    mono = time.monotonic()
+    utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    week, sow = utc2gps(utc)
+    return week * GPS_WEEK_SECONDS + sow + utc.microsecond / 1e6, mono
+
+
+def percentile(sorted_values, q: float) -> float:
+    """最近秩百分位（输入已排序）"""
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class GpsScheduler:
+    """按GPS时间整数倍对齐的节拍调度器
+
+    - 节拍时刻为GPS时间的interval整数倍（多台冗余服务器播发时刻一致）
+    - 截止时间换算为单调时钟绝对值，周期不随处理耗时累积漂移
+    - 每隔resync秒重新建立GPS时间与单调时钟的对应关系（跟随系统时钟校准）
+    - 错过的节拍：最多补发max_catchup个（立即连续触发），其余跳过并计数
+    - 记录每个节拍的迟到时间（实际触发 - 截止时间），提供p50/p99/最大值
+    """
+
+    def __init__(self, interval: float, max_catchup: int = 0, resync: float = 60.0,
+                 samples: int = 1000):
+        """初始化调度器
+
+        Args:
+            interval: 节拍间隔（秒）
+            max_catchup: 最多补发的错过节拍数（0表示全部跳过）
+            resync: GPS时间与单调时钟重新对齐的间隔（秒）
+            samples: 保留的迟到时间样本数
+        """
+        self.interval = interval
+        self.max_catchup = max(0, max_catchup)
+        self.resync = resync
+        self.anchor_gps = 0.0
+        self.anchor_mono = 0.0
+        self.next_tick: Optional[int] = None  # 下一个节拍序号（GPS时间 / interval）
+        self.lateness: Deque[float] = deque(maxlen=samples)
+        self.fired = 0
+        self.skipped = 0
+        self.caught_up = 0   # 补发的节拍数
+        self.caught_up_tick: Optional[int] = None  # 已计入caught_up的最大节拍序号
+        self.max_lateness = 0.0
+        self.log = logging.getLogger('GpsScheduler')
+
+    def _anchor(self):
+        """建立GPS时间与单调时钟的对应关系"""
+        self.anchor_gps, self.anchor_mono = gps_now()
+
+    def _deadline(self, tick: int) -> float:
+        """节拍序号 → 单调时钟截止时间"""
+        return self.anchor_mono + (tick * self.interval - self.anchor_gps)
+
+    def deadline(self) -> float:
+        """下一个节拍的单调时钟截止时间（首次调用时建立对齐，之后每隔resync秒重新对齐）"""
+        if self.next_tick is None:
+            self._anchor()
+            self.next_tick = math.floor(self.anchor_gps / self.interval) + 1
+        elif time.monotonic() - self.anchor_mono >= self.resync:
+            self._anchor()
+        return self._deadline(self.next_tick)
+
+    def fire(self) -> float:
+        """截止时间到达后触发节拍：处理错过的节拍并记录迟到时间
+
+        供多个调度器共用一个线程时使用（调用方按deadline()等待），单独使用时见wait()。
+
+        Returns:
+            本节拍的GPS时间（秒，interval的整数倍）
+        """
+        deadline = self._deadline(self.next_tick)
+        late = time.monotonic() - deadline
+        missed = int(late // self.interval)
+        if missed > 0:
+            # 补发max_catchup个，其余跳过
+            skip = max(0, missed - self.max_catchup)
+            if skip:
+                self.skipped += skip
+                self.next_tick += skip
+                deadline = self._deadline(self.next_tick)
+                late = time.monotonic() - deadline
+                self.log.warning(f'错过 {missed} 个节拍，跳过 {skip} 个')
+            # 同一次停顿在补发的每个节拍上都会重新算出missed，只计入尚未计过的节拍
+            last = self.next_tick + missed - skip
+            counted = self.next_tick if self.caught_up_tick is None else max(self.caught_up_tick, self.next_tick)
+            if last > counted:
+                self.caught_up += last - counted
+                self.caught_up_tick = last
+
+        tick = self.next_tick
+        self.next_tick += 1
+        self.fired += 1
+        self.lateness.append(late)
+        self.max_lateness = max(self.max_lateness, late)
+        return round(tick * self.interval, 6)
+
+    def wait(self, stop_event: Event) -> Optional[float]:
+        """等待下一个节拍
+
+        Args:
+            stop_event: 停止事件（置位时立即返回None）
+
+        Returns:
+            本节拍的GPS时间（秒，interval的整数倍）；已停止返回None
+        """
+        remaining = self.deadline() - time.monotonic()
+        if remaining > 0 and stop_event.wait(remaining):
+            return None
+        if stop_event.is_set():
+            return None
+        return self.fire()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """调度统计（迟到时间单位毫秒）"""
+        values = sorted(self.lateness)
+        return {
+            'fired': self.fired,
+            'skipped': self.skipped,
+            'caught_up': self.caught_up,
+            'lateness_p50_ms': percentile(values, 0.50) * 1000,
+            'lateness_p99_ms': percentile(values, 0.99) * 1000,
+            'lateness_max_ms': self.max_lateness * 1000,
+        }
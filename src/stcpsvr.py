@@ -0,0 +1,324 @@
+# stcpsvr.py - selectors(epoll) TCP服务器（就绪驱动的扇出引擎）
+
+import socket
+import selectors
+import logging
+import time
+from collections import deque
+from threading import Thread, Event
+from typing import Dict, List, Any, Deque, Optional, Tuple, FrozenSet
+
+from src.tcpcmn import MSG_VTEC_DELTA
+from src.tcpsvr import (ClientConn, Admission, Subscriptions, Region, accept_queue, frame_msg_id, select_frame,
+                        tune_socket)
+
+# selector注册数据中的特殊标记
+_LISTEN = 'listen'
+_WAKE = 'wake'
+
+
+class SelectorTcpServer:
+    """selectors TCP服务器（多客户端广播模式，面向数千客户端）
+
+    与TcpServer接口一致（start/accept_clients/broadcast/get_client_count/stop），
+    所有socket由单个I/O线程通过selectors.DefaultSelector（Linux上为epoll）驱动:
+    - 监听socket可读即接入全部待接入连接（准入控制同TcpServer）
+    - 客户端始终注册读事件，recv返回0或出错即断开（同rtkrcv readtcpsvr）
+    - 仅对有待发数据的客户端注册写事件，部分写按客户端偏移续发
+    - broadcast()只把帧交给I/O线程（socketpair唤醒），不阻塞播发线程
+    - 客户端可发送 "REGION lat1 lat2 lon1 lon2" 订阅区域子网格
+    - 同一端口上有多个播发流时，客户端发送 "MOUNT 名称"（或 "GET /名称"）选择播发流
+    """
+
+    def __init__(self, host: str, port: int, max_clients: int = 10000,
+                 queue_size: int = 4, backlog: int = 1024, max_per_ip: int = 0,
+                 nodelay: bool = True, sndbuf: int = 0):
+        """初始化TCP服务器
+
+        Args:
+            host: 绑定地址（"0.0.0.0"监听所有接口）
+            port: 端口号（0表示由系统分配，启动后写回self.port）
+            max_clients: 最大客户端数
+            queue_size: 每客户端待发帧队列长度
+            backlog: 监听队列长度
+            max_per_ip: 单IP最大连接数（0表示不限制）
+            nodelay: 客户端socket是否设置TCP_NODELAY
+            sndbuf: 客户端socket发送缓冲区字节数（0表示系统默认）
+        """
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.sock: Optional[socket.socket] = None
+        self.clients: Dict[socket.socket, ClientConn] = {}
+        self.admission = Admission(max_clients, max_per_ip)
+        self.subs = Subscriptions()
+        self.keyframes: Dict[Optional[str], bytes] = {}  # 各挂载点最近播发的关键帧（差分帧的参考帧）
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.outbox: Deque[Tuple[bytes, Optional[Dict[Region, bytes]], Optional[str]]] = deque()
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
+        self._rr = 0
+        self._writers = 0  # 已注册写事件的客户端数
+        self._fanout_start: Optional[float] = None
+        self.last_fanout_seconds = 0.0  # 最近一帧从发布到所有客户端发完的耗时
+        self.thread: Optional[Thread] = None
+        self.stop_event = Event()
+        self.log = logging.getLogger('SelectorTcpServer')
+
+    def start(self):
+        """启动TCP服务器和I/O线程"""
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind((self.host, self.port))
+            self.sock.listen(self.backlog)
+            self.sock.setblocking(False)
+            self.port = self.sock.getsockname()[1]
+        except Exception as e:
+            self.log.error(f'启动失败: {e}')
+            raise
+
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, _LISTEN)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, _WAKE)
+
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, name='SelectorTcpServer', daemon=True)
+        self.thread.start()
+        self.log.info(f'TCP服务器启动(selectors/{type(self.selector).__name__}): '
+                      f'{self.host}:{self.port}, backlog={self.backlog}')
+
+    def _run(self):
+        """I/O线程主循环"""
+        while not self.stop_event.is_set():
+            try:
+                events = self.selector.select(timeout=0.5)
+            except Exception as e:
+                self.log.error(f'select异常: {e}')
+                continue
+
+            for key, mask in events:
+                if key.data == _LISTEN:
+                    self._accept_pending()
+                elif key.data == _WAKE:
+                    self._drain_wake()
+                else:
+                    conn = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._on_readable(conn)
+                    if mask & selectors.EVENT_WRITE and conn.sock in self.clients:
+                        self._on_writable(conn)
+
+        self._close_all()
+
+    def _accept_pending(self):
+        """接受监听队列中的所有连接（记录accept队列长度和取空耗时）"""
+        t0 = time.monotonic()
+        self.admission.record_queue(accept_queue(self.sock))
+        accepted = 0
+        while True:
+            try:
+                sock, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                break
+            except Exception as e:
+                self.log.error(f'accept异常: {e}')
+                break
+
+            accepted += 1
+            reason = self.admission.check(addr[0])
+            if reason:
+                self.log.warning(f'拒绝连接（{reason}）: {addr}')
+                sock.close()
+                continue
+
+            sock.setblocking(False)
+            tune_socket(sock, self.nodelay, self.sndbuf)
+            conn = ClientConn(sock, addr, self.queue_size)
+            self.clients[sock] = conn
+            self.selector.register(sock, selectors.EVENT_READ, conn)
+            self.log.info(f'新客户端连接: {addr}, 总计 {len(self.clients)} 个')
+        self.admission.record_drain(time.monotonic() - t0, accepted)
+
+    def _drain_wake(self):
+        """清空唤醒socket并扇出待发布的帧"""
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        while self.outbox:
+            self._fanout(self.outbox.popleft())
+
+    def _fanout(self, item: Tuple[bytes, Optional[Dict[Region, bytes]], Optional[str]]):
+        """帧进入挂载点上每个客户端的队列并立即尝试发送，未发完的注册写事件"""
+        data, regional, mount = item
+        if frame_msg_id(data) != MSG_VTEC_DELTA:
+            self.keyframes[mount] = data
+        keyframe = self.keyframes.get(mount)
+        conns = [c for c in self.clients.values() if c.mount == mount]
+        if conns:
+            start = self._rr % len(conns)
+            conns = conns[start:] + conns[:start]
+            self._rr += 1
+
+        self._fanout_start = time.monotonic()
+        for conn in conns:
+            conn.enqueue(select_frame(data, regional, conn.region), keyframe)
+            self._on_writable(conn)
+        self._check_fanout_done()
+
+    def _on_writable(self, conn: ClientConn):
+        """发送待发数据，按需切换写事件注册"""
+        try:
+            done = conn.send_pending()
+        except BrokenPipeError:
+            self._disconnect(conn, 'BrokenPipe')
+            return
+        except ConnectionResetError:
+            self._disconnect(conn, '连接重置')
+            return
+        except Exception as e:
+            self._disconnect(conn, '发送失败', e)
+            return
+
+        if done and conn.want_write:
+            self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+            conn.want_write = False
+            self._writers -= 1
+            self._check_fanout_done()
+        elif not done and not conn.want_write:
+            self.selector.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+            conn.want_write = True
+            self._writers += 1
+
+    def _on_readable(self, conn: ClientConn):
+        """读取客户端请求（区域订阅），对端关闭或出错时断开"""
+        try:
+            data = conn.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            self._disconnect(conn, '读取异常', e)
+            return
+        if not data:
+            self._disconnect(conn, '对端关闭')
+            return
+        old = conn.feed(data)
+        self.subs.change(old, conn.subscription)
+        if conn.mount != old[0]:
+            self.log.info(f'客户端选择挂载点: {conn.addr} → {conn.mount or "默认"}')
+        if conn.region != old[1]:
+            self.log.info(f'客户端订阅区域: {conn.addr} → {conn.region or "完整网格"}')
+
+    def _check_fanout_done(self):
+        """所有客户端发完时记录扇出耗时"""
+        if self._writers == 0 and self._fanout_start is not None:
+            self.last_fanout_seconds = time.monotonic() - self._fanout_start
+            self._fanout_start = None
+
+    def _disconnect(self, conn: ClientConn, reason: str, detail: Optional[Exception] = None):
+        """断开并移除客户端
+
+        Args:
+            conn: 客户端连接
+            reason: 断开原因分类（计入accept统计）
+            detail: 引起断开的异常（只记入日志）
+        """
+        if self.clients.pop(conn.sock, None) is None:
+            return
+        if conn.want_write:
+            self._writers -= 1
+        try:
+            self.selector.unregister(conn.sock)
+        except Exception:
+            pass
+        try:
+            conn.sock.close()
+        except Exception:
+            pass
+        self.admission.release(conn.addr[0], reason)
+        self.subs.change(conn.subscription, None)
+        reason = f'{reason}: {detail}' if detail else reason
+        self.log.warning(f'客户端断开（{reason}）: {conn.addr}, 剩余 {len(self.clients)} 个')
+        self._check_fanout_done()
+
+    def _close_all(self):
+        """关闭所有socket（I/O线程退出时调用）"""
+        for conn in list(self.clients.values()):
+            try:
+                conn.sock.close()
+            except Exception:
+                pass
+            self.admission.release(conn.addr[0])
+        self.clients.clear()
+        self.subs.clear()
+        for sock in (self.sock, self._wake_r, self._wake_w):
+            try:
+                sock.close()
+            except Exception:
+                pass
+        self.selector.close()
+
+    def accept_clients(self):
+        """兼容TcpServer接口（I/O线程持续accept，无需轮询）"""
+        pass
+
+    def get_regions(self, mount: Optional[str] = None) -> FrozenSet[Region]:
+        """挂载点上的所有订阅区域（I/O线程维护的快照）"""
+        return self.subs.get(mount)
+
+    def broadcast(self, data: bytes, regional: Optional[Dict[Region, bytes]] = None,
+                  mount: Optional[str] = None) -> int:
+        """发布一帧到挂载点上的所有客户端（线程安全，不阻塞调用方）
+
+        Args:
+            data: 二进制帧数据（完整网格）
+            regional: 区域订阅帧 {区域: 帧}，订阅了区域的客户端发送对应帧
+            mount: 挂载点（None为默认流）
+
+        Returns:
+            发布时挂载点上在线的客户端数量
+        """
+        if not data or not self.thread or not self.thread.is_alive():
+            return 0
+
+        self.outbox.append((data, regional, mount))
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            pass  # 唤醒缓冲区已满，I/O线程必然会被唤醒
+        return sum(1 for c in list(self.clients.values()) if c.mount == mount)
+
+    def get_client_count(self) -> int:
+        """获取当前客户端数量"""
+        return self.admission.active
+
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """获取每个客户端的队列与发送统计"""
+        return [conn.get_stats() for conn in list(self.clients.values())]
+
+    def get_accept_stats(self) -> Dict[str, Any]:
+        """获取accept统计（接入数、按原因的拒绝/断开数）"""
+        return self.admission.get_stats()
+
+    def stop(self):
+        """停止TCP服务器"""
+        self.log.info('正在关闭TCP服务器...')
+        self.stop_event.set()
+        if self.thread:
+            try:
+                self._wake_w.send(b'\0')
+            except Exception:
+                pass
+            self.thread.join(timeout=5.0)
+        self.log.info('TCP服务器已关闭')
@@ -0,0 +1,225 @@
+# streams.py - 多产品播发（一个进程内的多个播发流）
+
+import time
+import heapq
+import logging
+from pathlib import Path
+from threading import Thread, Event
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from watchdog.observers import Observer
+
+from src.tcpcmn import MSG_VTEC, MSG_VTEC_DELTA
+from src.encoder import FrameCache
+from src.bcast import Broadcaster
+from src.archive import ArchiveWriter
+from src.watcher import FileWatcher, IngestPool
+
+
+def stream_configs(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """展开配置中的streams列表
+
+    未指定的字段取file_watcher / broadcast / protocol / tcp_server中的值；
+    save_path不继承（各流须指定自己的归档路径）。
+
+    Args:
+        cfg: 完整配置（含streams列表）
+
+    Returns:
+        每个流的完整配置
+
+    Raises:
+        ValueError: 缺少名称或监控目录、名称重复、同一端口上挂载点重复、消息ID非法
+    """
+    watch = cfg.get('file_watcher', {})
+    bcast = cfg.get('broadcast', {})
+    defaults = {
+        'watch_dir': watch.get('watch_dir'),
+        'file_pattern': watch.get('file_pattern', '*.inx'),
+        'quiet_period_seconds': watch.get('quiet_period_seconds', 1.0),
+        'message_id': cfg.get('protocol', {}).get('message_id', MSG_VTEC),
+        'interval_seconds': bcast.get('interval_seconds', 10.0),
+        'port': cfg['tcp_server']['port'],
+        'mountpoint': None,
+        'save_path': None,
+        'delta_frames': bcast.get('delta_frames', False),
+        'keyframe_every': bcast.get('keyframe_every', 6),
+        'max_catchup_ticks': bcast.get('max_catchup_ticks', 0),
+    }
+
+    streams = []
+    names = set()
+    endpoints = set()
+    for i, item in enumerate(cfg.get('streams', [])):
+        stream = dict(defaults, **item)
+        name = stream.get('name')
+        if not name:
+            raise ValueError(f'第 {i + 1} 个播发流缺少name')
+        if name in names:
+            raise ValueError(f'播发流名称重复: {name}')
+        if not stream['watch_dir']:
+            raise ValueError(f'播发流 {name} 缺少watch_dir')
+        endpoint = (stream['port'], stream['mountpoint'])
+        if endpoint in endpoints:
+            where = f"挂载点 {stream['mountpoint']}" if stream['mountpoint'] else '默认流（无挂载点）'
+            raise ValueError(f"播发流 {name}: 端口 {stream['port']} 上的{where}重复")
+        msg_id = stream['message_id']
+        if not 0 <= msg_id <= 0xFF or msg_id == MSG_VTEC_DELTA:
+            raise ValueError(f'播发流 {name}: 消息ID非法 {msg_id}（0x03保留给差分帧）')
+        if stream['interval_seconds'] <= 0:
+            raise ValueError(f'播发流 {name}: 播发间隔必须大于0')
+        names.add(name)
+        endpoints.add(endpoint)
+        streams.append(stream)
+    return streams
+
+
+class StreamHub:
+    """多产品播发中心
+
+    每个播发流有独立的监控目录/文件模式、消息ID、播发间隔、IOD状态（各自的Broadcaster快照）
+    和端口/挂载点。以下资源在所有流之间共用:
+    - 一个节拍线程：按各流GpsScheduler的截止时间（最小堆）依次调用Broadcaster.tick()
+    - 一个历元线程：每秒检查各多地图文件是否需要切换历元（解码/编码不在节拍线程上）
+    - 一个watchdog Observer和一个入库线程池（IngestPool）
+    - 一个已编码帧缓存（相同文件、地图、IOD和消息ID只编码一次）
+    - 每个端口一个TCP服务器；同一端口上的多个流按挂载点区分（客户端发送 "MOUNT 名称"）
+
+    节拍线程上的broadcast()调用依次执行，selectors/asyncio模式下只把帧交给I/O线程，
+    不会因慢客户端阻塞其他流；thread模式的broadcast()最长等待send_timeout，
+    run_streams()在配置为thread模式时改用selectors模式。
+    """
+
+    def __init__(self, streams: List[Dict[str, Any]], make_server: Callable[[int], Any],
+                 make_archive: Optional[Callable[[str], ArchiveWriter]] = None,
+                 ingest_workers: int = 2):
+        """初始化播发中心
+
+        Args:
+            streams: stream_configs()返回的各流配置
+            make_server: 按端口创建TCP服务器 make_server(port)
+            make_archive: 按保存路径创建归档写入器（None时使用默认策略）
+            ingest_workers: 入库线程数
+        """
+        self.streams = streams
+        self.cache = FrameCache(max_entries=max(8, 4 * len(streams)))
+        self.servers: Dict[int, Any] = {}
+        self.broadcasters: List[Broadcaster] = []
+        self.watchers: List[FileWatcher] = []
+        self.observer = Observer()
+        self.pool = IngestPool(ingest_workers)
+        self.tick_thread: Optional[Thread] = None
+        self.epoch_thread: Optional[Thread] = None
+        self.stop_event = Event()
+        self.log = logging.getLogger('StreamHub')
+
+        for stream in streams:
+            port = stream['port']
+            if port not in self.servers:
+                self.servers[port] = make_server(port)
+
+            archive = None
+            if stream['save_path']:
+                archive = make_archive(stream['save_path']) if make_archive else ArchiveWriter(stream['save_path'])
+
+            b = Broadcaster(
+                tcpsvr=self.servers[port],
+                interval=stream['interval_seconds'],
+                delta_frames=stream['delta_frames'],
+                keyframe_every=stream['keyframe_every'],
+                max_catchup=stream['max_catchup_ticks'],
+                archive=archive,
+                msg_id=stream['message_id'],
+                name=stream['name'],
+                mount=stream['mountpoint'],
+                frame_cache=self.cache
+            )
+            self.broadcasters.append(b)
+            self.watchers.append(FileWatcher(
+                watch_dir=stream['watch_dir'],
+                callback=b.set_file,
+                pattern=stream['file_pattern'],
+                quiet_period=stream['quiet_period_seconds'],
+                observer=self.observer,
+                pool=self.pool
+            ))
+
+    def start(self):
+        """启动TCP服务器、文件监控，加载各流的初始文件并启动共用线程
+
+        Raises:
+            Exception: TCP服务器或文件监控启动失败（已启动的部分由stop()关闭）
+        """
+        for svr in self.servers.values():
+            svr.start()
+
+        for stream, b, watcher in zip(self.streams, self.broadcasters, self.watchers):
+            watcher.start()
+            files = sorted(Path(stream['watch_dir']).glob(stream['file_pattern']))
+            if files:
+                self.log.info(f"[{stream['name']}] 加载初始文件: {files[-1].name}")
+                b.set_file(files[-1])
+            else:
+                self.log.warning(f"[{stream['name']}] 监控目录中未找到{stream['file_pattern']}文件")
+            b.start(driven=True)
+        self.observer.start()
+
+        self.stop_event.clear()
+        self.tick_thread = Thread(target=self._tick_loop, name='StreamTick', daemon=True)
+        self.tick_thread.start()
+        self.epoch_thread = Thread(target=self._epoch_loop, name='StreamEpoch', daemon=True)
+        self.epoch_thread.start()
+
+        for stream in self.streams:
+            where = f":{stream['port']}" + (f"/{stream['mountpoint']}" if stream['mountpoint'] else '')
+            self.log.info(f"播发流 {stream['name']}: {stream['watch_dir']}/{stream['file_pattern']} → "
+                          f"{where}, 消息ID 0x{stream['message_id']:02X}, 间隔 {stream['interval_seconds']} 秒")
+        self.log.info(f'多产品播发启动: {len(self.streams)} 个流, {len(self.servers)} 个端口, '
+                      f'入库线程 {self.pool.workers} 个')
+
+    def _tick_loop(self):
+        """节拍线程：按截止时间顺序触发各流的播发周期"""
+        heap: List[Tuple[float, int]] = [(b.scheduler.deadline(), i) for i, b in enumerate(self.broadcasters)]
+        heapq.heapify(heap)
+        while heap:
+            deadline, i = heap[0]
+            remaining = deadline - time.monotonic()
+            if remaining > 0 and self.stop_event.wait(remaining):
+                break
+            if self.stop_event.is_set():
+                break
+
+            b = self.broadcasters[i]
+            b.scheduler.fire()
+            b.tick()
+            heapq.heapreplace(heap, (b.scheduler.deadline(), i))
+
+    def _epoch_loop(self):
+        """历元线程：多地图文件随时间推移切换地图"""
+        while not self.stop_event.wait(1.0):
+            for b in self.broadcasters:
+                b.step_epoch()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各流的播发统计 {流名称: Broadcaster.get_stats()}"""
+        return {b.name: b.get_stats() for b in self.broadcasters}
+
+    def stop(self):
+        """停止共用线程、文件监控、各流归档和TCP服务器"""
+        self.log.info('正在停止多产品播发...')
+        self.stop_event.set()
+        for thread in (self.tick_thread, self.epoch_thread):
+            if thread:
+                thread.join(timeout=5.0)
+
+        for watcher in self.watchers:
+            watcher.stop()
+        if self.observer.is_alive():
+            self.observer.stop()
+            self.observer.join()
+        self.pool.stop()
+
+        for b in self.broadcasters:
+            b.stop()
+        for svr in self.servers.values():
+            svr.stop()
+        self.log.info(f'多产品播发已停止, 帧缓存: {self.cache.get_stats()}')
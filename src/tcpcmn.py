@@ -2,9 +2,21 @@
 
 import json
 import logging
+import struct
 import sys
+from binascii import crc_hqx
 from datetime import datetime, timedelta
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, List
+
+# 帧格式常量
+FRAME_MAGIC = 0x01AA
+FRAME_TAIL = 0x00FF
+FRAME_HEADER_LEN = 13
+FRAME_TAIL_LEN = 4
+FRAME_MIN_LEN = FRAME_HEADER_LEN + FRAME_TAIL_LEN
+MSG_VTEC = 0x02        # 完整模型帧（关键帧）
+MSG_VTEC_DELTA = 0x03  # 差分帧（相对于参考IOD的关键帧）
+_MAGIC_BYTES = struct.pack('>H', FRAME_MAGIC)
 
 # GPS时间常量
 GPS_EPOCH = datetime(1980, 1, 6, 0, 0, 0)
@@ -94,27 +106,96 @@ def utc2gps(dt: datetime) -> Tuple[int, int]:
 
 
 def crc16(data: bytes) -> int:
-    """CRC-16/XMODEM校验（多项式0x1021）
+    """CRC-16/XMODEM校验（多项式0x1021，初值0）
+    
+    使用标准库binascii.crc_hqx（C实现，查表法），与逐位实现结果一致。
     
     Args:
-        data: 待校验数据
+        data: 待校验数据（bytes/bytearray/memoryview）
     
     Returns:
         CRC值（0x0000-0xFFFF）
     """
-    crc = 0x0000
-    poly = 0x1021
+    return crc_hqx(data, 0)
+
+
+def crc16_update(crc: int, data: bytes) -> int:
+    """增量CRC-16/XMODEM：在已有CRC基础上继续计算
     
-    for byte in data:
-        crc ^= (byte << 8)
-        for _ in range(8):
-            if crc & 0x8000:
-                crc = (crc << 1) ^ poly
-            else:
-                crc <<= 1
-            crc &= 0xFFFF
+    crc16_update(crc16(a), b) == crc16(a + b)，可分段校验Header和Body而无需拼接。
     
-    return crc
+    Args:
+        crc: 前一段数据的CRC值
+        data: 后续数据
+    
+    Returns:
+        更新后的CRC值
+    """
+    return crc_hqx(data, crc)
+
+
+def buffer_find(buffer):
+    """返回在buffer中搜索子串的find函数（偏移相对于buffer）
+    
+    bytes/bytearray/mmap直接使用自身的find，不拷贝；覆盖整个底层对象的memoryview
+    在底层对象（view.obj）上搜索，也不拷贝。memoryview切片无法得知在底层对象中的起始偏移，
+    拷贝一份后搜索。
+    """
+    find = getattr(buffer, 'find', None)
+    if find is not None:
+        return find
+    if isinstance(buffer, memoryview) and buffer.c_contiguous:
+        find = getattr(buffer.obj, 'find', None)
+        if find is not None:
+            with memoryview(buffer.obj) as whole:
+                if whole.nbytes == buffer.nbytes:
+                    return find
+    return bytes(buffer).find
+
+
+def verify_frames(buffer: bytes) -> List[Tuple[int, int, bool]]:
+    """批量校验连续存放的帧（例如保存的.bin文件）
+    
+    从头扫描魔数0x01AA，按帧长度字段切分并校验CRC和尾部标记；
+    遇到损坏数据时向后搜索下一个魔数重新同步，末尾不完整的帧被忽略。
+    重新同步过程中校验失败的候选位置不计入结果。
+    
+    Args:
+        buffer: 帧数据缓冲区（bytes/bytearray/memoryview/mmap；memoryview切片搜索魔数时会拷贝，见buffer_find）
+    
+    Returns:
+        [(偏移, 帧长度, 校验是否通过)]
+    """
+    view = memoryview(buffer)
+    find = buffer_find(buffer)
+    total = len(view)
+    results = []
+    offset = 0
+    aligned = True  # 当前偏移是否为预期的帧边界
+    
+    while offset + FRAME_MIN_LEN <= total:
+        length = (view[offset + 3] << 8) | view[offset + 4]
+        end = offset + length
+        if view[offset:offset + 2] == _MAGIC_BYTES and FRAME_MIN_LEN <= length and end <= total:
+            crc_recv = (view[end - 4] << 8) | view[end - 3]
+            tail = (view[end - 2] << 8) | view[end - 1]
+            if tail == FRAME_TAIL and crc_hqx(view[offset + 2:end - 4], 0) == crc_recv:
+                results.append((offset, length, True))
+                offset = end
+                aligned = True
+                continue
+            if aligned:
+                results.append((offset, length, False))
+        elif aligned and view[offset:offset + 2] == _MAGIC_BYTES and end > total:
+            break  # 末尾不完整的帧
+        
+        # 重新同步：搜索下一个魔数
+        aligned = False
+        offset = find(_MAGIC_BYTES, offset + 1)
+        if offset < 0:
+            break
+    
+    return results
 
 
 def init_log(cfg: dict) -> logging.Logger:
@@ -155,6 +236,10 @@ def init_log(cfg: dict) -> logging.Logger:
     return logger
 
 
+# RMS索引分档上界（TECU），索引i对应区间[RMS_BOUNDS[i], RMS_BOUNDS[i+1])
+RMS_BOUNDS = (0, 0.6, 1.2, 1.8, 2.4, 3.0, 3.6, 4.2, 4.8, 5.4, 6.0, 6.6, 7.2, 7.8, 8.4, 9.0)
+
+
 def rms2idx(rms_tecu: float) -> int:
     """RMS值(TECU) → 4-bit索引(0-15)
     
@@ -164,7 +249,7 @@ def rms2idx(rms_tecu: float) -> int:
     Returns:
         索引（0-15）
     """
-    bounds = [0, 0.6, 1.2, 1.8, 2.4, 3.0, 3.6, 4.2, 4.8, 5.4, 6.0, 6.6, 7.2, 7.8, 8.4, 9.0]
+    bounds = RMS_BOUNDS
     for i in range(15):
         if rms_tecu < bounds[i+1]:
             return i
@@ -2,9 +2,463 @@
 
 import socket
 import select
+import struct
 import logging
-from typing import Set
-from threading import Lock
+import time
+from collections import deque
+from typing import Dict, List, Any, Deque, Optional, Tuple, FrozenSet
+from threading import Lock, Thread, Event
+
+from src.tcpcmn import MSG_VTEC_DELTA
+
+# sendmsg聚集发送（Windows无此接口，退回逐帧send）
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+# TCP_INFO（Linux）：监听socket的tcpi_unacked为accept队列当前长度，tcpi_sacked为backlog上限
+_TCP_INFO = getattr(socket, 'TCP_INFO', None)
+_TCPI_QUEUE = struct.Struct('=II')  # tcpi_unacked, tcpi_sacked（偏移24）
+
+
+def tune_socket(sock: socket.socket, nodelay: bool = True, sndbuf: int = 0):
+    """客户端socket调优（同rtklib setsock）
+    
+    Args:
+        sock: 客户端socket
+        nodelay: 是否设置TCP_NODELAY（关闭Nagle，帧到达即发出）
+        sndbuf: SO_SNDBUF字节数（0表示使用系统默认）
+    """
+    try:
+        if nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if sndbuf > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    except OSError as e:
+        logging.getLogger('TcpServer').debug(f'socket选项设置失败: {e}')
+
+
+# 区域订阅请求: "REGION <lat1> <lat2> <lon1> <lon2>\r\n"（度，顺序不限）
+Region = Tuple[float, float, float, float]  # (南纬界, 北纬界, 西经界, 东经界)，0.1度取整
+REQUEST_MAX_LEN = 256  # 单行请求最大长度（超长丢弃）
+
+# 挂载点请求: "MOUNT <名称>\r\n" 或NTRIP风格 "GET /<名称> ..."（同一端口上的多个播发流按挂载点区分）
+Subscription = Tuple[Optional[str], Optional[Region]]  # (挂载点, 区域)，None为默认流/完整网格
+
+
+def parse_region(line: bytes) -> Optional[Region]:
+    """解析区域订阅请求
+    
+    Args:
+        line: 一行请求（不含换行）
+    
+    Returns:
+        规范化区域 (lat_min, lat_max, lon_min, lon_max)；
+        "REGION ALL" 或无法识别时返回None（订阅完整网格）
+    """
+    fields = line.decode('ascii', 'replace').split()
+    if len(fields) != 5 or fields[0].upper() != 'REGION':
+        return None
+    try:
+        lat1, lat2, lon1, lon2 = (round(float(v), 1) for v in fields[1:])
+    except ValueError:
+        return None
+    if not (-90 <= lat1 <= 90 and -90 <= lat2 <= 90 and -180 <= lon1 <= 360 and -180 <= lon2 <= 360):
+        return None
+    return (min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2))
+
+
+def parse_mount(line: bytes) -> Optional[str]:
+    """解析挂载点请求
+    
+    Args:
+        line: 一行请求（不含换行）
+    
+    Returns:
+        挂载点名称；"MOUNT" / "GET /" 不带名称时返回None（默认流）
+    """
+    fields = line.decode('ascii', 'replace').split()
+    if len(fields) < 2:
+        return None
+    if fields[0].upper() == 'GET':
+        return fields[1].lstrip('/') or None
+    return fields[1] if fields[0].upper() == 'MOUNT' else None
+
+
+def feed_requests(buf: bytes, chunk: bytes) -> Tuple[bytes, List[Optional[Region]], List[Optional[str]]]:
+    """按行切分客户端上行数据，解析其中的区域订阅和挂载点请求
+    
+    Args:
+        buf: 上次剩余的不完整行
+        chunk: 新收到的数据
+    
+    Returns:
+        (剩余不完整行, 本次解析出的区域请求列表, 挂载点请求列表)
+    """
+    buf += chunk
+    *lines, buf = buf.split(b'\n')
+    if len(buf) > REQUEST_MAX_LEN:
+        buf = b''
+    regions, mounts = [], []
+    for line in lines:
+        line = line.strip()
+        word = line[:6].upper()
+        if word == b'REGION':
+            regions.append(parse_region(line))
+        elif word[:5] == b'MOUNT' or word[:4] == b'GET ':
+            mounts.append(parse_mount(line))
+    return buf, regions, mounts
+
+
+class Subscriptions:
+    """在线客户端的区域订阅计数（按挂载点分组）
+    
+    由连接所在的I/O线程更新；regions为{挂载点: 不可变区域集合}，每次变化整体替换，
+    播发线程直接读取引用，无需加锁。
+    """
+    
+    def __init__(self):
+        self.counts: Dict[Tuple[Optional[str], Region], int] = {}
+        self.regions: Dict[Optional[str], FrozenSet[Region]] = {}
+    
+    def change(self, old: Optional[Subscription], new: Optional[Subscription]):
+        """客户端订阅从old变为new（(挂载点, 区域)；None或区域为None表示完整网格，不计数）"""
+        if old == new:
+            return
+        if old is not None and old[1] is not None:
+            self.counts[old] -= 1
+            if not self.counts[old]:
+                del self.counts[old]
+        if new is not None and new[1] is not None:
+            self.counts[new] = self.counts.get(new, 0) + 1
+        grouped: Dict[Optional[str], set] = {}
+        for mount, region in self.counts:
+            grouped.setdefault(mount, set()).add(region)
+        self.regions = {mount: frozenset(regions) for mount, regions in grouped.items()}
+    
+    def get(self, mount: Optional[str] = None) -> FrozenSet[Region]:
+        """挂载点上的订阅区域集合"""
+        return self.regions.get(mount, frozenset())
+    
+    def clear(self):
+        self.counts.clear()
+        self.regions = {}
+
+
+def select_frame(data: bytes, regional: Optional[Dict[Region, bytes]], region: Optional[Region]) -> bytes:
+    """按客户端订阅区域选择要发送的帧（无对应区域帧时发送完整帧）"""
+    if regional and region is not None:
+        return regional.get(region) or data
+    return data
+
+
+def frame_msg_id(data) -> Optional[int]:
+    """帧的消息ID（帧过短时返回None）"""
+    return data[2] if len(data) > 2 else None
+
+
+def supersedes(new_id: Optional[int], old_id: Optional[int]) -> bool:
+    """新帧入队时，尚未发送的旧帧是否作废
+    
+    同一消息ID的旧帧过期；关键帧（非0x03）还使排在前面的未发送差分帧作废，
+    否则这些差分帧会失去被替换掉的参考关键帧。
+    """
+    return old_id == new_id or (new_id != MSG_VTEC_DELTA and old_id == MSG_VTEC_DELTA)
+
+
+def overflow_victim(msg_ids: List[Optional[int]], first: int) -> int:
+    """队列溢出时选择丢弃的帧下标
+    
+    默认丢弃最旧的未发送帧（下标first）；若它是关键帧且后面排着依赖它的差分帧，
+    改为丢弃该差分帧，避免客户端收到无法解码的差分帧。
+    
+    Args:
+        msg_ids: 待发队列中各帧的消息ID
+        first: 第一个未开始发送的帧下标
+    """
+    if msg_ids[first] != MSG_VTEC_DELTA:
+        for i in range(first + 1, len(msg_ids)):
+            if msg_ids[i] == MSG_VTEC_DELTA:
+                return i
+    return first
+
+
+def accept_queue(sock) -> Optional[Tuple[int, int]]:
+    """读取监听socket的accept队列 (当前长度, 上限)
+    
+    Returns:
+        (已完成握手、等待accept的连接数, backlog上限)；非Linux或读取失败返回None
+    """
+    if _TCP_INFO is None:
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, _TCP_INFO, 104)
+    except OSError:
+        return None
+    if len(info) < 24 + _TCPI_QUEUE.size:
+        return None
+    return _TCPI_QUEUE.unpack_from(info, 24)
+
+
+class ClientConn:
+    """客户端连接状态（有界待发队列 + 慢客户端统计）
+    
+    待发队列策略:
+    - 同一消息ID的新帧替换尚未开始发送的旧帧（过期模型无意义），新关键帧同时替换未发送的差分帧
+    - 超过队列长度时丢弃最旧的未发送帧；关键帧后面排着差分帧时改为丢弃差分帧
+    - 已部分发送的队首帧必须发完，避免破坏帧边界
+    - 差分帧（0x03）只发给已收到（或已排队）参考关键帧的客户端：新接入、切换订阅或
+      关键帧被丢弃的客户端，先补发服务器记录的当前参考关键帧
+    """
+    
+    def __init__(self, sock: socket.socket, addr, max_frames: int = 4):
+        """初始化客户端状态
+        
+        Args:
+            sock: 非阻塞客户端socket
+            addr: 对端地址
+            max_frames: 待发队列最大帧数
+        """
+        self.sock = sock
+        self.addr = addr
+        self.max_frames = max(1, max_frames)
+        self.pending: Deque[list] = deque()  # [消息ID, memoryview, 已发送偏移, 入队时间]
+        self.queued_bytes = 0
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.dropped_frames = 0
+        self.last_latency = 0.0   # 最近一帧入队到发完的耗时（秒）
+        self.max_latency = 0.0
+        self.want_write = False   # 是否已注册写事件（selectors引擎使用）
+        self.region: Optional[Region] = None  # 订阅区域（None为完整网格）
+        self.mount: Optional[str] = None      # 挂载点（None为端口上的默认流）
+        self.synced = False  # 当前参考关键帧是否已发送或已入队（可以接收差分帧）
+        self.rxbuf = b''
+    
+    def enqueue(self, data: bytes, keyframe: Optional[bytes] = None) -> int:
+        """帧入队
+        
+        Args:
+            data: 二进制帧数据
+            keyframe: 差分帧的参考关键帧（客户端尚未收到时先入队；None时丢弃该差分帧）
+        
+        Returns:
+            因替换、溢出或缺少参考关键帧被丢弃的帧数
+        """
+        frames = [data]
+        if frame_msg_id(data) == MSG_VTEC_DELTA and not self.synced:
+            if keyframe is None:
+                self.dropped_frames += 1
+                return 1
+            frames = [keyframe, data]
+        
+        dropped = 0
+        now = time.monotonic()
+        for frame in frames:
+            msg_id = frame_msg_id(frame)
+            
+            # 替换作废的未发送旧帧
+            kept = deque()
+            for entry in self.pending:
+                if entry[2] == 0 and supersedes(msg_id, entry[0]):
+                    self.queued_bytes -= len(entry[1])
+                    dropped += 1
+                else:
+                    kept.append(entry)
+            self.pending = kept
+            
+            self.pending.append([msg_id, memoryview(frame), 0, now])
+            self.queued_bytes += len(frame)
+            if msg_id != MSG_VTEC_DELTA:
+                self.synced = True
+        
+        # 溢出时丢弃最旧的未发送帧（保留差分帧所依赖的关键帧）
+        while len(self.pending) > self.max_frames:
+            first = 1 if self.pending[0][2] > 0 else 0
+            idx = overflow_victim([e[0] for e in self.pending], first)
+            entry = self.pending[idx]
+            del self.pending[idx]
+            self.queued_bytes -= len(entry[1])
+            dropped += 1
+            if entry[0] != MSG_VTEC_DELTA:
+                self.synced = False
+        
+        self.dropped_frames += dropped
+        return dropped
+    
+    def send_pending(self) -> bool:
+        """非阻塞发送待发数据（支持部分写）
+        
+        多帧待发且平台支持sendmsg时一次系统调用聚集发送（scatter-gather），
+        各帧memoryview直接交给内核，不做拼接拷贝。
+        
+        Returns:
+            队列是否已全部发完
+        
+        Raises:
+            OSError: 连接异常（由调用方断开客户端）
+        """
+        while self.pending:
+            try:
+                if len(self.pending) > 1 and _HAS_SENDMSG:
+                    n = self.sock.sendmsg([e[1][e[2]:] for e in self.pending])
+                else:
+                    entry = self.pending[0]
+                    n = self.sock.send(entry[1][entry[2]:])
+            except (BlockingIOError, InterruptedError):
+                return False
+            if n <= 0:
+                return False
+            
+            self.sent_bytes += n
+            self.queued_bytes -= n
+            self._advance(n)
+        return True
+    
+    def _advance(self, n: int):
+        """按已发送字节数推进队列，记录发完帧的延迟"""
+        while n > 0:
+            entry = self.pending[0]
+            left = len(entry[1]) - entry[2]
+            if n < left:
+                entry[2] += n
+                return
+            n -= left
+            self.pending.popleft()
+            self.sent_frames += 1
+            self.last_latency = time.monotonic() - entry[3]
+            self.max_latency = max(self.max_latency, self.last_latency)
+    
+    @property
+    def subscription(self) -> Subscription:
+        """当前订阅 (挂载点, 区域)"""
+        return self.mount, self.region
+    
+    def feed(self, chunk: bytes) -> Subscription:
+        """处理客户端上行数据，更新订阅区域和挂载点
+        
+        Returns:
+            更新前的订阅（供调用方更新订阅计数）
+        """
+        old = self.subscription
+        self.rxbuf, regions, mounts = feed_requests(self.rxbuf, chunk)
+        for region in regions:
+            self.region = region
+        for mount in mounts:
+            self.mount = mount
+        if self.subscription != old:
+            self.synced = False  # 已收到的关键帧不是新订阅的参考帧
+        return old
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """客户端统计"""
+        return {
+            'addr': self.addr,
+            'mount': self.mount,
+            'region': self.region,
+            'queued_frames': len(self.pending),
+            'queued_bytes': self.queued_bytes,
+            'sent_frames': self.sent_frames,
+            'sent_bytes': self.sent_bytes,
+            'dropped_frames': self.dropped_frames,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+        }
+
+
+class Admission:
+    """连接准入控制与accept统计
+    
+    - 客户端总数上限（max_clients）
+    - 单IP连接数上限（max_per_ip，0表示不限制）
+    - 按原因统计拒绝次数
+    - 按原因统计断开次数（原因为固定分类，不含异常文本）
+    - accept队列：每次监听socket可读时的待accept连接数（最近/最大）和backlog上限（Linux TCP_INFO）
+    - 取空耗时：从监听socket可读到本轮待接入连接全部accept完成的耗时（最近/最大），
+      以及单轮接入的最多连接数；队列较深或取空较慢说明accept路径跟不上重连风暴
+    """
+    
+    def __init__(self, max_clients: int, max_per_ip: int = 0):
+        self.max_clients = max_clients
+        self.max_per_ip = max_per_ip
+        self.active = 0
+        self.per_ip: Dict[str, int] = {}
+        self.accepted = 0
+        self.rejected: Dict[str, int] = {}
+        self.disconnects: Dict[str, int] = {}
+        self.queue_last = 0
+        self.queue_max = 0
+        self.queue_limit = 0
+        self.drain_last = 0.0
+        self.drain_max = 0.0
+        self.burst_max = 0
+        self.lock = Lock()
+    
+    def check(self, ip: str) -> Optional[str]:
+        """检查是否允许接入，允许时占用名额
+        
+        Returns:
+            拒绝原因；None表示允许
+        """
+        with self.lock:
+            if self.active >= self.max_clients:
+                reason = '已满'
+            elif self.max_per_ip and self.per_ip.get(ip, 0) >= self.max_per_ip:
+                reason = '单IP连接数超限'
+            else:
+                self.active += 1
+                self.per_ip[ip] = self.per_ip.get(ip, 0) + 1
+                self.accepted += 1
+                return None
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            return reason
+    
+    def release(self, ip: str, reason: str = '服务器关闭'):
+        """客户端断开，释放名额
+        
+        Args:
+            ip: 客户端IP
+            reason: 断开原因分类
+        """
+        with self.lock:
+            self.disconnects[reason] = self.disconnects.get(reason, 0) + 1
+            self.active = max(0, self.active - 1)
+            n = self.per_ip.get(ip, 0) - 1
+            if n > 0:
+                self.per_ip[ip] = n
+            else:
+                self.per_ip.pop(ip, None)
+    
+    def record_queue(self, queue: Optional[Tuple[int, int]]):
+        """记录监听socket可读时的accept队列（accept_queue()的结果，None时忽略）"""
+        if queue is None:
+            return
+        with self.lock:
+            self.queue_last, self.queue_limit = queue
+            self.queue_max = max(self.queue_max, self.queue_last)
+    
+    def record_drain(self, seconds: float, accepted: int):
+        """记录一轮取空accept队列的耗时和接入（含拒绝）的连接数"""
+        if not accepted:
+            return
+        with self.lock:
+            self.drain_last = seconds
+            self.drain_max = max(self.drain_max, seconds)
+            self.burst_max = max(self.burst_max, accepted)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """accept统计"""
+        with self.lock:
+            return {
+                'active': self.active,
+                'accepted': self.accepted,
+                'rejected': dict(self.rejected),
+                'disconnects': dict(self.disconnects),
+                'accept_queue': self.queue_last,
+                'accept_queue_max': self.queue_max,
+                'accept_queue_limit': self.queue_limit,
+                'accept_drain_seconds': self.drain_last,
+                'accept_drain_max_seconds': self.drain_max,
+                'accept_burst_max': self.burst_max,
+            }
 
 
 class TcpServer:
@@ -14,22 +468,51 @@ class TcpServer:
     - 非阻塞accept
     - 多客户端列表管理
     - 广播发送（捕获异常防止单客户端故障影响全局）
+    - 每客户端有界待发队列，非阻塞发送，慢客户端不阻塞其他客户端
+    - 每次广播轮换起始客户端，保证公平
+    - 独立accept线程，连接到达即接入并一次取空监听队列（可关闭，回退为每周期轮询）
+    - 区域订阅：客户端发送 "REGION lat1 lat2 lon1 lon2" 后只接收该区域的网格帧
+    - 挂载点：同一端口上有多个播发流时，客户端发送 "MOUNT 名称"（或 "GET /名称"）选择播发流
     """
     
-    def __init__(self, host: str, port: int, max_clients: int = 10):
+    def __init__(self, host: str, port: int, max_clients: int = 10,
+                 queue_size: int = 4, send_timeout: float = 1.0,
+                 backlog: int = 128, max_per_ip: int = 0, accept_thread: bool = True,
+                 nodelay: bool = True, sndbuf: int = 0):
         """初始化TCP服务器
         
         Args:
             host: 绑定地址（"0.0.0.0"监听所有接口）
             port: 端口号
             max_clients: 最大客户端数
+            queue_size: 每客户端待发帧队列长度
+            send_timeout: 每次广播等待慢客户端可写的最长时间（秒），
+                          超时未发完的数据留在队列中，下次广播继续发送
+            backlog: 监听队列长度（重启后大量客户端同时重连时避免内核队列溢出）
+            max_per_ip: 单IP最大连接数（0表示不限制）
+            accept_thread: 是否启用独立accept线程
+            nodelay: 客户端socket是否设置TCP_NODELAY
+            sndbuf: 客户端socket发送缓冲区字节数（0表示系统默认）
         """
         self.host = host
         self.port = port
         self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.backlog = backlog
+        self.use_accept_thread = accept_thread
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
         self.sock = None
-        self.clients: Set[socket.socket] = set()
+        self.clients: Dict[socket.socket, ClientConn] = {}
+        self.incoming: Deque[ClientConn] = deque()  # accept线程接入、待并入clients的连接
+        self.admission = Admission(max_clients, max_per_ip)
+        self.subs = Subscriptions()
+        self.keyframes: Dict[Optional[str], bytes] = {}  # 各挂载点最近播发的关键帧（差分帧的参考帧）
+        self._rr = 0  # 轮换起始位置
         self.lock = Lock()
+        self.accept_thread: Optional[Thread] = None
+        self.stop_event = Event()
         self.log = logging.getLogger('TcpServer')
     
     def start(self):
@@ -38,92 +521,236 @@ class TcpServer:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.sock.bind((self.host, self.port))
-            self.sock.listen(self.max_clients)
+            self.sock.listen(self.backlog)
             self.sock.setblocking(False)  # 非阻塞模式
-            self.log.info(f'TCP服务器启动: {self.host}:{self.port}')
+            self.log.info(f'TCP服务器启动: {self.host}:{self.port}, backlog={self.backlog}')
         except Exception as e:
             self.log.error(f'启动失败: {e}')
             raise
+        
+        if self.use_accept_thread:
+            self.stop_event.clear()
+            self.accept_thread = Thread(target=self._accept_loop, name='TcpAccept', daemon=True)
+            self.accept_thread.start()
+    
+    def _accept_loop(self):
+        """accept线程：监听socket可读即取空全部待接入连接"""
+        while not self.stop_event.is_set():
+            try:
+                readable, _, _ = select.select([self.sock], [], [], 0.5)
+            except (OSError, ValueError):
+                break  # 监听socket已关闭
+            if readable:
+                self._accept_pending()
+    
+    def _accept_pending(self):
+        """接受监听队列中的所有连接（rtkrcv waittcpsvr: while (accsock()) ;）
+        
+        开始前记录accept队列长度，取空后记录本轮耗时（见Admission）。
+        """
+        t0 = time.monotonic()
+        self.admission.record_queue(accept_queue(self.sock))
+        accepted = 0
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                break
+            except Exception as e:
+                self.log.error(f'accept异常: {e}')
+                break
+            
+            accepted += 1
+            reason = self.admission.check(addr[0])
+            if reason:
+                self.log.warning(f'拒绝连接（{reason}）: {addr}')
+                conn.close()
+                continue
+            
+            conn.setblocking(False)
+            tune_socket(conn, self.nodelay, self.sndbuf)
+            self.incoming.append(ClientConn(conn, addr, self.queue_size))
+            self.log.info(f'新客户端连接: {addr}, 总计 {self.admission.active} 个')
+        self.admission.record_drain(time.monotonic() - t0, accepted)
+    
+    def _merge_incoming(self):
+        """将新接入的连接并入客户端表（调用方持有self.lock）"""
+        while self.incoming:
+            conn = self.incoming.popleft()
+            self.clients[conn.sock] = conn
     
     def accept_clients(self):
-        """非阻塞接受新客户端连接（rtkrcv风格）"""
+        """非阻塞接受新客户端连接（rtkrcv风格，未启用accept线程时每周期调用）"""
+        if self.accept_thread and self.accept_thread.is_alive():
+            return
         try:
             readable, _, _ = select.select([self.sock], [], [], 0)
             if readable:
-                conn, addr = self.sock.accept()
-                conn.setblocking(False)
-                
-                with self.lock:
-                    if len(self.clients) < self.max_clients:
-                        self.clients.add(conn)
-                        self.log.info(f'新客户端连接: {addr}, 总计 {len(self.clients)} 个')
-                    else:
-                        self.log.warning(f'拒绝连接（已满）: {addr}')
-                        conn.close()
-        except BlockingIOError:
-            pass
+                self._accept_pending()
         except Exception as e:
             self.log.error(f'accept异常: {e}')
     
-    def broadcast(self, data: bytes) -> int:
-        """广播数据到所有客户端
+    def get_regions(self, mount: Optional[str] = None) -> FrozenSet[Region]:
+        """读取客户端上行的区域订阅/挂载点请求，返回挂载点上的所有订阅区域
+        
+        播发线程在broadcast()前调用，为每个区域准备一帧。
         
         Args:
-            data: 二进制帧数据
+            mount: 挂载点（None为默认流）
+        """
+        with self.lock:
+            self._merge_incoming()
+            for conn in self.clients.values():
+                try:
+                    chunk = conn.sock.recv(4096)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    continue  # 连接异常由发送路径处理
+                if chunk:
+                    old = conn.feed(chunk)
+                    self.subs.change(old, conn.subscription)
+                    if conn.mount != old[0]:
+                        self.log.info(f'客户端选择挂载点: {conn.addr} → {conn.mount or "默认"}')
+                    if conn.region != old[1]:
+                        self.log.info(f'客户端订阅区域: {conn.addr} → {conn.region or "完整网格"}')
+        return self.subs.get(mount)
+    
+    def broadcast(self, data: bytes, regional: Optional[Dict[Region, bytes]] = None,
+                  mount: Optional[str] = None) -> int:
+        """广播数据到挂载点上的所有客户端
+        
+        帧先进入每个客户端的待发队列，再按轮换顺序非阻塞发送；
+        未能立即发完的客户端在send_timeout内等待可写，仍未发完则留待下次。
+        
+        Args:
+            data: 二进制帧数据（完整网格）
+            regional: 区域订阅帧 {区域: 帧}，订阅了区域的客户端发送对应帧
+            mount: 挂载点（None为默认流，即未发送挂载点请求的客户端）
         
         Returns:
-            成功发送的客户端数量
+            本次发完全部数据的客户端数量
         """
         if not data:
             return 0
         
-        sent_count = 0
         disconnected = []
         
         with self.lock:
-            for client in self.clients:
-                try:
-                    client.sendall(data)
-                    sent_count += 1
-                except BrokenPipeError:
-                    self.log.warning(f'客户端断开（BrokenPipe）: {client.getpeername()}')
-                    disconnected.append(client)
-                except ConnectionResetError:
-                    self.log.warning(f'客户端重置（Reset）: {client.getpeername()}')
-                    disconnected.append(client)
-                except Exception as e:
-                    self.log.error(f'发送失败: {e}')
-                    disconnected.append(client)
+            self._merge_incoming()
+            if frame_msg_id(data) != MSG_VTEC_DELTA:
+                self.keyframes[mount] = data
+            keyframe = self.keyframes.get(mount)
+            conns = [c for c in self.clients.values() if c.mount == mount]
+            if conns:
+                start = self._rr % len(conns)
+                conns = conns[start:] + conns[:start]
+                self._rr += 1
+            
+            for conn in conns:
+                if conn.enqueue(select_frame(data, regional, conn.region), keyframe):
+                    self.log.debug(f'客户端积压，丢弃旧帧: {conn.addr}, 累计 {conn.dropped_frames}')
+            
+            sent_count, pending = self._flush(conns, disconnected)
             
             # 清理断开的客户端
-            for client in disconnected:
+            for conn, reason in disconnected:
                 try:
-                    client.close()
+                    conn.sock.close()
                 except:
                     pass
-                self.clients.discard(client)
+                self.clients.pop(conn.sock, None)
+                self.admission.release(conn.addr[0], reason)
+                self.subs.change(conn.subscription, None)
         
+        if pending:
+            self.log.debug(f'{len(pending)} 个客户端未发完，数据保留在队列中')
         if disconnected:
             self.log.info(f'已移除 {len(disconnected)} 个断开客户端，剩余 {len(self.clients)} 个')
         
         return sent_count
     
+    def _flush(self, conns: List[ClientConn], disconnected: List[Tuple[ClientConn, str]]):
+        """发送各客户端待发队列（先轮询一遍，再select等待可写；断开的客户端及原因追加到disconnected）
+        
+        Returns:
+            (发完的客户端数量, 仍有待发数据的客户端列表)
+        """
+        sent_count = 0
+        pending = []
+        
+        def send(conn: ClientConn):
+            nonlocal sent_count
+            try:
+                if conn.send_pending():
+                    sent_count += 1
+                else:
+                    pending.append(conn)
+            except BrokenPipeError:
+                self.log.warning(f'客户端断开（BrokenPipe）: {conn.addr}')
+                disconnected.append((conn, 'BrokenPipe'))
+            except ConnectionResetError:
+                self.log.warning(f'客户端重置（Reset）: {conn.addr}')
+                disconnected.append((conn, '连接重置'))
+            except Exception as e:
+                self.log.error(f'发送失败: {e}')
+                disconnected.append((conn, '发送失败'))
+        
+        for conn in conns:
+            send(conn)
+        
+        deadline = time.monotonic() + self.send_timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            waiting = {c.sock: c for c in pending}
+            try:
+                _, writable, _ = select.select([], list(waiting), [], remaining)
+            except (OSError, ValueError) as e:
+                self.log.error(f'select异常: {e}')
+                break
+            pending = [c for c in pending if c.sock not in writable]
+            for sock in writable:
+                send(waiting[sock])
+        
+        return sent_count, pending
+    
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """获取每个客户端的队列与发送统计
+        
+        不获取self.lock（不与播发线程争用）：只复制客户端表后读取各连接的计数，
+        发送途中读到的是最近一次更新后的值。
+        """
+        conns = list(self.clients.values()) + list(self.incoming)
+        return [conn.get_stats() for conn in conns]
+    
+    def get_accept_stats(self) -> Dict[str, Any]:
+        """获取accept统计（接入数、按原因的拒绝/断开数、accept队列与取空耗时）"""
+        return self.admission.get_stats()
+    
     def get_client_count(self) -> int:
         """获取当前客户端数量"""
-        with self.lock:
-            return len(self.clients)
+        return self.admission.active
     
     def stop(self):
         """停止TCP服务器"""
         self.log.info('正在关闭TCP服务器...')
         
+        self.stop_event.set()
+        if self.accept_thread:
+            self.accept_thread.join(timeout=2.0)
+        
         with self.lock:
-            for client in self.clients:
+            self._merge_incoming()
+            for client, conn in self.clients.items():
                 try:
                     client.close()
                 except:
                     pass
+                self.admission.release(conn.addr[0])
             self.clients.clear()
+            self.subs.clear()
         
         if self.sock:
             try:
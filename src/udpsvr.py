@@ -0,0 +1,144 @@
+# udpsvr.py - UDP组播/广播发送（局域网一次发送到达所有接收端）
+
+import socket
+import struct
+import logging
+import ipaddress
+from typing import Dict, Any, List
+
+# 分片头: U32 帧序号 + U16 分片序号 + U16 分片总数
+FRAG_HEADER = struct.Struct('>IHH')
+# IPv4头(20) + UDP头(8)
+IP_UDP_OVERHEAD = 28
+
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+
+def fragment_payload(mtu: int) -> int:
+    """每个分片可携带的帧数据字节数"""
+    return mtu - IP_UDP_OVERHEAD - FRAG_HEADER.size
+
+
+class UdpSink:
+    """UDP组播/广播发送端
+
+    与TcpServer的broadcast接口一致，Broadcaster可同时向TCP和UDP发布。
+
+    数据报格式:
+    - 每帧分配一个U32序号（回绕），接收端据此检测丢帧、丢弃过期分片
+    - 帧长超过MTU时按分片发送，每个分片带 (帧序号, 分片序号, 分片总数) 头
+    - 分片数据为帧的连续切片，接收端按分片序号拼接后即为完整帧（含CRC）
+    """
+
+    def __init__(self, group: str, port: int, ttl: int = 1, mtu: int = 1400,
+                 interface: str = '0.0.0.0', loopback: bool = True):
+        """初始化UDP发送端
+
+        Args:
+            group: 组播地址（如239.255.50.1）或广播地址（如192.168.1.255）
+            port: 目的端口
+            ttl: 组播TTL（1表示不出本网段）
+            mtu: 链路MTU（字节），决定分片大小
+            interface: 发送组播的本地接口地址（0.0.0.0为系统默认）
+            loopback: 是否在本机回环组播（本机接收端需要）
+        """
+        self.group = group
+        self.port = port
+        self.ttl = ttl
+        self.mtu = mtu
+        self.interface = interface
+        self.loopback = loopback
+        self.sock = None
+        self.seq = 0
+        self.sent_frames = 0
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.errors = 0
+        self.log = logging.getLogger('UdpSink')
+
+    def start(self):
+        """创建UDP socket并设置组播/广播选项"""
+        if fragment_payload(self.mtu) <= 0:
+            raise ValueError(f'MTU过小: {self.mtu}')
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            if ipaddress.ip_address(self.group).is_multicast:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if self.loopback else 0)
+                if self.interface and self.interface != '0.0.0.0':
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                    socket.inet_aton(self.interface))
+                mode = 'multicast'
+            else:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                mode = 'broadcast'
+            self.sock = sock
+        except Exception as e:
+            self.log.error(f'启动失败: {e}')
+            raise
+
+        self.log.info(f'UDP发送启动({mode}): {self.group}:{self.port}, MTU={self.mtu}, TTL={self.ttl}')
+
+    def _fragments(self, data: bytes) -> List[memoryview]:
+        """按MTU切分帧（memoryview切片，不拷贝）"""
+        view = memoryview(data)
+        size = fragment_payload(self.mtu)
+        return [view[i:i + size] for i in range(0, len(view), size)] or [view]
+
+    def broadcast(self, data: bytes) -> int:
+        """发送一帧（按需分片）
+
+        Args:
+            data: 二进制帧数据
+
+        Returns:
+            发送成功返回1，否则返回0（与TcpServer.broadcast的客户端数语义对应）
+        """
+        if not data or not self.sock:
+            return 0
+
+        parts = self._fragments(data)
+        if len(parts) > 0xFFFF:
+            self.log.error(f'帧过大，无法分片: {len(data)} 字节')
+            return 0
+
+        seq = self.seq
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        addr = (self.group, self.port)
+        try:
+            for idx, part in enumerate(parts):
+                header = FRAG_HEADER.pack(seq, idx, len(parts))
+                if _HAS_SENDMSG:
+                    n = self.sock.sendmsg([header, part], [], 0, addr)
+                else:
+                    n = self.sock.sendto(header + bytes(part), addr)
+                self.sent_datagrams += 1
+                self.sent_bytes += n
+        except OSError as e:
+            self.errors += 1
+            self.log.warning(f'UDP发送失败: {e}')
+            return 0
+
+        self.sent_frames += 1
+        return 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """发送统计"""
+        return {
+            'seq': self.seq,
+            'sent_frames': self.sent_frames,
+            'sent_datagrams': self.sent_datagrams,
+            'sent_bytes': self.sent_bytes,
+            'errors': self.errors,
+        }
+
+    def stop(self):
+        """关闭UDP socket"""
+        if self.sock:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+        self.log.info('UDP发送已关闭')
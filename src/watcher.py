@@ -1,9 +1,211 @@
 # watcher.py - 文件监控（基于watchdog）
 
+import time
 import logging
 from pathlib import Path
+from threading import Thread, Condition
+from typing import Dict, Any, List, Optional, Tuple
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent
+from watchdog.events import (FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent,
+                             FileMovedEvent)
+
+
+class Coalescer:
+    """文件事件合并器（去抖 + 只处理最新文件 + 工作线程入库）
+    
+    - observer线程只登记事件时间，立即返回，不做任何I/O
+    - 每个路径在最后一次事件后静默quiet_period秒才视为写完
+    - 多个待处理文件中只入库最新的一个（按文件名排序，同初始加载），其余丢弃
+    - 入库回调在独立工作线程中执行；指定IngestPool时由多个合并器共用的工作线程执行
+    - 同一合并器同一时刻只有一个入库在执行（busy），期间到达的文件留在待处理中，
+      上一次入库完成后再取最新的一个，保证较旧的文件不会晚于较新的文件入库
+    """
+    
+    def __init__(self, callback, quiet_period: float = 1.0, pool: Optional['IngestPool'] = None):
+        """初始化合并器
+        
+        Args:
+            callback: 入库回调 callback(filepath: Path)
+            quiet_period: 静默期（秒）
+            pool: 共用的入库工作线程池（None时使用独立线程）
+        """
+        self.callback = callback
+        self.quiet_period = max(0.0, quiet_period)
+        self.pending: Dict[Path, float] = {}  # 路径 → 最后一次事件时刻
+        self.busy = False  # 是否有入库回调正在执行
+        self.pool = pool
+        self.cond = pool.cond if pool else Condition()
+        self.running = False
+        self.thread: Optional[Thread] = None
+        self.events = 0      # 收到的事件数
+        self.ingests = 0     # 实际入库次数
+        self.superseded = 0  # 被更新文件取代而丢弃的路径数
+        self.errors = 0
+        self.log = logging.getLogger('Coalescer')
+    
+    def submit(self, filepath: Path):
+        """登记文件事件（observer线程调用，不阻塞）"""
+        with self.cond:
+            self.events += 1
+            self.pending[filepath] = time.monotonic()
+            self.cond.notify()
+    
+    def start(self):
+        """启动工作线程（使用共用线程池时登记到线程池）"""
+        self.running = True
+        if self.pool:
+            self.pool.attach(self)
+            return
+        self.thread = Thread(target=self._run, name='Coalescer', daemon=True)
+        self.thread.start()
+    
+    def _take_ready(self, now: float) -> Tuple[Optional[Path], Optional[float]]:
+        """取出已静默的最新文件并丢弃较旧的路径（调用方持有锁，不等待）
+        
+        取出文件后置busy，由_ingest()在回调返回后清除。
+        
+        Returns:
+            (就绪文件, None)；没有就绪文件时为(None, 距最近一个可能就绪的秒数，无待处理或正在入库为None)
+        """
+        if not self.pending or self.busy:
+            return None, None
+        newest = max(self.pending)
+        wait = self.pending[newest] + self.quiet_period - now
+        if wait > 0:
+            return None, wait
+        self.superseded += len(self.pending) - 1
+        self.pending.clear()
+        self.busy = True
+        return newest, None
+    
+    def _next_ready(self) -> Optional[Path]:
+        """等待最新的待处理文件静默，取出它并丢弃较旧的路径（调用方持有锁）"""
+        while self.running:
+            filepath, wait = self._take_ready(time.monotonic())
+            if filepath is not None:
+                return filepath
+            self.cond.wait(wait)
+        return None
+    
+    def _ingest(self, filepath: Path):
+        """执行入库回调并计数，完成后清除busy并唤醒等待的工作线程（不持有锁）"""
+        self.log.info(f'入库文件: {filepath.name}')
+        failed = False
+        try:
+            self.callback(filepath)
+        except Exception as e:
+            failed = True
+            self.log.error(f'入库失败: {filepath}: {e}')
+        with self.cond:
+            self.ingests += 1
+            self.errors += failed
+            self.busy = False
+            self.cond.notify_all()
+    
+    def _run(self):
+        """工作线程：取出就绪文件并入库"""
+        while True:
+            with self.cond:
+                filepath = self._next_ready()
+            if filepath is None:
+                return
+            self._ingest(filepath)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """事件/入库统计"""
+        with self.cond:
+            return {
+                'events': self.events,
+                'ingests': self.ingests,
+                'superseded': self.superseded,
+                'pending': len(self.pending),
+                'errors': self.errors,
+            }
+    
+    def stop(self):
+        """停止工作线程（丢弃未处理事件）"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.pool:
+            self.pool.detach(self)
+        if self.thread:
+            self.thread.join(timeout=5.0)
+
+
+class IngestPool:
+    """多个Coalescer共用的入库工作线程（多产品播发时避免每个监控目录一个线程）
+    
+    所有成员共用一个条件变量：observer线程登记事件后唤醒工作线程，
+    工作线程轮询各成员，取出已静默的文件在锁外执行入库回调。
+    正在入库的成员被跳过（见Coalescer.busy），同一成员的入库按顺序逐个执行，
+    不同成员的入库可并行。
+    """
+    
+    def __init__(self, workers: int = 2):
+        """初始化线程池
+        
+        Args:
+            workers: 工作线程数（同时入库的文件数上限）
+        """
+        self.workers = max(1, workers)
+        self.cond = Condition()
+        self.members: List[Coalescer] = []
+        self.threads: List[Thread] = []
+        self.running = False
+        self.log = logging.getLogger('IngestPool')
+    
+    def attach(self, coalescer: Coalescer):
+        """登记合并器（首次登记时启动工作线程）"""
+        with self.cond:
+            self.members.append(coalescer)
+            if not self.running:
+                self.running = True
+                self.threads = [Thread(target=self._run, name=f'Ingest-{i}', daemon=True)
+                                for i in range(self.workers)]
+                for t in self.threads:
+                    t.start()
+            self.cond.notify_all()
+    
+    def detach(self, coalescer: Coalescer):
+        """移除合并器"""
+        with self.cond:
+            if coalescer in self.members:
+                self.members.remove(coalescer)
+    
+    def _next_ready(self) -> Optional[Tuple[Coalescer, Path]]:
+        """等待任一成员的文件就绪（调用方持有锁）"""
+        while self.running:
+            now = time.monotonic()
+            timeout = None
+            for member in self.members:
+                if not member.running:
+                    continue
+                filepath, wait = member._take_ready(now)
+                if filepath is not None:
+                    return member, filepath
+                if wait is not None:
+                    timeout = wait if timeout is None else min(timeout, wait)
+            self.cond.wait(timeout)
+        return None
+    
+    def _run(self):
+        """工作线程：取出任一成员的就绪文件并入库"""
+        while True:
+            with self.cond:
+                ready = self._next_ready()
+            if ready is None:
+                return
+            member, filepath = ready
+            member._ingest(filepath)
+    
+    def stop(self):
+        """停止工作线程"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join(timeout=5.0)
 
 
 class InxFileHandler(FileSystemEventHandler):
@@ -23,15 +225,21 @@ class InxFileHandler(FileSystemEventHandler):
     def on_created(self, event: FileCreatedEvent):
         """文件创建事件"""
         if not event.is_directory and self._match_pattern(event.src_path):
-            self.log.info(f'检测到新文件: {event.src_path}')
+            self.log.debug(f'检测到新文件: {event.src_path}')
             self.callback(Path(event.src_path))
     
     def on_modified(self, event: FileModifiedEvent):
         """文件修改事件"""
         if not event.is_directory and self._match_pattern(event.src_path):
-            self.log.info(f'检测到文件修改: {event.src_path}')
+            self.log.debug(f'检测到文件修改: {event.src_path}')
             self.callback(Path(event.src_path))
     
+    def on_moved(self, event: FileMovedEvent):
+        """文件重命名事件（临时文件写完后改名为目标文件）"""
+        if not event.is_directory and self._match_pattern(event.dest_path):
+            self.log.debug(f'检测到文件改名: {event.dest_path}')
+            self.callback(Path(event.dest_path))
+    
     def _match_pattern(self, filepath: str) -> bool:
         """检查文件是否匹配模式
         
@@ -49,22 +257,33 @@ class InxFileHandler(FileSystemEventHandler):
 
 
 class FileWatcher:
-    """文件监控器"""
+    """文件监控器（事件经Coalescer去抖合并后在工作线程中入库）
     
-    def __init__(self, watch_dir: str, callback, pattern: str = '*.inx'):
+    多产品播发时多个监控器可共用一个Observer和IngestPool（由调用方启动/停止）。
+    """
+    
+    def __init__(self, watch_dir: str, callback, pattern: str = '*.inx',
+                 quiet_period: float = 1.0, observer: Optional[Observer] = None,
+                 pool: Optional[IngestPool] = None):
         """初始化文件监控器
         
         Args:
             watch_dir: 监控目录
             callback: 文件变化回调 callback(filepath: Path)
             pattern: 文件模式
+            quiet_period: 文件最后一次事件后的静默期（秒），之后才入库
+            observer: 共用的watchdog Observer（None时独立创建并由本监控器启动/停止）
+            pool: 共用的入库线程池（None时使用独立线程）
         """
         self.watch_dir = Path(watch_dir)
         self.pattern = pattern
         self.callback = callback
         
-        self.observer = Observer()
-        self.handler = InxFileHandler(callback, pattern)
+        self.own_observer = observer is None
+        self.observer = observer if observer is not None else Observer()
+        self.watch = None
+        self.coalescer = Coalescer(callback, quiet_period, pool)
+        self.handler = InxFileHandler(self.coalescer.submit, pattern)
         self.log = logging.getLogger('FileWatcher')
     
     def start(self):
@@ -73,13 +292,27 @@ class FileWatcher:
             self.log.error(f'监控目录不存在: {self.watch_dir}')
             raise FileNotFoundError(f'目录不存在: {self.watch_dir}')
         
-        self.observer.schedule(self.handler, str(self.watch_dir), recursive=False)
-        self.observer.start()
-        self.log.info(f'文件监控启动: {self.watch_dir} (模式: {self.pattern})')
+        self.coalescer.start()
+        self.watch = self.observer.schedule(self.handler, str(self.watch_dir), recursive=False)
+        if self.own_observer:
+            self.observer.start()
+        self.log.info(f'文件监控启动: {self.watch_dir} (模式: {self.pattern}, '
+                      f'静默期: {self.coalescer.quiet_period}秒)')
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """事件/入库统计"""
+        return self.coalescer.get_stats()
     
     def stop(self):
         """停止监控"""
         self.log.info('正在停止文件监控...')
-        self.observer.stop()
-        self.observer.join()
-        self.log.info('文件监控已停止')
+        if self.own_observer:
+            self.observer.stop()
+            self.observer.join()
+        elif self.watch is not None:
+            try:
+                self.observer.unschedule(self.watch)
+            except Exception:
+                pass  # 共用Observer已停止
+        self.coalescer.stop()
+        self.log.info(f'文件监控已停止: {self.get_stats()}')
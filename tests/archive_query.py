@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""归档查询脚本
+
+用途：
+1. 按UTC时间范围（可选IOD）从归档分段索引中查找帧，不扫描数据文件
+2. 打印每帧的分段、偏移、GPS时间和IOD，可把结果帧导出为.bin
+3. --build: 为没有索引的旧.bin分段扫描生成索引
+
+示例:
+    python tests/archive_query.py output -s 2025-11-18T16:00:00 -e 2025-11-18T17:00:00
+    python tests/archive_query.py output -s 2025-11-18T16:00:00 -e 2025-11-18T16:10:00 --iod 3 -o out.bin
+    python tests/archive_query.py output --build
+"""
+
+import sys
+import time
+from pathlib import Path
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.archidx import build_index, find_segments, index_path, query
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='归档帧查询')
+    parser.add_argument('directory', help='归档目录')
+    parser.add_argument('-s', '--start', help='起始UTC时间（ISO格式）')
+    parser.add_argument('-e', '--end', help='结束UTC时间（ISO格式）')
+    parser.add_argument('--iod', type=int, default=None, help='只查询该IOD')
+    parser.add_argument('-p', '--pattern', default='*.bin', help='分段文件模式')
+    parser.add_argument('-o', '--output', help='导出查询结果帧到文件')
+    parser.add_argument('--build', action='store_true', help='为缺少索引的.bin分段生成索引')
+    args = parser.parse_args()
+
+    directory = Path(args.directory)
+    if args.build:
+        for segment in sorted(directory.glob(args.pattern)):
+            if not index_path(segment).exists():
+                print(f'生成索引: {build_index(segment)}')
+        return
+
+    if not args.start or not args.end:
+        parser.error('需要 --start 和 --end')
+
+    start = datetime.fromisoformat(args.start)
+    end = datetime.fromisoformat(args.end)
+    indexes = find_segments(directory, args.pattern)
+
+    out = open(args.output, 'wb') if args.output else None
+    t0 = time.perf_counter()
+    count = 0
+    total = 0
+    for entry, frame in query(indexes, start, end, args.iod):
+        count += 1
+        total += entry.length
+        print(f'偏移 {entry.offset:>10}, {entry.length:>6} 字节, GPS周 {entry.week} '
+              f'SOW {entry.sow_ms / 1000:.3f}, IOD {entry.iod}, 消息ID 0x{entry.msg_id:02X}')
+        if out:
+            out.write(frame)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if out:
+        out.close()
+    print(f'{len(indexes)} 个分段, 命中 {count} 帧 / {total} 字节, 耗时 {elapsed:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""帧解码器性能基准
+
+测量src/decoder.py的吞吐（MB/s）并校验结果：
+1. 批量解析：mmap的.bin归档（iter_archive，零拷贝memoryview）
+2. 流式解析：按不同块大小feed（模拟TCP recv切分）
+3. 损坏数据：插入随机垃圾和比特翻转后的重新同步
+4. 对照：tcpcmn.verify_frames批量校验
+
+示例:
+    python tests/bench_decoder.py
+    python tests/bench_decoder.py -f 20000
+"""
+
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.parser import parse_inx
+from src.encoder import encode_frame
+from src.tcpcmn import verify_frames
+from src.decoder import FrameDecoder, iter_archive
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """返回函数耗时（秒，取最小值）"""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def corrupt(frames, seed: int = 1):
+    """插入随机垃圾、翻转部分帧的字节，返回(损坏流, 应解出的帧)"""
+    rng = random.Random(seed)
+    out = bytearray()
+    good = []
+    for frame in frames:
+        r = rng.random()
+        if r < 0.1:
+            out += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 64)))
+        if r > 0.95:
+            bad = bytearray(frame)
+            bad[rng.randrange(2, len(bad))] ^= 0xFF
+            out += bad
+        else:
+            out += frame
+            good.append(frame)
+    return bytes(out), good
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='帧解码器性能基准')
+    parser.add_argument('-f', '--frames', type=int, default=8640, help='帧数（默认一天10秒间隔）')
+    args = parser.parse_args()
+
+    inx = Path(__file__).parent.parent / 'lib' / 'ATMO2025322160000_vtec_grid.inx'
+    data = parse_inx(str(inx))
+    frames = [bytes(encode_frame(data, i % 256)) for i in range(args.frames)]
+    stream = b''.join(frames)
+    mb = len(stream) / 1e6
+    print(f'{args.frames} 帧 / {mb:.1f} MB（帧长 {len(frames[0])} 字节）\n')
+
+    # 1. 批量：mmap归档
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'archive.bin'
+        path.write_bytes(stream)
+
+        def bulk():
+            n = 0
+            for _ in iter_archive(path):
+                n += 1
+            assert n == args.frames
+        t = best_of(bulk)
+        print(f"{'批量 iter_archive (mmap)':<28} {t * 1000:>9.1f} ms {mb / t:>9.0f} MB/s")
+
+    t = best_of(lambda: verify_frames(stream))
+    print(f"{'对照 verify_frames':<28} {t * 1000:>9.1f} ms {mb / t:>9.0f} MB/s")
+
+    # 2. 流式：不同recv块大小
+    for chunk in (64, 1460, 16384, 65536):
+        chunks = [stream[i:i + chunk] for i in range(0, len(stream), chunk)]
+
+        def streaming():
+            dec = FrameDecoder()
+            n = 0
+            for c in chunks:
+                n += len(dec.feed(c))
+            assert n == args.frames and dec.buffered == 0
+
+        t = best_of(streaming)
+        label = f'流式 feed({chunk})'
+        print(f'{label:<28} {t * 1000:>9.1f} ms {mb / t:>9.0f} MB/s')
+
+    # 3. 损坏数据：重新同步
+    bad, good = corrupt(frames)
+    chunks = [bad[i:i + 1460] for i in range(0, len(bad), 1460)]
+    dec = FrameDecoder()
+    t0 = time.perf_counter()
+    out = []
+    for c in chunks:
+        out.extend(bytes(f) for f in dec.feed(c))
+    t = time.perf_counter() - t0
+    assert out == good, '重新同步结果与预期不一致'
+    s = dec.get_stats()
+    print(f"{'损坏流 feed(1460)':<28} {t * 1000:>9.1f} ms {len(bad) / 1e6 / t:>9.0f} MB/s   "
+          f"解出 {s['frames']} 帧, 丢弃候选 {s['bad_frames']}, 跳过 {s['skipped_bytes']} 字节")
+
+
+if __name__ == '__main__':
+    main()
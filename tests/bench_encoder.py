@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""帧编码性能基准（纯Python vs NumPy）
+
+用途：
+1. 验证NumPy编码路径与纯Python路径输出逐字节一致
+2. 对比示例文件、区域网格、全球2.5°x5°、全球1°x1°网格的编码耗时
+
+示例:
+    python tests/bench_encoder.py
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import src.encoder as encoder
+from src.parser import parse_inx
+from synth_inx import make_inx
+
+CASES = [
+    # (名称, nlat, nlon, 阶数)
+    ('区域 31x41', 31, 41, 2),
+    ('全球2.5x5 71x73', 71, 73, 8),
+    ('全球1x1 181x361', 181, 361, 15),
+]
+
+
+def timeit(func, number: int = 20) -> float:
+    """返回单次调用耗时（毫秒，取3轮最小值）"""
+    best = float('inf')
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best * 1000
+
+
+def encode_with(data, use_numpy: bool) -> bytes:
+    saved = encoder.USE_NUMPY
+    encoder.USE_NUMPY = use_numpy
+    try:
+        return encoder.encode_frame(data, 1)
+    finally:
+        encoder.USE_NUMPY = saved
+
+
+def load_cases():
+    lib = Path(__file__).parent.parent / 'lib' / 'ATMO2025322160000_vtec_grid.inx'
+    yield '示例文件', parse_inx(str(lib))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, nlat, nlon, order in CASES:
+            path = Path(tmp) / 'case.inx'
+            path.write_text(make_inx(nlat=nlat, nlon=nlon, order=order), encoding='utf-8')
+            yield name, parse_inx(str(path))
+
+
+def main():
+    if encoder.np is None:
+        print('未安装NumPy，仅测量纯Python路径')
+
+    print(f"{'网格':<18} {'点数':>7} {'帧长':>7} {'Python(ms)':>11} {'NumPy(ms)':>10} {'加速比':>7}")
+    for name, data in load_cases():
+        points = sum(len(row) for row in data['rms'])
+        frame_py = encode_with(data, False)
+        t_py = timeit(lambda: encode_with(data, False))
+        if encoder.np is None:
+            print(f'{name:<18} {points:>7} {len(frame_py):>7} {t_py:>11.2f} {"-":>10} {"-":>7}')
+            continue
+
+        frame_np = encode_with(data, True)
+        assert frame_np == frame_py, f'{name}: NumPy编码结果与纯Python不一致'
+        t_np = timeit(lambda: encode_with(data, True))
+        print(f'{name:<18} {points:>7} {len(frame_py):>7} {t_py:>11.2f} {t_np:>10.2f} {t_py / t_np:>6.1f}x')
+
+    if encoder.np is not None:
+        print('✓ NumPy与纯Python编码逐字节一致')
+
+
+if __name__ == '__main__':
+    main()
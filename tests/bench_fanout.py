@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""广播扇出性能基准（本机回环）
+
+用途：
+1. 在回环地址启动selectors服务器，建立N个客户端连接
+2. 发布一帧，测量从broadcast()到所有客户端收齐该帧的耗时
+3. 对比10 / 100 / 1000 / 5000个客户端的扇出完成时间
+
+示例:
+    python tests/bench_fanout.py
+    python tests/bench_fanout.py -c 10 100 1000 -s 33730 -r 10
+    python tests/bench_fanout.py --mode thread -c 10 100 500
+"""
+
+import sys
+import time
+import socket
+import logging
+import selectors
+import statistics
+from pathlib import Path
+from threading import Thread, Event
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tcpsvr import TcpServer
+from src.stcpsvr import SelectorTcpServer
+
+
+class Receivers:
+    """N个接收端（单线程selectors读取），统计每帧所有客户端收齐的时刻"""
+
+    def __init__(self, port: int, count: int, frame_len: int):
+        self.frame_len = frame_len
+        self.selector = selectors.DefaultSelector()
+        self.socks = []
+        for _ in range(count):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.setblocking(False)
+            self.socks.append(sock)
+            self.selector.register(sock, selectors.EVENT_READ, [0])
+        self.done = Event()
+        self.remaining = 0
+        self.stop = False
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def expect(self):
+        """准备接收下一帧"""
+        self.done.clear()
+        self.remaining = len(self.socks)
+
+    def _run(self):
+        while not self.stop:
+            for key, _ in self.selector.select(timeout=0.2):
+                try:
+                    n = len(key.fileobj.recv(1 << 20))
+                except BlockingIOError:
+                    continue
+                got = key.data
+                before = got[0] // self.frame_len
+                got[0] += n
+                if got[0] // self.frame_len > before:
+                    self.remaining -= 1
+                    if self.remaining == 0:
+                        self.done.set()
+
+    def close(self):
+        self.stop = True
+        self.thread.join()
+        for sock in self.socks:
+            sock.close()
+        self.selector.close()
+
+
+def bench(mode: str, clients: int, frame_len: int, repeat: int) -> dict:
+    """测量一个客户端规模的扇出耗时"""
+    if mode == 'thread':
+        svr = TcpServer('127.0.0.1', 0, max_clients=clients, backlog=clients)
+        svr.start()
+        svr.port = svr.sock.getsockname()[1]
+    else:
+        svr = SelectorTcpServer('127.0.0.1', 0, max_clients=clients, backlog=clients)
+        svr.start()
+
+    rx = Receivers(svr.port, clients, frame_len)
+    deadline = time.monotonic() + 30
+    while svr.get_client_count() < clients and time.monotonic() < deadline:
+        svr.accept_clients()
+        time.sleep(0.01)
+
+    frame = bytes([0x01, 0xAA, 0x02]) + bytes(frame_len - 3)
+    times = []
+    for _ in range(repeat):
+        rx.expect()
+        t0 = time.perf_counter()
+        svr.broadcast(frame)
+        if not rx.done.wait(30):
+            raise RuntimeError(f'{clients}客户端: 30秒内未收齐')
+        times.append(time.perf_counter() - t0)
+
+    rx.close()
+    svr.stop()
+    return {
+        'clients': clients,
+        'median_ms': statistics.median(times) * 1000,
+        'max_ms': max(times) * 1000,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='广播扇出性能基准')
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                        help='客户端数量')
+    parser.add_argument('-s', '--size', type=int, default=707, help='帧长度（字节）')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每个规模的发布次数')
+    parser.add_argument('--mode', choices=['selectors', 'thread'], default='selectors',
+                        help='服务器模式（thread模式基于select.select，受1024描述符限制）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f'模式: {args.mode}, 帧长: {args.size} 字节')
+    print(f"{'客户端':>8} {'中位(ms)':>10} {'最大(ms)':>10}")
+    for n in args.clients:
+        r = bench(args.mode, n, args.size, args.repeat)
+        print(f"{r['clients']:>8} {r['median_ms']:>10.2f} {r['max_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
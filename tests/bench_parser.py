@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""INX解析性能基准
+
+用途：
+1. 生成1k ~ 1M行的合成INX文件
+2. 测量parse_inx耗时与每行平均耗时
+3. 验证解析耗时随文件行数线性增长
+
+示例:
+    python tests/bench_parser.py
+    python tests/bench_parser.py -s 1000 10000 100000 -r 5
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.parser import parse_inx
+from synth_inx import make_inx, lines_per_row
+
+# 全球1°经度网格（每个纬度行24行文本，TEC + RMS两个地图）
+NLON = 361
+
+
+def bench_size(target_lines: int, repeat: int) -> dict:
+    """生成约target_lines行的文件并测量解析耗时（取最小值）"""
+    nlat = max(1, target_lines // (2 * lines_per_row(NLON)))
+    text = make_inx(nlat=nlat, nlon=NLON)
+    nlines = text.count('\n')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'bench.inx'
+        path.write_text(text, encoding='utf-8')
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            data = parse_inx(str(path))
+            best = min(best, time.perf_counter() - t0)
+
+    assert len(data['rms']) == nlat, '解析结果行数错误'
+    return {'lines': nlines, 'seconds': best, 'ns_per_line': best / nlines * 1e9}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='INX解析性能基准')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[1_000, 10_000, 100_000, 1_000_000], help='目标行数')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='每个规模重复次数')
+    parser.add_argument('--max-ratio', type=float, default=3.0,
+                        help='最大/最小每行耗时之比的上限（超过视为非线性）')
+    args = parser.parse_args()
+
+    print(f"{'行数':>10} {'耗时(ms)':>12} {'ns/行':>10}")
+    results = []
+    for size in args.sizes:
+        r = bench_size(size, args.repeat)
+        results.append(r)
+        print(f"{r['lines']:>10} {r['seconds'] * 1000:>12.2f} {r['ns_per_line']:>10.1f}")
+
+    per_line = [r['ns_per_line'] for r in results]
+    ratio = max(per_line) / min(per_line)
+    if ratio <= args.max_ratio:
+        print(f'✓ 线性扩展（每行耗时比 {ratio:.2f}）')
+        return 0
+    print(f'✗ 非线性扩展（每行耗时比 {ratio:.2f} > {args.max_ratio}）')
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
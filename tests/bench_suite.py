@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""CPU热点函数微基准套件（含基线回归检查）
+
+覆盖: parse_inx, encode_frame, _encode_body, _compress_rms, crc16, utc2gps, rms2idx
+数据: 示例文件 lib/ATMO2025322160000_vtec_grid.inx + 更大网格/更高阶数的合成文件（固定随机种子）
+
+计时方法:
+1. 预热：正式计时前先运行至少--warmup秒（填充缓存、触发惰性初始化）
+2. 自动标定内循环次数，使每轮耗时不少于--min-time秒
+3. 重复--repeat轮，报告单次调用的最小值和中位数（微秒）
+
+基线:
+- --save 保存本次结果为JSON基线
+- --baseline 与基线比较，任一函数的耗时/基线超过--threshold时以退出码1结束
+  （默认比较最小值，受系统噪声影响最小；可用--metric median）
+
+示例:
+    python tests/bench_suite.py
+    python tests/bench_suite.py --save bench_baseline.json
+    python tests/bench_suite.py --baseline bench_baseline.json --threshold 1.2
+    python tests/bench_suite.py -k encode --case 示例文件
+"""
+
+import sys
+import json
+import time
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+import src.encoder as encoder
+from src.parser import parse_inx
+from src.encoder import encode_frame, _encode_body, _compress_rms
+from src.tcpcmn import crc16, utc2gps, rms2idx
+from synth_inx import make_inx
+
+LIB_INX = Path(__file__).parent.parent / 'lib' / 'ATMO2025322160000_vtec_grid.inx'
+
+SYNTH_CASES = [
+    # (名称, nlat, nlon, 阶数)
+    ('全球2.5x5 71x73 N8', 71, 73, 8),
+    ('全球1x1 181x361 N15', 181, 361, 15),
+]
+
+
+def measure(func, repeat: int = 7, min_time: float = 0.05, warmup: float = 0.1) -> dict:
+    """测量func单次调用耗时
+
+    Args:
+        func: 无参函数
+        repeat: 计时轮数
+        min_time: 每轮最短耗时（秒），据此标定内循环次数
+        warmup: 预热时长（秒）
+
+    Returns:
+        {'number': 每轮调用次数, 'min_us', 'median_us', 'max_us'}
+    """
+    # 预热，同时粗略估计单次耗时
+    calls = 0
+    t0 = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= warmup:
+            break
+    per_call = elapsed / calls
+    number = max(1, int(min_time / per_call) + 1)
+
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - t0) / number * 1e6)
+    return {
+        'number': number,
+        'min_us': min(samples),
+        'median_us': statistics.median(samples),
+        'max_us': max(samples),
+    }
+
+
+def load_cases(tmp: Path):
+    """产生(名称, INX路径, 解析结果)"""
+    yield '示例文件', LIB_INX, parse_inx(str(LIB_INX))
+    for name, nlat, nlon, order in SYNTH_CASES:
+        path = tmp / f'synth_{nlat}x{nlon}_n{order}.inx'
+        path.write_text(make_inx(nlat=nlat, nlon=nlon, order=order), encoding='utf-8')
+        yield name, path, parse_inx(str(path))
+
+
+def case_benchmarks(path: Path, data: dict):
+    """一个数据集上的被测函数: (函数名, 无参调用, 说明)"""
+    frame = bytes(encode_frame(data, 1))
+    payload = frame[2:-4]  # CRC覆盖范围
+    rms = data['rms']
+    values = [v / 10.0 for row in rms for v in row]  # 0.1TECU → TECU
+    epoch = data['time']
+
+    def rms2idx_all():
+        for v in values:
+            rms2idx(v)
+
+    return [
+        ('parse_inx', lambda: parse_inx(str(path)), f'{path.stat().st_size} 字节'),
+        ('encode_frame', lambda: encode_frame(data, 1), f'帧长 {len(frame)}'),
+        ('_encode_body', lambda: _encode_body(data), f"{data['coef_cnt']} 系数"),
+        ('_compress_rms', lambda: _compress_rms(rms), f'{len(values)} 点'),
+        ('crc16', lambda: crc16(payload), f'{len(payload)} 字节'),
+        ('utc2gps', lambda: utc2gps(epoch), '单次'),
+        ('rms2idx', rms2idx_all, f'{len(values)} 次/调用'),
+    ]
+
+
+def run_suite(args) -> dict:
+    """运行全部（或筛选后的）基准，返回 {'case/函数': 结果}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for case, path, data in load_cases(Path(tmp)):
+            if args.case and not any(c in case for c in args.case):
+                continue
+            for name, func, note in case_benchmarks(path, data):
+                if args.keyword and not any(k in name for k in args.keyword):
+                    continue
+                r = measure(func, args.repeat, args.min_time, args.warmup)
+                r['note'] = note
+                key = f'{case}/{name}'
+                results[key] = r
+                print(f"{key:<36} {r['min_us']:>12.2f} {r['median_us']:>12.2f} "
+                      f"{r['number']:>8}   {note}", flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, metric: str, threshold: float) -> list:
+    """与基线比较，返回超过阈值的(键, 比值)列表"""
+    base = baseline.get('results', {})
+    field = f'{metric}_us'
+    meta = baseline.get('meta', {})
+    if meta.get('numpy') != encoder.USE_NUMPY:
+        print(f"警告: 基线NumPy状态({meta.get('numpy')})与当前({encoder.USE_NUMPY})不同，编码耗时不可比")
+    if meta.get('python') != platform.python_version():
+        print(f"警告: 基线Python版本({meta.get('python')})与当前({platform.python_version()})不同")
+
+    print(f"\n{'基准':<36} {'基线(us)':>12} {'当前(us)':>12} {'比值':>7}")
+    regressions = []
+    for key, r in results.items():
+        if key not in base:
+            print(f"{key:<36} {'-':>12} {r[field]:>12.2f} {'新增':>7}")
+            continue
+        ratio = r[field] / base[key][field]
+        flag = ''
+        if ratio > threshold:
+            flag = '  ✗ 变慢'
+            regressions.append((key, ratio))
+        elif ratio < 1 / threshold:
+            flag = '  ↑ 变快'
+        print(f"{key:<36} {base[key][field]:>12.2f} {r[field]:>12.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CPU热点函数微基准套件')
+    parser.add_argument('-r', '--repeat', type=int, default=7, help='计时轮数')
+    parser.add_argument('--min-time', type=float, default=0.05, help='每轮最短耗时（秒）')
+    parser.add_argument('--warmup', type=float, default=0.1, help='每个基准的预热时长（秒）')
+    parser.add_argument('-k', '--keyword', nargs='+', help='只运行函数名包含这些关键字的基准')
+    parser.add_argument('--case', nargs='+', help='只运行名称包含这些关键字的数据集')
+    parser.add_argument('--save', help='保存结果为基线JSON')
+    parser.add_argument('--baseline', help='与基线JSON比较')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='耗时/基线超过该比值视为回归（默认1.25）')
+    parser.add_argument('--metric', choices=['min', 'median'], default='min', help='比较的统计量')
+    args = parser.parse_args()
+
+    if encoder.np is None:
+        print('未安装NumPy，编码走纯Python路径')
+    print(f"{'基准':<36} {'最小(us)':>12} {'中位(us)':>12} {'次/轮':>8}   说明")
+    results = run_suite(args)
+
+    if args.save:
+        doc = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': encoder.USE_NUMPY,
+                'repeat': args.repeat,
+                'min_time': args.min_time,
+            },
+            'results': results,
+        }
+        Path(args.save).write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f'\n基线已保存: {args.save}')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline, args.metric, args.threshold)
+        if regressions:
+            print(f'\n✗ {len(regressions)} 项超过阈值 {args.threshold}x:')
+            for key, ratio in regressions:
+                print(f'  {key}: {ratio:.2f}x')
+            sys.exit(1)
+        print(f'\n✓ 全部在阈值 {args.threshold}x 以内')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@
 import sys
 import socket
 import struct
+from collections import deque
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Any
 from datetime import datetime, timedelta
@@ -18,8 +19,72 @@ from datetime import datetime, timedelta
 # 添加src到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.tcpcmn import crc16, LEAP_SECOND_TABLE
+from src.tcpcmn import crc16, LEAP_SECOND_TABLE, MSG_VTEC, MSG_VTEC_DELTA
 from src.parser import parse_inx
+from src.encoder import encode_frame, region_window, subset_region
+from src.decoder import FrameDecoder
+
+
+def apply_delta(ref: bytes, delta: bytes) -> Optional[bytes]:
+    """用差分帧（0x03）和参考关键帧（0x02）重建完整帧
+    
+    Args:
+        ref: 接收端持有的参考关键帧
+        delta: 差分帧
+        
+    Returns:
+        重建后的完整帧；CRC或参考帧校验失败返回None
+    """
+    try:
+        delta_len = struct.unpack('>H', delta[3:5])[0]
+        crc_offset = delta_len - 4
+        received_crc = struct.unpack('>H', delta[crc_offset:crc_offset+2])[0]
+        if delta_len != len(delta) or received_crc != crc16(memoryview(delta)[2:crc_offset]):
+            print(f"  ✗ 差分帧CRC或长度错误")
+            return None
+        
+        offset = 13
+        ref_iod, ref_crc, full_crc, n_coefs = struct.unpack('>BHHH', delta[offset:offset+7])
+        offset += 7
+        if ref[12] != ref_iod or struct.unpack('>H', ref[-4:-2])[0] != ref_crc:
+            print(f"  ✗ 参考关键帧不匹配: 需要IOD={ref_iod} CRC=0x{ref_crc:04X}")
+            return None
+        
+        frame = bytearray(ref)
+        frame[5:13] = delta[5:13]  # GPS周、GPS秒、建模间隔、IOD
+        
+        # 系数从Body第6字节开始（I32，按序号覆盖）
+        coef_start = 13 + 6
+        for _ in range(n_coefs):
+            idx = struct.unpack('>H', delta[offset:offset+2])[0]
+            pos = coef_start + 4 * idx
+            frame[pos:pos+4] = delta[offset+2:offset+6]
+            offset += 6
+        
+        # RMS紧跟网格定义（12字节）之后
+        order_byte = frame[13 + 5]
+        coef_cnt = ((order_byte >> 4) + 1) * ((order_byte & 0x0F) + 1)
+        rms_start = coef_start + 4 * coef_cnt + 12
+        n_cells = struct.unpack('>H', delta[offset:offset+2])[0]
+        offset += 2
+        for _ in range(n_cells):
+            idx, val = struct.unpack('>HB', delta[offset:offset+3])
+            frame[rms_start + idx] = val
+            offset += 3
+        
+        crc_pos = len(frame) - 4
+        frame[crc_pos:crc_pos+2] = struct.pack('>H', crc16(memoryview(frame)[2:crc_pos]))
+        if struct.unpack('>H', frame[crc_pos:crc_pos+2])[0] != full_crc:
+            print(f"  ✗ 重建帧CRC不一致: 期望0x{full_crc:04X}")
+            return None
+        
+        print(f"  ✓ 差分帧重建: 参考IOD={ref_iod}, 系数变化 {n_coefs} 个, RMS字节变化 {n_cells} 个, "
+              f"{len(delta)} → {len(frame)} 字节")
+        return bytes(frame)
+    
+    except (struct.error, IndexError) as e:
+        print(f"  ✗ 差分帧解码错误: {e}")
+        return None
 
 
 def decode_frame(data: bytes) -> Optional[Dict[str, Any]]:
@@ -49,7 +114,7 @@ def decode_frame(data: bytes) -> Optional[Dict[str, Any]]:
         
         msg_id = data[offset]
         offset += 1
-        if msg_id != 0x02:
+        if msg_id != MSG_VTEC:
             print(f"  ✗ 消息ID错误: 0x{msg_id:02X}")
             return None
         result['msg_id'] = msg_id
@@ -180,7 +245,7 @@ def decode_frame(data: bytes) -> Optional[Dict[str, Any]]:
         # === Tail (4字节) ===
         received_crc = struct.unpack('>H', data[offset:offset+2])[0]
         offset += 2
-        calculated_crc = crc16(data[2:crc_offset])
+        calculated_crc = crc16(memoryview(data)[2:crc_offset])
         if received_crc != calculated_crc:
             print(f"  ✗ CRC错误: 接收=0x{received_crc:04X}, 计算=0x{calculated_crc:04X}")
             return None
@@ -192,6 +257,7 @@ def decode_frame(data: bytes) -> Optional[Dict[str, Any]]:
             print(f"  ✗ 尾部标记错误: 0x{tail_marker:04X}")
             return None
         result['tail_marker'] = tail_marker
+        result['raw'] = bytes(data)
         
         return result
     
@@ -261,6 +327,15 @@ def print_decoded(decoded: Dict[str, Any], compare_file: Optional[str] = None):
         try:
             parsed = parse_inx(compare_file)
             
+            # 区域订阅帧：按帧中的网格定义裁剪原始文件后再对比
+            if (abs(parsed['lat'][0] - decoded['lat1']) >= 0.01 or abs(parsed['lat'][1] - decoded['lat2']) >= 0.01 or
+                abs(parsed['lon'][0] - decoded['lon1']) >= 0.01 or abs(parsed['lon'][1] - decoded['lon2']) >= 0.01):
+                window = region_window(parsed, (min(decoded['lat1'], decoded['lat2']), max(decoded['lat1'], decoded['lat2']),
+                                                min(decoded['lon1'], decoded['lon2']), max(decoded['lon1'], decoded['lon2'])))
+                if window:
+                    parsed = subset_region(parsed, window)
+                    print(f"  区域帧: 原始文件裁剪到窗口 {window}")
+            
             # 对比时间
             parsed_time = parsed['time']
             if parsed_time == decoded['utc_time']:
@@ -280,8 +355,8 @@ def print_decoded(decoded: Dict[str, Any], compare_file: Optional[str] = None):
                 print(f"  ✗ 系数个数不匹配: 文件={len(parsed['coefs'])}, 解码={decoded['coef_cnt']}")
             
             # 对比网格
-            if (abs(parsed['lat1'] - decoded['lat1']) < 0.01 and
-                abs(parsed['lon1'] - decoded['lon1']) < 0.01):
+            if (abs(parsed['lat'][0] - decoded['lat1']) < 0.01 and
+                abs(parsed['lon'][0] - decoded['lon1']) < 0.01):
                 print(f"  ✓ 网格定义匹配")
             else:
                 print(f"  ✗ 网格定义不匹配")
@@ -292,6 +367,13 @@ def print_decoded(decoded: Dict[str, Any], compare_file: Optional[str] = None):
                 print(f"  ✓ RMS矩阵尺寸匹配: {decoded['nlat']}×{decoded['nlon']}")
             else:
                 print(f"  ✗ RMS矩阵尺寸不匹配")
+            
+            # 按相同IOD重新编码，逐字节对比（差分帧重建结果同样适用）
+            if decoded.get('raw') is not None:
+                if bytes(encode_frame(parsed, decoded['iod'])) == decoded['raw']:
+                    print(f"  ✓ 与原始文件编码结果逐字节一致")
+                else:
+                    print(f"  ✗ 与原始文件编码结果不一致")
                 
         except Exception as e:
             print(f"  ✗ 对比文件解析失败: {e}")
@@ -302,7 +384,8 @@ def print_decoded(decoded: Dict[str, Any], compare_file: Optional[str] = None):
 def receive_and_decode(host: str, port: int, count: int = 1, 
                        compare_file: Optional[str] = None,
                        duration: Optional[int] = None,
-                       output_file: Optional[str] = None):
+                       output_file: Optional[str] = None,
+                       region: Optional[str] = None):
     """接收并解码TCP帧
     
     Args:
@@ -312,6 +395,7 @@ def receive_and_decode(host: str, port: int, count: int = 1,
         compare_file: 可选的INX文件路径，用于对比验证
         duration: 可选的运行时长（秒），如果指定则在时长到达后停止
         output_file: 可选的输出文件路径，如果指定则将结果写入文件
+        region: 可选的订阅区域 "lat1,lat2,lon1,lon2"（度），连接后发送REGION请求
     """
     import time
     
@@ -342,7 +426,15 @@ def receive_and_decode(host: str, port: int, count: int = 1,
         if output_fp:
             output_fp.write(f"✓ 已连接\n\n")
         
+        if region:
+            request = 'REGION ' + ' '.join(region.split(',')) + '\r\n'
+            sock.sendall(request.encode('ascii'))
+            print(f"已发送区域订阅: {request.strip()}")
+        
         received = 0
+        keyframes: Dict[int, bytes] = {}  # IOD → 最近的关键帧（差分帧重建用）
+        decoder = FrameDecoder()          # 流式解析：搜索魔数、校验CRC、损坏后重新同步
+        ready = deque()
         while count == -1 or received < count:
             # 检查是否超时
             if duration and (time.time() - start_time) >= duration:
@@ -352,29 +444,16 @@ def receive_and_decode(host: str, port: int, count: int = 1,
                     output_fp.write(msg)
                 break
             
-            # 接收Header确定帧长度
-            header = b''
-            while len(header) < 15:
-                chunk = sock.recv(15 - len(header))
+            # 接收数据直到解析出完整帧
+            if not ready:
+                chunk = sock.recv(65536)
                 if not chunk:
                     print("连接关闭")
                     return
-                header += chunk
-            
-            # 解析长度
-            frame_len = struct.unpack('>H', header[3:5])[0]
+                ready.extend(decoder.feed(chunk))
+                continue
             
-            # 接收剩余数据
-            remaining = frame_len - 15
-            body_tail = b''
-            while len(body_tail) < remaining:
-                chunk = sock.recv(remaining - len(body_tail))
-                if not chunk:
-                    print("连接关闭")
-                    return
-                body_tail += chunk
-            
-            frame_data = header + body_tail
+            frame_data = bytes(ready.popleft())
             received += 1
             elapsed = time.time() - start_time if start_time else 0
             
@@ -408,6 +487,25 @@ def receive_and_decode(host: str, port: int, count: int = 1,
             if output_fp:
                 output_fp.write(hex_info)
             
+            # 差分帧：用参考关键帧重建为完整帧
+            if frame_data[2] == MSG_VTEC_DELTA:
+                ref_iod = frame_data[13] if len(frame_data) > 13 else -1
+                if ref_iod not in keyframes:
+                    msg = f"尚未收到参考关键帧 IOD={ref_iod}，跳过差分帧\n"
+                    print(msg.strip())
+                    if output_fp:
+                        output_fp.write(msg)
+                    continue
+                frame_data = apply_delta(keyframes[ref_iod], frame_data)
+                if frame_data is None:
+                    msg = "✗ 差分帧重建失败\n"
+                    print(msg.strip())
+                    if output_fp:
+                        output_fp.write(msg)
+                    continue
+            elif frame_data[2] == MSG_VTEC:
+                keyframes[frame_data[12]] = frame_data
+            
             # 解码
             decoded = decode_frame(frame_data)
             if decoded:
@@ -489,10 +587,11 @@ def main():
     parser.add_argument('-c', '--compare', help='对比的INX文件路径')
     parser.add_argument('-t', '--time', type=int, help='运行时长（秒）')
     parser.add_argument('-o', '--output', help='输出文件路径', default='output/decode_results.txt')
+    parser.add_argument('-r', '--region', help='订阅区域 lat1,lat2,lon1,lon2（度），例如 35,30,110,120')
     
     args = parser.parse_args()
     
-    receive_and_decode(args.host, args.port, args.count, args.compare, args.time, args.output)
+    receive_and_decode(args.host, args.port, args.count, args.compare, args.time, args.output, args.region)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""端到端扇出压力测试（本机回环）
+
+用途：
+1. 子进程中启动TcpServer（thread / selectors / asyncio）+ Broadcaster，播发示例文件
+2. 主进程建立N个模拟RTKLIB客户端（流式读取并按帧解析），其中包括：
+   - 慢速客户端：小接收缓冲区，限速读取
+   - 异常断开客户端：随机时刻RST断开后重连
+   - 超出max_clients的连接：统计被拒绝的连接
+3. 统计帧发布（broadcast调用）到客户端收齐该帧的延迟p50/p99/最大值、总字节/秒、
+   接入/拒绝数，以及服务器进程的CPU和RSS
+4. 结果写为JSON，便于不同版本之间对比
+
+延迟测量：服务器对每次发布的帧把GPS SOW字段改写为发布序号并重算CRC，记录发布时刻；
+客户端按序号查找发布时刻（服务器与客户端使用同一单调时钟perf_counter）。
+
+示例:
+    python tests/load_test.py -n 100 -d 30 -i 0.5 -o load.json
+    python tests/load_test.py -n 500 --slow 50 --abrupt 50 --extra 20 --mode selectors
+"""
+
+import sys
+import json
+import time
+import random
+import socket
+import struct
+import logging
+import platform
+import selectors
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from threading import Thread, Event
+from typing import Dict, Any, List, Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tcpcmn import crc16
+from src.decoder import FrameDecoder
+from src.sched import percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LIB_INX = Path(__file__).parent.parent / 'lib' / 'ATMO2025322160000_vtec_grid.inx'
+
+
+def stamp(frame, seq: int) -> bytes:
+    """把发布序号写入SOW字段并重算CRC"""
+    buf = bytearray(frame)
+    struct.pack_into('>I', buf, 7, seq)
+    end = len(buf) - 4
+    struct.pack_into('>H', buf, end, crc16(memoryview(buf)[2:end]))
+    return bytes(buf)
+
+
+def free_port() -> int:
+    """取一个空闲的回环端口"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb() -> Optional[float]:
+    """当前RSS（MB），Linux读/proc，其他平台用峰值RSS近似"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1e6
+    except (OSError, AttributeError):
+        pass
+    if resource:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+    return None
+
+
+def server_main(conn, mode: str, port: int, max_clients: int, interval: float, queue_size: int):
+    """服务器子进程：TcpServer + Broadcaster，发布时刻和资源占用经conn返回"""
+    logging.basicConfig(level=logging.ERROR)  # 拒绝/断开是预期行为，不逐条输出
+    from src.tcpsvr import TcpServer
+    from src.stcpsvr import SelectorTcpServer
+    from src.atcpsvr import AsyncTcpServer
+    from src.bcast import Broadcaster
+
+    cls = {'thread': TcpServer, 'selectors': SelectorTcpServer, 'asyncio': AsyncTcpServer}[mode]
+    svr = cls('127.0.0.1', port, max_clients=max_clients, queue_size=queue_size,
+              backlog=max_clients * 2)
+    svr.start()
+
+    publish: List[float] = []
+    send = svr.broadcast
+
+    def stamped(data, regional=None, mount=None):
+        frame = stamp(data, len(publish))
+        publish.append(time.perf_counter())
+        return send(frame, regional, mount)
+
+    svr.broadcast = stamped
+    bc = Broadcaster(svr, interval=interval)
+    bc.set_file(LIB_INX)
+    bc.start()
+    conn.send('ready')
+
+    cpu = []
+    rss = []
+    last_wall, last_cpu = time.perf_counter(), time.process_time()
+    while not conn.poll(0.5):
+        wall, used = time.perf_counter(), time.process_time()
+        cpu.append((used - last_cpu) / (wall - last_wall) * 100)
+        last_wall, last_cpu = wall, used
+        mem = rss_mb()
+        if mem is not None:
+            rss.append(mem)
+    conn.recv()
+
+    bc.stop()
+    result = {
+        'publish': publish,
+        'cpu_percent': cpu,
+        'cpu_seconds': time.process_time(),
+        'rss_mb': rss,
+        'accept': svr.get_accept_stats(),
+        'client_count': svr.get_client_count(),
+        'broadcaster': bc.get_stats(),
+    }
+    svr.stop()
+    conn.send(result)
+
+
+class Client:
+    """一个模拟客户端的状态"""
+
+    def __init__(self, kind: str):
+        self.kind = kind  # normal / slow / abrupt / extra
+        self.sock: Optional[socket.socket] = None
+        self.decoder = FrameDecoder()
+        self.received = 0
+        self.bytes = 0
+        self.got_data = False
+        self.close_at = 0.0
+        self.connects = 0
+        self.rejected = 0  # 未收到任何数据即被服务器关闭
+
+
+class LoadClients:
+    """客户端群（单线程selectors读取；慢速客户端在独立线程限速读取）"""
+
+    def __init__(self, port: int, duration: float, slow_rate: int, seed: int = 1):
+        self.port = port
+        self.duration = duration
+        self.slow_rate = slow_rate  # 慢速客户端读取速率（字节/秒）
+        self.rng = random.Random(seed)
+        self.clients: List[Client] = []
+        self.samples: List[tuple] = []  # (序号, 接收时刻, 类型)
+        self.selector = selectors.DefaultSelector()
+        self.stop_event = Event()
+        self.abrupt_closes = 0
+        self.connect_errors = 0
+
+    def _connect(self, client: Client):
+        """建立连接（慢速客户端使用小接收缓冲区）"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if client.kind == 'slow':
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        try:
+            sock.connect(('127.0.0.1', self.port))
+        except OSError:
+            self.connect_errors += 1
+            sock.close()
+            return
+        sock.setblocking(False)
+        client.sock = sock
+        client.connects += 1
+        client.decoder.reset()
+        client.got_data = False
+        if client.kind == 'abrupt':
+            client.close_at = time.perf_counter() + self.rng.uniform(0.5, max(1.0, self.duration / 3))
+        if client.kind != 'slow':
+            self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def add(self, kind: str, count: int):
+        for _ in range(count):
+            client = Client(kind)
+            self.clients.append(client)
+            self._connect(client)
+
+    def _close(self, client: Client, abrupt: bool = False):
+        if client.sock is None:
+            return
+        if client.kind != 'slow':
+            self.selector.unregister(client.sock)
+        if abrupt:
+            # SO_LINGER=0：close时发送RST
+            client.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        client.sock.close()
+        client.sock = None
+
+    def _on_data(self, client: Client, data: bytes, now: float):
+        client.bytes += len(data)
+        client.got_data = True
+        for frame in client.decoder.feed(data):
+            client.received += 1
+            seq = int.from_bytes(frame[7:11], 'big')
+            self.samples.append((seq, now, client.kind))
+
+    def _read(self, client: Client, size: int):
+        try:
+            data = client.sock.recv(size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        now = time.perf_counter()
+        if not data:
+            if not client.got_data:
+                client.rejected += 1
+            self._close(client)
+            return
+        self._on_data(client, data, now)
+
+    def _run_fast(self):
+        """普通/异常断开/超额客户端：就绪即读"""
+        reconnect: List[tuple] = []
+        while not self.stop_event.is_set():
+            for key, _ in self.selector.select(timeout=0.05):
+                self._read(key.data, 1 << 16)
+            now = time.perf_counter()
+            for client in self.clients:
+                if client.kind == 'abrupt' and client.sock and now >= client.close_at:
+                    self._close(client, abrupt=True)
+                    self.abrupt_closes += 1
+                    reconnect.append((now + 0.2, client))
+            ready = [c for t, c in reconnect if t <= now]
+            reconnect = [(t, c) for t, c in reconnect if t > now]
+            for client in ready:
+                self._connect(client)
+
+    def _run_slow(self):
+        """慢速客户端：每0.1秒读取slow_rate/10字节"""
+        step = max(1, self.slow_rate // 10)
+        while not self.stop_event.wait(0.1):
+            for client in self.clients:
+                if client.kind == 'slow' and client.sock:
+                    self._read(client, step)
+
+    def run(self) -> List[Thread]:
+        threads = [Thread(target=self._run_fast, daemon=True), Thread(target=self._run_slow, daemon=True)]
+        for t in threads:
+            t.start()
+        return threads
+
+    @property
+    def bytes(self) -> int:
+        return sum(c.bytes for c in self.clients)
+
+    def close(self, threads: List[Thread]):
+        self.stop_event.set()
+        for t in threads:
+            t.join()
+        for client in self.clients:
+            self._close(client)
+        self.selector.close()
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """延迟统计（毫秒）"""
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.50) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    """执行一次压力测试，返回结果字典"""
+    port = free_port()
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=server_main, daemon=True,
+                                   args=(child, args.mode, port, args.max_clients,
+                                         args.interval, args.queue_size))
+    proc.start()
+    if not parent.poll(30) or parent.recv() != 'ready':
+        raise RuntimeError('服务器启动超时')
+
+    clients = LoadClients(port, args.duration, args.slow_rate)
+    normal = args.clients - args.slow - args.abrupt
+    clients.add('normal', normal)
+    clients.add('slow', args.slow)
+    clients.add('abrupt', args.abrupt)
+    time.sleep(0.5)  # 先让正常客户端占满名额，超额连接才会被拒绝
+    clients.add('extra', args.extra)
+
+    t0 = time.perf_counter()
+    threads = clients.run()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - t0
+
+    parent.send('stop')
+    server = parent.recv()
+    clients.close(threads)
+    proc.join(10)
+
+    publish = server['publish']
+    latency: Dict[str, List[float]] = {'all': []}
+    for seq, rx, kind in clients.samples:
+        # 只统计测量开始后发布的帧（此前客户端读取线程尚未启动）
+        if seq < len(publish) and publish[seq] >= t0:
+            value = rx - publish[seq]
+            latency['all'].append(value)
+            latency.setdefault(kind, []).append(value)
+
+    cpu = server['cpu_percent']
+    rss = server['rss_mb']
+    by_kind = {}
+    for c in clients.clients:
+        k = by_kind.setdefault(c.kind, {'clients': 0, 'frames': 0, 'connects': 0, 'rejected': 0})
+        k['clients'] += 1
+        k['frames'] += c.received
+        k['connects'] += c.connects
+        k['rejected'] += c.rejected
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'config': {
+            'mode': args.mode, 'clients': args.clients, 'slow': args.slow, 'abrupt': args.abrupt,
+            'extra': args.extra, 'max_clients': args.max_clients, 'interval': args.interval,
+            'duration': args.duration, 'queue_size': args.queue_size, 'slow_rate': args.slow_rate,
+        },
+        'published_frames': len(publish),
+        'latency': {kind: summarize(values) for kind, values in latency.items()},
+        'throughput': {
+            'bytes': clients.bytes,
+            'bytes_per_sec': clients.bytes / elapsed,
+            'frames': len(clients.samples),
+            'frames_per_sec': len(clients.samples) / elapsed,
+        },
+        'connections': {
+            'by_kind': by_kind,
+            'abrupt_closes': clients.abrupt_closes,
+            'connect_errors': clients.connect_errors,
+            'server_accepted': server['accept']['accepted'],
+            'server_rejected': server['accept']['rejected'],
+            'server_accept_rate': server['accept']['accepted'] / elapsed,
+            'server_reject_rate': sum(server['accept']['rejected'].values()) / elapsed,
+            'server_active_end': server['client_count'],
+        },
+        'server': {
+            'cpu_seconds': server['cpu_seconds'],
+            'cpu_percent_avg': sum(cpu) / len(cpu) if cpu else None,
+            'cpu_percent_max': max(cpu) if cpu else None,
+            'rss_mb_max': max(rss) if rss else None,
+            'rss_mb_end': rss[-1] if rss else None,
+        },
+        'broadcaster': server['broadcaster'],
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='端到端扇出压力测试')
+    parser.add_argument('-n', '--clients', type=int, default=100, help='客户端总数（含慢速和异常断开）')
+    parser.add_argument('--slow', type=int, default=10, help='慢速客户端数')
+    parser.add_argument('--abrupt', type=int, default=10, help='异常断开并重连的客户端数')
+    parser.add_argument('--extra', type=int, default=10, help='超出max_clients的额外连接数')
+    parser.add_argument('-m', '--max-clients', type=int, default=None, help='服务器最大客户端数（默认=客户端总数）')
+    parser.add_argument('--mode', choices=['thread', 'selectors', 'asyncio'], default='thread')
+    parser.add_argument('-i', '--interval', type=float, default=0.5, help='播发间隔（秒）')
+    parser.add_argument('-d', '--duration', type=float, default=20.0, help='测试时长（秒）')
+    parser.add_argument('-q', '--queue-size', type=int, default=4, help='每客户端待发帧队列长度')
+    parser.add_argument('--slow-rate', type=int, default=2000, help='慢速客户端读取速率（字节/秒）')
+    parser.add_argument('-o', '--output', help='JSON结果文件（默认打印到标准输出）')
+    args = parser.parse_args()
+    if args.max_clients is None:
+        args.max_clients = args.clients
+    if args.slow + args.abrupt > args.clients:
+        parser.error('慢速与异常断开客户端数之和不能超过客户端总数')
+
+    result = run(args)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+        lat = result['latency']['all']
+        print(f"延迟 p50 {lat['p50_ms']:.2f}ms / p99 {lat['p99_ms']:.2f}ms / 最大 {lat['max_ms']:.2f}ms, "
+              f"{result['throughput']['bytes_per_sec'] / 1e6:.2f} MB/s, 结果已写入 {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
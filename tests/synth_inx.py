@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""合成INX文件生成器（用于基准测试）
+
+按IONEX列格式（标签位于第61-80列）生成任意网格大小、阶数和地图个数的INX文本，
+结构与 lib/ATMO2025322160000_vtec_grid.inx 一致。
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+
+def _rec(data: str, label: str) -> str:
+    """拼接一条带标签的记录（数据区60列 + 标签）"""
+    return f'{data:<60}{label}'
+
+
+def _epoch(dt: datetime) -> str:
+    return f'{dt.year:6d}{dt.month:3d}{dt.day:3d}{dt.hour:3d}{dt.minute:3d}{dt.second:3d}'
+
+
+def _grid_rows(out: List[str], nlat: int, lat1: float, dlat: float,
+               lon1: float, lon2: float, dlon: float, hgt: float,
+               rng: random.Random, vmax: int):
+    for i in range(nlat):
+        lat = lat1 + i * dlat
+        out.append(_rec(f'  {lat:6.1f}{lon1:6.1f}{lon2:6.1f}{dlon:6.1f}{int(hgt):4d}',
+                        'LAT/LON1/LON2/DLON/H'))
+        nlon = int(round((lon2 - lon1) / dlon)) + 1
+        vals = [rng.randint(0, vmax) for _ in range(nlon)]
+        for j in range(0, nlon, 16):
+            out.append(''.join(f'{v:5d}' for v in vals[j:j + 16]))
+
+
+def make_inx(nlat: int = 31, nlon: int = 41, order: int = 2, nmaps: int = 1,
+             interval: int = 3600, start: datetime = datetime(2025, 11, 18, 16),
+             seed: int = 0) -> str:
+    """生成合成INX文本
+
+    Args:
+        nlat: 纬度格网数
+        nlon: 经度格网数
+        order: 球谐阶数（N=M=order）
+        nmaps: 地图个数（每个地图含系数、TEC MAP、RMS MAP）
+        interval: 地图间隔（秒）
+        start: 第一个地图历元
+        seed: 随机种子（保证可复现）
+
+    Returns:
+        INX文件文本
+    """
+    rng = random.Random(seed)
+    lat1 = 55.0
+    # 大网格压缩纬度步长，保持纬度范围在±90°内
+    dlat = -1.0 if nlat <= 121 else -120.0 / (nlat - 1)
+    lat2 = lat1 + (nlat - 1) * dlat
+    lon1, dlon = 95.0, 1.0
+    lon2 = lon1 + (nlon - 1) * dlon
+    hgt = 450.0
+    coef_cnt = (order + 1) * (order + 1)
+    epochs = [start + timedelta(seconds=interval * k) for k in range(nmaps)]
+
+    out = [
+        _rec('     1.0            IONOSPHERE MAPS     GNSS', 'IONEX VERSION / TYPE'),
+        _rec(' ATMO VTEC MODEL', 'PGM / RUN BY / DATE'),
+        _rec(_epoch(epochs[0]), 'EPOCH OF FIRST MAP'),
+        _rec(_epoch(epochs[-1]), 'EPOCH OF LAST MAP'),
+        _rec(f'{interval:6d}', 'INTERVAL'),
+        _rec(f'{nmaps:6d}', '# OF MAPS IN FILE'),
+        _rec(' SPHERICAL HARMONICS', 'MAPPING FUNCTION'),
+        _rec('', 'COEFFICIENTS START'),
+        _rec(f' Order: {order} x {order}, Total coefficients: {coef_cnt}', 'MODEL ORDER'),
+    ]
+    for k, ep in enumerate(epochs, 1):
+        out.append(_rec(f' MAP {k:3d} COEF {_epoch(ep)}', 'MAP COEFFICIENTS'))
+        coefs = [rng.uniform(-60000.0, 60000.0) for _ in range(coef_cnt)]
+        for j in range(0, coef_cnt, 4):
+            out.append(_rec(''.join(f'{c:14.4f}' for c in coefs[j:j + 4]),
+                            'COEFFICIENT DATA'))
+    out += [
+        _rec('', 'COEFFICIENTS END'),
+        _rec(' 6371.0', 'BASE RADIUS'),
+        _rec(f'  {hgt:6.1f}{hgt:8.1f}     0.0', 'HGT1 / HGT2 / DHGT'),
+        _rec(f'  {lat1:6.1f}{lat2:7.1f}{dlat:6.1f}', 'LAT1 / LAT2 / DLAT'),
+        _rec(f'  {lon1:6.1f}{lon2:7.1f}{dlon:6.1f}', 'LON1 / LON2 / DLON'),
+        _rec('', 'END OF HEADER'),
+    ]
+    for k, ep in enumerate(epochs, 1):
+        out.append(_rec(f'{k:6d}', 'START OF TEC MAP'))
+        out.append(_rec(_epoch(ep), 'EPOCH OF CURRENT MAP'))
+        _grid_rows(out, nlat, lat1, dlat, lon1, lon2, dlon, hgt, rng, 800)
+        out.append(_rec(f'{k:6d}', 'END OF TEC MAP'))
+    for k, ep in enumerate(epochs, 1):
+        out.append(_rec(f'{k:8d}', 'START OF RMS MAP'))
+        out.append(_rec(_epoch(ep), 'EPOCH OF CURRENT MAP'))
+        _grid_rows(out, nlat, lat1, dlat, lon1, lon2, dlon, hgt, rng, 120)
+        out.append(_rec(f'{k:8d}', 'END OF RMS MAP'))
+    out.append(_rec('', 'END OF FILE'))
+    return '\n'.join(out) + '\n'
+
+
+def lines_per_row(nlon: int) -> int:
+    """每个纬度行占用的文本行数（LAT/LON记录 + 数据行）"""
+    return 1 + (nlon + 15) // 16
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""入库顺序测试（IngestPool / Coalescer）
+
+同一合并器的入库必须按提交顺序执行：前一个入库未完成时到达的文件留在待处理中，
+完成后只入库其中最新的一个，较旧的文件不会晚于较新的文件成为当前快照。
+
+示例:
+    python tests/test_ingest_order.py
+    python -m pytest tests/test_ingest_order.py
+"""
+
+import sys
+import time
+from pathlib import Path
+from threading import Lock
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.watcher import Coalescer, IngestPool
+
+
+def run_member(workers: int = 2, slow: float = 0.2):
+    """一个成员依次提交a（回调较慢）、b、c，返回回调执行顺序"""
+    order = []
+    lock = Lock()
+
+    def callback(path: Path):
+        if path.name == 'a.inx':
+            time.sleep(slow)
+        with lock:
+            order.append(path.name)
+
+    pool = IngestPool(workers)
+    member = Coalescer(callback, quiet_period=0.0, pool=pool)
+    member.start()
+    try:
+        member.submit(Path('a.inx'))
+        time.sleep(slow / 4)  # a已被工作线程取走
+        member.submit(Path('b.inx'))
+        time.sleep(slow / 4)  # 另一个工作线程空闲，b已就绪
+        member.submit(Path('c.inx'))
+        time.sleep(slow * 2)  # a完成后剩余文件入库
+        return order, member.get_stats()
+    finally:
+        member.stop()
+        pool.stop()
+
+
+def test_member_ingests_in_order():
+    """慢入库期间到达的b、c只入库最新的c，且在a之后"""
+    for _ in range(5):
+        order, stats = run_member()
+        assert order == ['a.inx', 'c.inx'], order
+        assert stats['superseded'] == 1 and stats['ingests'] == 2, stats
+
+
+def test_members_ingest_in_parallel():
+    """不同成员的入库可在不同工作线程上同时执行"""
+    pool = IngestPool(2)
+    running = []
+    peak = [0]
+    lock = Lock()
+
+    def callback(path: Path):
+        with lock:
+            running.append(path)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.1)
+        with lock:
+            running.remove(path)
+
+    members = [Coalescer(callback, quiet_period=0.0, pool=pool) for _ in range(2)]
+    for m in members:
+        m.start()
+    try:
+        for i, m in enumerate(members):
+            m.submit(Path(f'{i}.inx'))
+        time.sleep(0.3)
+        assert peak[0] == 2, peak[0]
+    finally:
+        for m in members:
+            m.stop()
+        pool.stop()
+
+
+def main():
+    tests = [test_member_ingests_in_order, test_members_ingest_in_parallel]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f'✓ {test.__name__}')
+        except AssertionError as e:
+            failed += 1
+            print(f'✗ {test.__name__}: {e}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
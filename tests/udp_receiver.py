@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""UDP组播接收测试脚本
+
+用途：
+1. 加入组播组（或监听广播端口），接收UdpSink发送的分片数据报
+2. 按帧序号重组分片，统计丢帧/不完整帧
+3. 校验重组后帧的CRC
+4. --selftest: 本机回环组播自测（同进程发送示例文件帧并接收校验）
+
+示例:
+    python tests/udp_receiver.py -g 239.255.50.1 -p 5001 -n 10
+    python tests/udp_receiver.py --selftest --mtu 576
+"""
+
+import sys
+import time
+import socket
+import struct
+import ipaddress
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tcpcmn import verify_frames
+from src.udpsvr import UdpSink, FRAG_HEADER
+
+
+class Reassembler:
+    """按帧序号重组分片
+
+    只保留最近window个序号的未完成帧，更早的视为丢失。
+    """
+
+    def __init__(self, window: int = 8):
+        self.window = window
+        self.partial: Dict[int, List[Optional[bytes]]] = {}
+        self.last_seq: Optional[int] = None
+        self.frames = 0
+        self.lost = 0        # 序号跳变丢失的帧
+        self.incomplete = 0  # 分片不全被丢弃的帧
+
+    def feed(self, datagram: bytes) -> Optional[bytes]:
+        """处理一个数据报，帧重组完成时返回完整帧"""
+        if len(datagram) < FRAG_HEADER.size:
+            return None
+        seq, idx, count = FRAG_HEADER.unpack_from(datagram)
+        if count == 0 or idx >= count:
+            return None
+
+        ahead = (seq - self.last_seq) & 0xFFFFFFFF if self.last_seq is not None else 1
+        if ahead == 0 or ahead > 0x7FFFFFFF:
+            if seq not in self.partial:
+                return None  # 已完成或过期帧的分片
+        else:
+            self.lost += ahead - 1
+            self.last_seq = seq
+
+        parts = self.partial.setdefault(seq, [None] * count)
+        if len(parts) != count:
+            return None
+        parts[idx] = datagram[FRAG_HEADER.size:]
+
+        # 丢弃过期的未完成帧
+        for old in [s for s in self.partial if ((seq - s) & 0xFFFFFFFF) >= self.window]:
+            del self.partial[old]
+            self.incomplete += 1
+
+        if any(p is None for p in parts):
+            return None
+        del self.partial[seq]
+        self.frames += 1
+        return b''.join(parts)
+
+
+def open_receiver(group: str, port: int, interface: str = '0.0.0.0') -> socket.socket:
+    """创建接收socket（组播地址则加入组播组）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    if ipaddress.ip_address(group).is_multicast:
+        sock.bind(('', port))
+        mreq = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    else:
+        sock.bind(('', port))
+    return sock
+
+
+def receive(sock: socket.socket, count: int, timeout: float = 30.0) -> Reassembler:
+    """接收并重组count帧，逐帧打印CRC校验结果"""
+    sock.settimeout(timeout)
+    rx = Reassembler()
+    bad = 0
+    while count == -1 or rx.frames < count:
+        try:
+            datagram = sock.recv(65535)
+        except socket.timeout:
+            print('接收超时')
+            break
+        frame = rx.feed(datagram)
+        if frame is None:
+            continue
+        ok = verify_frames(frame) == [(0, len(frame), True)]
+        bad += not ok
+        print(f"帧 #{rx.frames}: 序号 {rx.last_seq}, 消息ID 0x{frame[2]:02X}, IOD {frame[12]}, "
+              f"{len(frame)} 字节, CRC {'✓' if ok else '✗'}")
+    print(f'接收完成: {rx.frames} 帧, 丢帧 {rx.lost}, 不完整 {rx.incomplete}, CRC错误 {bad}')
+    return rx
+
+
+def selftest(group: str, port: int, mtu: int, count: int) -> bool:
+    """本机回环组播自测：发送示例文件帧并逐字节比对"""
+    from threading import Thread
+    from src.parser import parse_inx
+    from src.encoder import encode_frame
+
+    lib = Path(__file__).parent.parent / 'lib' / 'ATMO2025322160000_vtec_grid.inx'
+    data = parse_inx(str(lib))
+    frames = [bytes(encode_frame(data, i)) for i in range(count)]
+
+    sock = open_receiver(group, port, '127.0.0.1')
+    sink = UdpSink(group, port, mtu=mtu, interface='127.0.0.1', loopback=True)
+    sink.start()
+
+    received: List[bytes] = []
+
+    def run():
+        sock.settimeout(5.0)
+        rx = Reassembler()
+        while len(received) < count:
+            try:
+                frame = rx.feed(sock.recv(65535))
+            except socket.timeout:
+                break
+            if frame is not None:
+                received.append(frame)
+
+    t = Thread(target=run, daemon=True)
+    t.start()
+    time.sleep(0.1)
+    for frame in frames:
+        sink.broadcast(frame)
+        time.sleep(0.01)
+    t.join(10.0)
+    sink.stop()
+    sock.close()
+
+    stats = sink.get_stats()
+    ok = received == frames
+    print(f"MTU {mtu}: 发送 {stats['sent_frames']} 帧 / {stats['sent_datagrams']} 数据报, "
+          f"接收 {len(received)} 帧, {'✓ 逐字节一致' if ok else '✗ 不一致'}")
+    return ok
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='UDP组播接收测试')
+    parser.add_argument('-g', '--group', default='239.255.50.1', help='组播/广播地址')
+    parser.add_argument('-p', '--port', type=int, default=5001, help='端口')
+    parser.add_argument('-i', '--interface', default='0.0.0.0', help='加入组播的本地接口地址')
+    parser.add_argument('-n', '--count', type=int, default=3, help='接收帧数（-1为无限）')
+    parser.add_argument('--selftest', action='store_true', help='本机回环组播自测')
+    parser.add_argument('--mtu', type=int, default=1400, help='自测使用的MTU')
+    args = parser.parse_args()
+
+    if args.selftest:
+        sys.exit(0 if selftest(args.group, args.port, args.mtu, max(args.count, 1)) else 1)
+
+    print(f'监听 {args.group}:{args.port}')
+    receive(open_receiver(args.group, args.port, args.interface), args.count)
+
+
+if __name__ == '__main__':
+    main()